@@ -0,0 +1,299 @@
+"""
+Modalità batch per Audio & Metadata Converter
+Un file di job (TOML o JSON) con più coppie input/output e impostazioni per libreria,
+eseguite su un unico pool di worker con una cache probe condivisa e un report complessivo
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+import concurrent.futures
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+from store import ProbeCache, SyncManifest, ContentIndex, LoudnessCache, default_db_path
+from report import default_report_dir
+from profiles import DEFAULT_PROFILE, resolve_profiles
+from resources import ResourceLimits, Governor, limits_from, governor_from
+from tags import ARTWORK_MAX_SIZE
+
+# Librerie avviate contemporaneamente: mentre una finisce la coda, la successiva tiene occupati i worker
+DEFAULT_PARALLEL_LIBRARIES = 2
+BATCH_DB_NAME = '.conformer-batch.db'
+JOB_KEYS = {'name', 'input', 'output', 'profiles', 'bitrate', 'sample_rate', 'formats', 'loudness', 'incremental',
+            'dedup', 'copy_strategy', 'priority', 'schedule', 'timeout', 'io_mode', 'tags', 'artwork', 'artwork_size'}
+# Limiti di risorse del pool condiviso: valgono per tutte le librerie del batch
+RESOURCE_KEYS = {'nice', 'ionice', 'cpus', 'max_load', 'max_iowait', 'live_hours', 'live_jobs'}
+BATCH_KEYS = {'jobs', 'workers', 'parallel_libraries', 'probe_cache', 'report_dir', 'defaults'} | RESOURCE_KEYS
+
+logger = logging.getLogger(__name__)
+
+
+class BatchJob(NamedTuple):
+    """Una libreria del file di job, con le sostituzioni delle impostazioni di SimpleConformer"""
+    name: str
+    input_dir: Path
+    output_dir: Path
+    profiles: tuple = ()
+    bitrate: Optional[int] = None
+    sample_rate: Optional[int] = None
+    formats: Optional[frozenset] = None
+    loudness: Optional[float] = None
+    incremental: bool = False
+    dedup: bool = False
+    copy_strategy: str = 'auto'
+    priority: tuple = ()
+    schedule: str = 'lpt'
+    timeout: Optional[float] = None
+    io_mode: str = 'auto'
+    tags: bool = True
+    artwork: bool = True
+    artwork_size: int = ARTWORK_MAX_SIZE
+
+
+class BatchConfig(NamedTuple):
+    jobs: list
+    workers: int
+    parallel_libraries: int
+    probe_cache: Optional[Path]
+    report_dir: Path
+    limits: ResourceLimits = ResourceLimits()
+    governor: Optional[Governor] = None
+
+
+def load_job_file(path) -> dict:
+    """Legge il file di job: .toml con tomllib (Python 3.11+) o tomli, altrimenti JSON"""
+    path = Path(path)
+    if path.suffix.lower() == '.toml':
+        try:
+            import tomllib
+        except ImportError:
+            try:
+                import tomli as tomllib
+            except ImportError:
+                raise ValueError("I file di job TOML richiedono Python 3.11+ o il pacchetto tomli; usa JSON")
+        with open(path, 'rb') as f:
+            return tomllib.load(f)
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _normalize_formats(formats) -> frozenset:
+    return frozenset(ext.lower() if ext.startswith('.') else f'.{ext.lower()}' for ext in formats)
+
+
+def parse_batch(data: dict, base_dir: Path, workers: Optional[int] = None,
+                resources: Optional[dict] = None) -> BatchConfig:
+    """Valida il contenuto del file di job; i percorsi relativi sono relativi alla cartella del file
+
+    resources sostituisce le chiavi di RESOURCE_KEYS del file (opzioni da riga di comando).
+    """
+    unknown = set(data) - BATCH_KEYS
+    if unknown:
+        raise ValueError(f"Chiavi sconosciute nel file di job: {', '.join(sorted(unknown))}")
+    entries = data.get('jobs') or []
+    if not entries:
+        raise ValueError("Il file di job non contiene nessun job ('jobs')")
+    defaults = data.get('defaults', {})
+
+    def resolve(value) -> Path:
+        value = Path(os.path.expanduser(str(value)))
+        return value if value.is_absolute() else base_dir / value
+
+    jobs = []
+    for index, entry in enumerate(entries, 1):
+        entry = {**defaults, **entry}
+        unknown = set(entry) - JOB_KEYS
+        if unknown:
+            raise ValueError(f"Job {index}: chiavi sconosciute {', '.join(sorted(unknown))}")
+        if 'input' not in entry or 'output' not in entry:
+            raise ValueError(f"Job {index}: 'input' e 'output' sono obbligatori")
+        input_dir = resolve(entry['input'])
+        if not input_dir.is_dir():
+            raise ValueError(f"Job {index}: cartella di input inesistente {input_dir}")
+        priority = entry.get('priority', ())
+        profiles = entry.get('profiles', ())
+        profiles = (profiles,) if isinstance(profiles, str) else tuple(profiles)
+        try:
+            resolve_profiles(profiles)
+        except ValueError as e:
+            raise ValueError(f"Job {index}: {e}")
+        if entry.get('dedup') and len(profiles) > 1:
+            raise ValueError(f"Job {index}: 'dedup' richiede un solo profilo")
+        jobs.append(BatchJob(
+            name=str(entry.get('name') or input_dir.name),
+            input_dir=input_dir,
+            output_dir=resolve(entry['output']),
+            profiles=profiles,
+            bitrate=int(entry['bitrate']) if 'bitrate' in entry else None,
+            sample_rate=int(entry['sample_rate']) if 'sample_rate' in entry else None,
+            formats=_normalize_formats(entry['formats']) if 'formats' in entry else None,
+            loudness=float(entry['loudness']) if 'loudness' in entry else None,
+            incremental=bool(entry.get('incremental', False)),
+            dedup=bool(entry.get('dedup', False)),
+            copy_strategy=entry.get('copy_strategy', 'auto'),
+            priority=(priority,) if isinstance(priority, str) else tuple(priority),
+            schedule=entry.get('schedule', 'lpt'),
+            timeout=float(entry['timeout']) if 'timeout' in entry else None,
+            io_mode=entry.get('io_mode', 'auto'),
+            tags=bool(entry.get('tags', True)),
+            artwork=bool(entry.get('artwork', True)),
+            artwork_size=int(entry.get('artwork_size', ARTWORK_MAX_SIZE)),
+        ))
+    outputs = [job.output_dir.resolve() for job in jobs]
+    if len(set(outputs)) != len(outputs):
+        raise ValueError("Due job scrivono nella stessa cartella di output")
+
+    workers = max(1, workers or int(data.get('workers', 0)) or os.cpu_count() or 1)
+    probe_cache = data.get('probe_cache', BATCH_DB_NAME)
+    settings = {key: data[key] for key in RESOURCE_KEYS if key in data}
+    settings.update({key: value for key, value in (resources or {}).items() if value is not None})
+    try:
+        limits = limits_from(settings.get('nice'), settings.get('ionice'), settings.get('cpus'))
+        governor = governor_from(workers, settings.get('max_load'), settings.get('max_iowait'),
+                                 settings.get('live_hours'), settings.get('live_jobs'))
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Limiti di risorse non validi: {e}")
+    return BatchConfig(
+        jobs=jobs,
+        workers=workers,
+        parallel_libraries=max(1, int(data.get('parallel_libraries', DEFAULT_PARALLEL_LIBRARIES))),
+        probe_cache=resolve(probe_cache) if probe_cache else None,
+        report_dir=resolve(data['report_dir']) if data.get('report_dir') else default_report_dir(base_dir),
+        limits=limits,
+        governor=governor,
+    )
+
+
+class BatchRunner:
+    """Esegue i job di un BatchConfig su un unico ThreadPoolExecutor condiviso"""
+
+    def __init__(self, config: BatchConfig, conformer_class, progress_callback=None):
+        self.config = config
+        self.conformer_class = conformer_class
+        self.progress_callback = progress_callback
+        self.stop_requested = False
+        self.results = []
+        self._lock = threading.Lock()
+        self._active = []
+
+    def stop(self):
+        self.stop_requested = True
+        with self._lock:
+            active = list(self._active)
+        for conformer in active:
+            conformer.stop()
+
+    @staticmethod
+    def _job_profiles(job: BatchJob) -> list:
+        """Profili del job; bitrate e sample_rate sostituiscono quelli del profilo principale"""
+        profiles = resolve_profiles(job.profiles or (DEFAULT_PROFILE,))
+        overrides = {}
+        if job.bitrate is not None:
+            overrides['bitrate'] = job.bitrate
+        if job.sample_rate is not None:
+            overrides['sample_rate'] = job.sample_rate
+        if overrides:
+            profiles[0] = profiles[0]._replace(**overrides)
+        return profiles
+
+    def _create_conformer(self, job: BatchJob, executor, probe_cache, stores: dict):
+        conformer = self.conformer_class(
+            str(job.input_dir), str(job.output_dir), progress_callback=self.progress_callback,
+            jobs=self.config.workers, probe_cache=probe_cache, manifest=stores.get('manifest'),
+            report_dir=default_report_dir(job.output_dir), timeout=job.timeout, copy_strategy=job.copy_strategy,
+            content_index=stores.get('content_index'), loudness_target=job.loudness,
+            loudness_cache=stores.get('loudness_cache'), schedule=job.schedule, priorities=job.priority,
+            executor=executor, cache_namespace=job.input_dir.resolve().as_posix(),
+            profiles=self._job_profiles(job), governor=self.config.governor, io_mode=job.io_mode,
+            carry_tags=job.tags, artwork=job.artwork, artwork_size=job.artwork_size)
+        # I formati accettati vivono sull'istanza: la classe resta con i valori predefiniti
+        if job.formats is not None:
+            conformer.SUPPORTED_FORMATS = job.formats
+        return conformer
+
+    def _run_job(self, job: BatchJob, executor, probe_cache) -> dict:
+        stores = {}
+        db_path = default_db_path(job.output_dir)
+        if job.incremental:
+            stores['manifest'] = SyncManifest(db_path)
+        if job.dedup:
+            stores['content_index'] = ContentIndex(db_path)
+        if job.loudness is not None:
+            stores['loudness_cache'] = LoudnessCache(db_path)
+        conformer = None
+        start = time.perf_counter()
+        try:
+            conformer = self._create_conformer(job, executor, probe_cache, stores)
+            with self._lock:
+                if self.stop_requested:
+                    return {'name': job.name, 'status': 'stopped'}
+                self._active.append(conformer)
+            logger.info(f"Batch: avvio job '{job.name}' ({job.input_dir} -> {job.output_dir})")
+            conformer.run()
+            return {
+                'name': job.name,
+                'status': 'stopped' if conformer.stop_requested else 'completed',
+                'input_dir': str(job.input_dir),
+                'output_dir': str(job.output_dir),
+                'settings': conformer.settings_signature(),
+                'wall_seconds': round(time.perf_counter() - start, 3),
+                'stats': dict(conformer.stats),
+                'report': str(conformer.report.json_path) if conformer.report.json_path else None,
+            }
+        except Exception as e:
+            logger.error(f"Batch: job '{job.name}' fallito: {e}")
+            return {'name': job.name, 'status': 'failed', 'error': str(e)}
+        finally:
+            if conformer is not None:
+                with self._lock:
+                    if conformer in self._active:
+                        self._active.remove(conformer)
+            for store in stores.values():
+                store.close()
+
+    def run(self) -> dict:
+        config = self.config
+        started = time.time()
+        wall_start = time.perf_counter()
+        probe_cache = ProbeCache(config.probe_cache) if config.probe_cache else None
+        try:
+            initializer = config.limits.apply if config.limits else None
+            with concurrent.futures.ThreadPoolExecutor(max_workers=config.workers,
+                                                       initializer=initializer) as executor, \
+                 concurrent.futures.ThreadPoolExecutor(max_workers=config.parallel_libraries) as libraries:
+                futures = [libraries.submit(self._run_job, job, executor, probe_cache) for job in config.jobs]
+                self.results = [future.result() for future in futures]
+        finally:
+            if probe_cache is not None:
+                probe_cache.close()
+        summary = self.summary(started, time.perf_counter() - wall_start)
+        self.write_report(summary)
+        return summary
+
+    def summary(self, started: float, wall_seconds: float) -> dict:
+        totals = {}
+        for result in self.results:
+            for key, value in result.get('stats', {}).items():
+                totals[key] = totals.get(key, 0) + value
+        return {
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(started)),
+            'finished': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'wall_seconds': round(wall_seconds, 3),
+            'workers': self.config.workers,
+            'parallel_libraries': self.config.parallel_libraries,
+            'totals': totals,
+            'jobs': self.results,
+        }
+
+    def write_report(self, summary: dict):
+        try:
+            self.config.report_dir.mkdir(parents=True, exist_ok=True)
+            stamp = time.strftime('%Y%m%d-%H%M%S')
+            path = self.config.report_dir / f"conformer-batch-{stamp}.json"
+            path.write_text(json.dumps(summary, indent=2, ensure_ascii=False), encoding='utf-8')
+            logger.info(f"Report batch: {path}")
+        except OSError as e:
+            logger.error(f"Impossibile scrivere il report batch: {e}")
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Benchmark della pipeline di conformazione per Audio & Metadata Converter
+
+Genera una libreria sintetica con le sorgenti lavfi di ffmpeg (sine/anoisesrc),
+misura separatamente scansione, analisi, copia e codifica e confronta il risultato
+con una baseline JSON salvata da una versione precedente.
+
+Uso:
+    python benchmark.py --files 200 --jobs 4 --save baseline.json
+    python benchmark.py --files 200 --jobs 4 --compare baseline.json
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+import concurrent.futures
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from conformer import SimpleConformer, APP_VERSION
+
+# Formati delle fixture: estensione e argomenti di codifica ffmpeg
+FIXTURE_FORMATS = {
+    'mp3': ('.mp3', ['-c:a', 'libmp3lame', '-b:a', '192k', '-ar', '44100', '-ac', '2']),  # già conforme
+    'mp3_128': ('.mp3', ['-c:a', 'libmp3lame', '-b:a', '128k', '-ar', '44100', '-ac', '2']),
+    'flac': ('.flac', ['-c:a', 'flac', '-ar', '48000', '-ac', '2']),
+    'wav': ('.wav', ['-c:a', 'pcm_s16le', '-ar', '44100', '-ac', '2']),
+    'm4a': ('.m4a', ['-c:a', 'aac', '-b:a', '256k', '-ar', '48000', '-ac', '2']),
+    'ogg': ('.ogg', ['-c:a', 'libvorbis', '-q:a', '5', '-ar', '44100', '-ac', '2']),
+}
+DEFAULT_MIX = 'mp3:40,mp3_128:10,flac:20,wav:20,m4a:10'
+PHASES = ('scan', 'probe', 'copy', 'encode', 'run')
+FILES_PER_FOLDER = 50
+# Avvio a freddo del percorso CLI: processi nuovi, mediana di STARTUP_RUNS esecuzioni
+STARTUP_RUNS = 5
+STARTUP_PHASES = ('import', 'cli_help')
+# Moduli della GUI che il percorso CLI non deve importare
+GUI_MODULES = ('gui', 'customtkinter', 'tkinter', 'PIL', 'locales')
+
+
+def parse_mix(mix: str) -> dict:
+    """Converte 'mp3:40,flac:60' in pesi normalizzati per formato"""
+    weights = {}
+    for item in mix.split(','):
+        name, _, weight = item.strip().partition(':')
+        if name not in FIXTURE_FORMATS:
+            raise ValueError(f"Formato fixture sconosciuto: {name} (disponibili: {', '.join(FIXTURE_FORMATS)})")
+        weights[name] = float(weight or 1)
+    total = sum(weights.values())
+    if total <= 0:
+        raise ValueError("La somma dei pesi deve essere positiva")
+    return {name: weight / total for name, weight in weights.items()}
+
+
+def plan_fixtures(count: int, mix: dict) -> list:
+    """Elenco deterministico dei formati da generare, distribuiti secondo i pesi"""
+    remaining = {name: round(count * share) for name, share in mix.items()}
+    # Gli arrotondamenti possono lasciare qualche file in più o in meno: si corregge sul formato più pesante
+    largest = max(mix, key=mix.get)
+    remaining[largest] += count - sum(remaining.values())
+    # Alterna i formati come in una libreria reale invece di raggrupparli
+    plan = []
+    while len(plan) < count:
+        for name in remaining:
+            if remaining[name] > 0:
+                plan.append(name)
+                remaining[name] -= 1
+    return plan
+
+
+def generate_library(library: Path, count: int, mix: dict, duration: float, ffmpeg_path: str, jobs: int):
+    """Genera la libreria sintetica con ffmpeg -f lavfi"""
+    def make(index_name):
+        index, name = index_name
+        ext, codec_args = FIXTURE_FORMATS[name]
+        target = library / f"disc{index // FILES_PER_FOLDER:03d}" / f"track{index:05d}_{name}{ext}"
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if index % 2:
+            source = f"anoisesrc=d={duration}:c=pink:r=48000:a=0.1"
+        else:
+            source = f"sine=frequency={220 + index % 660}:sample_rate=48000:duration={duration}"
+        cmd = [ffmpeg_path, '-nostdin', '-loglevel', 'error', '-y', '-f', 'lavfi', '-i', source]
+        subprocess.run(cmd + codec_args + [str(target)], check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        list(executor.map(make, enumerate(plan_fixtures(count, mix))))
+
+
+def _phase(seconds: float, files: int, audio_seconds: float) -> dict:
+    return {
+        'seconds': round(seconds, 4),
+        'files': files,
+        'files_per_sec': round(files / seconds, 2) if seconds > 0 else 0.0,
+        'audio_seconds': round(audio_seconds, 2),
+        'audio_seconds_per_sec': round(audio_seconds / seconds, 2) if seconds > 0 else 0.0,
+    }
+
+
+def run_benchmark(library: Path, work_dir: Path, jobs: int) -> dict:
+    """Misura le fasi della pipeline, ciascuna in isolamento, più un'esecuzione completa"""
+    phases_dir = work_dir / 'phases'
+    shutil.rmtree(str(phases_dir), ignore_errors=True)
+    conformer = SimpleConformer(str(library), str(phases_dir), jobs=jobs)
+    logging.getLogger('conformer').setLevel(logging.WARNING)
+    results = {}
+
+    start = time.perf_counter()
+    files = list(conformer.iter_audio_files())
+    results['scan'] = _phase(time.perf_counter() - start, len(files), 0.0)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        start = time.perf_counter()
+        infos = list(executor.map(conformer._probe_or_none, files))
+        elapsed = time.perf_counter() - start
+        durations = {f: (info.duration if info else 0.0) for f, info in zip(files, infos)}
+        results['probe'] = _phase(elapsed, len(files), sum(durations.values()))
+
+        def output_for(file_path):
+            return phases_dir / file_path.relative_to(library).with_suffix('.mp3')
+
+        conforming = [f for f, info in zip(files, infos)
+                      if info is not None and conformer.is_conforming_mp3(f, info)]
+        conforming_set = set(conforming)
+        to_convert = [(f, info) for f, info in zip(files, infos) if f not in conforming_set]
+
+        start = time.perf_counter()
+        list(executor.map(lambda f: conformer.safe_copy(f, output_for(f)), conforming))
+        results['copy'] = _phase(time.perf_counter() - start, len(conforming),
+                                 sum(durations[f] for f in conforming))
+
+        start = time.perf_counter()
+        list(executor.map(lambda item: conformer.convert_to_mp3(item[0], output_for(item[0]), info=item[1]),
+                          to_convert))
+        results['encode'] = _phase(time.perf_counter() - start, len(to_convert),
+                                   sum(durations[f] for f, _ in to_convert))
+
+    run_dir = work_dir / 'run'
+    shutil.rmtree(str(run_dir), ignore_errors=True)
+    full = SimpleConformer(str(library), str(run_dir), jobs=jobs)
+    start = time.perf_counter()
+    full.run()
+    results['run'] = _phase(time.perf_counter() - start, full.stats['processed'], sum(durations.values()))
+    results['run']['errors'] = full.stats['errors']
+    return results
+
+
+def measure_startup(runs: int = STARTUP_RUNS) -> dict:
+    """Tempo di avvio del percorso headless: import del motore e `conformer.py --help` in un processo nuovo"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    commands = {
+        'import': [sys.executable, '-c', 'import conformer'],
+        'cli_help': [sys.executable, os.path.join(here, 'conformer.py'), '--help'],
+    }
+    results = {}
+    for name in STARTUP_PHASES:
+        samples = []
+        for _ in range(max(1, runs)):
+            start = time.perf_counter()
+            subprocess.run(commands[name], cwd=here, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                           check=True)
+            samples.append(time.perf_counter() - start)
+        results[name] = round(statistics.median(samples), 4)
+    check = f"import sys, conformer; print(','.join(m for m in {GUI_MODULES!r} if m in sys.modules))"
+    loaded = subprocess.run([sys.executable, '-c', check], cwd=here, capture_output=True, text=True, check=True)
+    results['gui_modules_loaded'] = [name for name in loaded.stdout.strip().split(',') if name]
+    return results
+
+
+def compare_results(baseline: dict, current: dict, tolerance: float = 0.10) -> list:
+    """Fasi il cui throughput (file/s) o tempo di avvio è peggiorato oltre la tolleranza rispetto alla baseline"""
+    regressions = []
+    for phase in PHASES:
+        before = baseline.get('phases', {}).get(phase)
+        after = current.get('phases', {}).get(phase)
+        if not before or not after or not before.get('files') or before['files_per_sec'] <= 0:
+            continue
+        change = (after['files_per_sec'] - before['files_per_sec']) / before['files_per_sec']
+        if change < -tolerance:
+            regressions.append({
+                'phase': phase,
+                'baseline_files_per_sec': before['files_per_sec'],
+                'current_files_per_sec': after['files_per_sec'],
+                'change_pct': round(change * 100, 1),
+            })
+    for phase in STARTUP_PHASES:
+        before = baseline.get('startup', {}).get(phase)
+        after = current.get('startup', {}).get(phase)
+        if not before or not after:
+            continue
+        change = (after - before) / before
+        if change > tolerance:
+            regressions.append({
+                'phase': f'startup_{phase}',
+                'baseline_seconds': before,
+                'current_seconds': after,
+                'change_pct': round(change * 100, 1),
+            })
+    return regressions
+
+
+def print_report(report: dict):
+    print("\n📊 BENCHMARK PIPELINE")
+    print("=" * 78)
+    print(f"Software: v{report['version']} | Python {report['python']} | {report['platform']} | jobs={report['jobs']}")
+    library = report['library']
+    print(f"Libreria: {library['files']} file, mix {library['mix']}, {library['duration']}s per file")
+    print("-" * 78)
+    print(f"{'Fase':<8}{'Secondi':>10}{'File':>8}{'File/s':>12}{'Audio s':>12}{'Audio s/s':>14}")
+    for phase in PHASES:
+        r = report['phases'][phase]
+        print(f"{phase:<8}{r['seconds']:>10.3f}{r['files']:>8}{r['files_per_sec']:>12.2f}"
+              f"{r['audio_seconds']:>12.1f}{r['audio_seconds_per_sec']:>14.1f}")
+    startup = report.get('startup')
+    if startup:
+        print("-" * 78)
+        loaded = ', '.join(startup['gui_modules_loaded']) or 'nessuno'
+        print(f"Avvio CLI: import {startup['import'] * 1000:.0f} ms | --help {startup['cli_help'] * 1000:.0f} ms "
+              f"| moduli GUI importati: {loaded}")
+    print("=" * 78)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Audio & Metadata Converter - pipeline benchmark')
+    parser.add_argument('--files', type=int, default=100, help='Number of synthetic files (default: 100)')
+    parser.add_argument('--duration', type=float, default=20.0, help='Seconds of audio per file (default: 20)')
+    parser.add_argument('--mix', default=DEFAULT_MIX,
+                        help=f'Format mix as name:weight,... (default: {DEFAULT_MIX})')
+    parser.add_argument('--jobs', '-j', type=int, default=os.cpu_count() or 1, help='Parallel workers')
+    parser.add_argument('--library', metavar='DIR', help='Reuse or create the synthetic library here')
+    parser.add_argument('--keep', action='store_true', help='Keep the temporary work directory')
+    parser.add_argument('--save', metavar='FILE', help='Write the results as a JSON baseline')
+    parser.add_argument('--compare', metavar='FILE', help='Compare against a JSON baseline')
+    parser.add_argument('--tolerance', type=float, default=10.0,
+                        help='Allowed throughput drop in percent before failing (default: 10)')
+    parser.add_argument('--startup-runs', type=int, default=STARTUP_RUNS, metavar='N',
+                        help=f'Fresh processes per startup measurement, 0 skips it (default: {STARTUP_RUNS})')
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    work_dir = Path(tempfile.mkdtemp(prefix="conformer_bench_"))
+    library = Path(args.library) if args.library else work_dir / 'library'
+    ffmpeg_path = SimpleConformer._find_ffmpeg()
+
+    try:
+        if not library.exists() or not any(library.iterdir()):
+            print(f"🎵 Generazione libreria sintetica ({args.files} file) in {library}")
+            start = time.perf_counter()
+            generate_library(library, args.files, mix, args.duration, ffmpeg_path, max(1, args.jobs))
+            print(f"   Completata in {time.perf_counter() - start:.1f}s")
+
+        report = {
+            'version': APP_VERSION,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'jobs': args.jobs,
+            'library': {'files': args.files, 'mix': args.mix, 'duration': args.duration},
+            'phases': run_benchmark(library, work_dir, max(1, args.jobs)),
+        }
+        if args.startup_runs > 0:
+            report['startup'] = measure_startup(args.startup_runs)
+        print_report(report)
+
+        if args.save:
+            Path(args.save).write_text(json.dumps(report, indent=2), encoding='utf-8')
+            print(f"💾 Baseline salvata in {args.save}")
+
+        if args.compare:
+            baseline = json.loads(Path(args.compare).read_text(encoding='utf-8'))
+            regressions = compare_results(baseline, report, args.tolerance / 100)
+            if regressions:
+                print(f"\n❌ REGRESSIONI rispetto a v{baseline.get('version')}:")
+                for r in regressions:
+                    if 'baseline_seconds' in r:
+                        print(f"   - {r['phase']}: {r['baseline_seconds']} → {r['current_seconds']} "
+                              f"s ({r['change_pct']:+}%)")
+                    else:
+                        print(f"   - {r['phase']}: {r['baseline_files_per_sec']} → {r['current_files_per_sec']} "
+                              f"file/s ({r['change_pct']}%)")
+                return 1
+            print(f"\n✅ Nessuna regressione oltre il {args.tolerance:.0f}% rispetto a v{baseline.get('version')}")
+        return 0
+    finally:
+        if args.keep:
+            print(f"📁 Directory di lavoro: {work_dir}")
+        else:
+            shutil.rmtree(str(work_dir), ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
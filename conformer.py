@@ -14,47 +14,85 @@ FULL_VERSION = f"{APP_NAME} - {VERSION_NAME} v{APP_VERSION}"
 
 import os
 import sys
+import math
+import errno
 import logging
 import argparse
+import signal
 from pathlib import Path
-import shutil
 import threading
 import time
-import webbrowser
-
-# Import CustomTkinter and Locales
-try:
-    import customtkinter as ctk
-    from PIL import Image, ImageTk
-    import locales
-except ImportError as e:
-    print(f"Errore: Modulo mancante {e}")
-    print("Installa le dipendenze con: pip install customtkinter pillow packaging")
-    sys.exit(1)
-
-try:
-    import ffmpeg
-except ImportError as e:
-    print(f"Errore: Modulo mancante {e}")
-    print("Installa le dipendenze con: pip install ffmpeg-python")
-    sys.exit(1)
-
-# Global Language Variable
-CURRENT_LANG = 'IT'  # Default
-
-def get_resource_path(relative_path):
-    """Ottiene il percorso assoluto della risorsa, compatibile con PyInstaller"""
-    try:
-        # PyInstaller crea una cartella temporanea e memorizza il percorso in _MEIPASS
-        base_path = sys._MEIPASS
-    except Exception:
-        base_path = os.path.abspath(".")
+import concurrent.futures
+import contextlib
+import uuid
+from typing import NamedTuple, Optional
+
+from ffexec import FFmpegRunner
+import fastcopy
+import mp3header
+from store import (ProbeCache, SyncManifest, ContentIndex, LoudnessCache, default_db_path, partial_hash,
+                   content_hash, open_readonly)
+from report import RunReport, default_report_dir
+import watch
+import workqueue
+from scheduler import (Scheduler, PriorityRules, WorkEstimate, estimate_cost, estimate_duration,
+                       parse_priority_rule, window_for)
+from progress import ProgressTracker, ProgressSnapshot
+from profiles import Profile, PROFILES, DEFAULT_PROFILE, mp3_cbr, resolve_profiles
+from logsetup import configure_logging, default_log_path, FILE_LOGGER_NAME
+from preflight import PlanEntry, RunPlan, estimate_output_bytes, free_space
+from resources import ResourceLimits, Governor, limits_from, governor_from
+from streamio import (IO_MODES, PIPE_INPUT_FORMATS, WRITE_BUFFER, DEFAULT_PREFETCH, DEFAULT_PREFETCH_MEMORY,
+                      Prefetcher, is_network_path, pipe_output_ok, read_chunks)
+import tags
+
+class DedupClaim(NamedTuple):
+    """Contenuto in lavorazione: impronte della sorgente ed eventuale output già esistente da riusare"""
+    key: tuple
+    full_hash: Optional[str]
+    existing: Optional[Path]
 
-    return os.path.join(base_path, relative_path)
 
-def t(key):
-    """Helper per le traduzioni"""
-    return locales.TRANSLATIONS[CURRENT_LANG].get(key, key)
+class LoudnessInfo(NamedTuple):
+    """Misure EBU R128 del primo passaggio loudnorm (LUFS, dBTP, LU)"""
+    integrated: float
+    true_peak: float
+    lra: float
+    threshold: float
+
+
+class MediaInfo(NamedTuple):
+    """Caratteristiche del primo stream audio, lette una sola volta per file"""
+    codec: Optional[str]
+    bit_rate: int           # per gli MP3 VBR letti dagli header: 0 (nessun bitrate costante)
+    sample_rate: int
+    channels: int
+    duration: float
+
+def scan_audio_files(root: Path, formats, on_error=None):
+    """Generatore dei file audio sotto root: os.scandir riusa il tipo già letto dal DirEntry"""
+    stack = [str(root)]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as entries:
+                subdirs = []
+                for entry in entries:
+                    try:
+                        # Come rglob: i link simbolici a cartelle non vengono attraversati
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.path)
+                        elif entry.is_file() and os.path.splitext(entry.name)[1].lower() in formats:
+                            yield Path(entry.path)
+                    except OSError as e:
+                        if on_error:
+                            on_error(e)
+        except OSError as e:
+            if on_error:
+                on_error(e)
+            continue
+        # Ordine alfabetico inverso sullo stack: le sottocartelle vengono visitate in ordine
+        stack.extend(sorted(subdirs, reverse=True))
 
 class SimpleConformer:
     """Versione semplificata e robusta del conformer"""
@@ -62,36 +100,146 @@ class SimpleConformer:
     SUPPORTED_FORMATS = {'.mp3', '.flac', '.wav', '.m4a', '.aac', '.ogg'}
     TARGET_SAMPLE_RATE = 44100
     TARGET_BITRATE = 192
+    # Gli output vengono scritti in un file temporaneo accanto alla destinazione e rinominati a fine scrittura
+    TEMP_SUFFIX = '.conformer-tmp'
     FFMPEG_PATH = None
+    FFPROBE_PATH = None
+    # Timeout di un encode: margine fisso più una volta la durata (senza durata nota, ENCODE_TIMEOUT_UNKNOWN)
+    ENCODE_TIMEOUT_BASE = 300
+    ENCODE_TIMEOUT_UNKNOWN = 3600
+    # Normalizzazione EBU R128: picco vero massimo, range di loudness e scarto tollerato sugli MP3 già conformi
+    LOUDNESS_TRUE_PEAK = -1.5
+    LOUDNESS_RANGE = 11.0
+    LOUDNESS_TOLERANCE = 1.0
+    SCHEDULES = ('lpt', 'scan')
     
-    def __init__(self, input_dir: str, output_dir: str, progress_callback=None):
+    def __init__(self, input_dir: str, output_dir: str, progress_callback=None, jobs: int = 1,
+                 probe_cache: Optional[ProbeCache] = None, manifest: Optional[SyncManifest] = None,
+                 report_dir=None, prometheus_path=None, timeout: Optional[float] = None,
+                 runner: Optional[FFmpegRunner] = None, copy_strategy: str = 'auto',
+                 content_index: Optional[ContentIndex] = None, loudness_target: Optional[float] = None,
+                 loudness_cache: Optional[LoudnessCache] = None, schedule: str = 'lpt', priorities=(),
+                 executor: Optional[concurrent.futures.Executor] = None, cache_namespace: str = '',
+                 profiles=None, limits: Optional[ResourceLimits] = None, governor: Optional[Governor] = None,
+                 io_mode: str = 'auto', prefetch: int = DEFAULT_PREFETCH,
+                 prefetch_memory: int = DEFAULT_PREFETCH_MEMORY, carry_tags: bool = True, artwork: bool = True,
+                 artwork_size: int = tags.ARTWORK_MAX_SIZE):
         self.input_dir = Path(input_dir)
         self.output_dir = Path(output_dir)
         self.progress_callback = progress_callback
+        self.jobs = max(1, int(jobs))
         self.stop_requested = False
+        self._lock = threading.Lock()
+        # Identifica i file temporanei di questa istanza: la pulizia all'avvio non deve toccarli
+        self._run_token = uuid.uuid4().hex[:8]
         self.stats = {
             'processed': 0,
             'copied': 0,
             'converted': 0,
             'errors': 0,
-            'skipped': 0
+            'skipped': 0,
+            'removed': 0,
+            'probe_cache_hits': 0,
+            'probe_cache_misses': 0,
+            'deduplicated': 0,
+            'dedup_seconds_saved': 0.0,
+            'loudness_measured': 0,
+            'loudness_cache_hits': 0,
+            'loudness_reencoded': 0,
+            'header_scans': 0,
+            'streamed': 0,
+            'prefetched': 0,
+            'tagged': 0
         }
+        self.estimated_total = 0
+        # Cartelle o voci illeggibili durante la scansione: con errori la rimozione degli orfani non è sicura
+        self.scan_errors = 0
+        # Report di esecuzione: sempre raccolto in memoria, scritto su disco solo se report_dir è indicato
+        self.report_dir = report_dir
+        self.prometheus_path = prometheus_path
+        self.report = None
+        self.probe_cache = probe_cache
+        # Prefisso delle chiavi quando la cache probe è condivisa da più librerie (modalità batch)
+        self.cache_namespace = cache_namespace
+        # Con un manifest la modalità è incrementale: si rielabora solo ciò che è cambiato
+        self.manifest = manifest
         self.FFMPEG_PATH = self._find_ffmpeg()
+        self.FFPROBE_PATH = self._find_ffprobe(self.FFMPEG_PATH)
+        self.runner = runner or FFmpegRunner(self.FFMPEG_PATH, self.FFPROBE_PATH)
+        self.timeout = timeout
+        if copy_strategy not in fastcopy.STRATEGIES:
+            raise ValueError(f"Strategia di copia non valida: {copy_strategy}")
+        # Strategia per i file già conformi e conteggio di quella effettivamente usata (reflink, copy, ...)
+        self.copy_strategy = copy_strategy
+        self.copy_methods = {}
+        # Con un indice dei contenuti i duplicati riusano l'output già codificato invece di riconvertire
+        self.content_index = content_index
+        self._dedup_inflight = {}
+        # Target di loudness integrata in LUFS (None = nessuna normalizzazione)
+        self.loudness_target = loudness_target
+        self.loudness_cache = loudness_cache
+        if schedule not in self.SCHEDULES:
+            raise ValueError(f"Ordine di elaborazione non valido: {schedule}")
+        # 'lpt': prima le cartelle prioritarie, poi i file più costosi; 'scan': ordine della scansione
+        self.schedule = schedule
+        self.priority_rules = priorities if isinstance(priorities, PriorityRules) else PriorityRules(priorities)
+        self.scheduler = None
+        self._run_started = None
+        # Avanzamento aggregato: i worker aggiornano contatori, la GUI li legge a frequenza fissa
+        self.progress = ProgressTracker()
+        # Pool esterno condiviso (modalità batch): se assente run() crea il proprio pool di self.jobs worker
+        self.executor = executor
+        # Nice, ionice e affinità dei worker (ereditati da ffmpeg) e parallelismo adattivo al carico
+        self.limits = limits
+        self.governor = governor
+        if io_mode not in IO_MODES:
+            raise ValueError(f"Modalità di I/O non valida: {io_mode}")
+        # 'stream': sorgente e output passano da pipe a blocchi grandi; 'auto' la sceglie sulle condivisioni di rete
+        self.io_mode = io_mode
+        self.streaming = io_mode == 'stream' or (
+            io_mode == 'auto' and (is_network_path(self.input_dir) or is_network_path(self.output_dir)))
+        self.prefetch = max(0, int(prefetch))
+        self.prefetch_memory = prefetch_memory
+        self.prefetcher = None
+        # Tag e copertina della sorgente scritti negli output convertiti (mutagen); senza, la mappatura di ffmpeg
+        self.carry_tags = carry_tags and tags.available()
+        if carry_tags and not self.carry_tags:
+            logging.getLogger(__name__).warning("mutagen non installato: i tag restano quelli copiati da ffmpeg")
+        self.artwork = tags.ArtworkProcessor(artwork_size) if artwork else None
+        # Profili di output: il primo è il principale (manifest, deduplicazione); senza profili, MP3 CBR classico
+        self.profiles = resolve_profiles(profiles) if profiles else [
+            mp3_cbr(self.TARGET_BITRATE, self.TARGET_SAMPLE_RATE, name=DEFAULT_PROFILE)]
+        self.profile = self.profiles[0]
+        if content_index is not None and len(self.profiles) > 1:
+            raise ValueError("La deduplicazione richiede un solo profilo di output")
+        if self.profile.bitrate is not None:
+            self.TARGET_BITRATE = self.profile.bitrate
+        self.TARGET_SAMPLE_RATE = self.profile.sample_rate
         
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(message)s',
-            handlers=[
-                logging.FileHandler('conformer.log', encoding='utf-8'),
-                logging.StreamHandler()
-            ]
-        )
+        # Il logging è configurato una volta per processo (logsetup.configure_logging), non per istanza
         self.logger = logging.getLogger(__name__)
+        self.file_logger = logging.getLogger(FILE_LOGGER_NAME)
     
     def stop(self):
         self.stop_requested = True
+        if self.scheduler is not None:
+            self.scheduler.stop()
+        # Termina gli encode in corso: i file parziali vengono rimossi da convert_to_mp3
+        self.runner.terminate_all()
+
+    def _count(self, key: str, amount=1):
+        with self._lock:
+            self.stats[key] += amount
+
+    def _remove_file(self, path: Path):
+        try:
+            if path.exists():
+                path.unlink()
+        except OSError as e:
+            self.logger.warning(f"Impossibile rimuovere file parziale {path.name}: {e}")
 
-    def _find_ffmpeg(self) -> str:
+    @staticmethod
+    def _find_ffmpeg() -> str:
         import subprocess
         try:
             result = subprocess.run(['ffmpeg', '-version'], 
@@ -111,366 +259,1282 @@ class SimpleConformer:
                 if Path(path).exists():
                     return path
         return 'ffmpeg'
+
+    @staticmethod
+    def _find_ffprobe(ffmpeg_path: str) -> str:
+        """ffprobe è distribuito accanto a ffmpeg: stesso percorso, nome diverso"""
+        ffmpeg_file = Path(ffmpeg_path)
+        if ffmpeg_file.parent == Path('.'):
+            return 'ffprobe'
+        return str(ffmpeg_file.with_name(ffmpeg_file.name.replace('ffmpeg', 'ffprobe')))
+
+    def probe_media(self, file_path: Path) -> Optional[MediaInfo]:
+        """Unico ffprobe per file (o lettura dalla cache): guida sia la scelta copia/conversione sia gli argomenti ffmpeg"""
+        if file_path.suffix.lower() == '.mp3':
+            info = self._mp3_header_info(file_path)
+            if info is not None:
+                return info
+        cache_key = None
+        if self.probe_cache is not None:
+            cache_key = self._probe_cache_key(file_path, file_path.stat())
+            cached = self.probe_cache.get(*cache_key)
+            if cached is not None:
+                self._count('probe_cache_hits')
+                return MediaInfo(**cached)
+            self._count('probe_cache_misses')
+        
+        probe = self.runner.probe(str(file_path))
+        for stream in probe.get('streams', []):
+            if stream['codec_type'] == 'audio':
+                info = MediaInfo(
+                    codec=stream.get('codec_name'),
+                    bit_rate=int(stream.get('bit_rate', 0)),
+                    sample_rate=int(stream.get('sample_rate', 0)),
+                    channels=int(stream.get('channels', 0)),
+                    duration=float(stream.get('duration') or probe.get('format', {}).get('duration') or 0)
+                )
+                if cache_key is not None:
+                    self.probe_cache.put(*cache_key, info._asdict())
+                return info
+        return None
+
+    def _mp3_header_info(self, file_path: Path) -> Optional[MediaInfo]:
+        """MP3: header dei frame e tag Xing/Info al posto di ffprobe; None se ambiguo"""
+        header = mp3header.read_mp3_info(file_path)
+        if header is None:
+            return None
+        self._count('header_scans')
+        # Il bitrate medio di un VBR non va confrontato con quello di un profilo CBR
+        return MediaInfo('mp3', 0 if header.vbr else header.bitrate * 1000, header.sample_rate,
+                         header.channels, header.duration)
+
+    def _probe_cache_key(self, file_path: Path, stat) -> tuple:
+        """Chiave della cache probe; con una cache condivisa tra librerie il percorso relativo va qualificato"""
+        rel_path = file_path.relative_to(self.input_dir).as_posix()
+        if self.cache_namespace:
+            rel_path = f"{self.cache_namespace}/{rel_path}"
+        return rel_path, stat.st_size, stat.st_mtime_ns
+
+    def _probe_or_none(self, file_path: Path) -> Optional[MediaInfo]:
+        try:
+            return self.probe_media(file_path)
+        except Exception as e:
+            self.logger.warning(f"Analisi non riuscita per {file_path.name}, conversione con parametri completi: {e}")
+            return None
     
-    def is_conforming_mp3(self, file_path: Path) -> bool:
-        if file_path.suffix.lower() != '.mp3':
+    def is_conforming(self, file_path: Path, info: Optional[MediaInfo] = None,
+                      profile: Optional[Profile] = None) -> bool:
+        """Vero se il file può essere copiato così com'è come output del profilo"""
+        profile = profile or self.profile
+        if file_path.suffix.lower() != profile.extension:
             return False
         try:
-            probe = ffmpeg.probe(str(file_path), cmd=self.FFMPEG_PATH)
-            for stream in probe['streams']:
-                if stream['codec_type'] == 'audio':
-                    bitrate = int(stream.get('bit_rate', 0))
-                    sample_rate = int(stream.get('sample_rate', 0))
-                    bitrate_ok = abs(bitrate - self.TARGET_BITRATE * 1000) < 10000
-                    sample_rate_ok = sample_rate == self.TARGET_SAMPLE_RATE
-                    return bitrate_ok and sample_rate_ok
-            return False
+            if info is None:
+                info = self.probe_media(file_path)
+            if info is None:
+                return False
+            return profile.matches(file_path.suffix.lower(), info.codec, info.bit_rate,
+                                   info.sample_rate, info.channels)
         except:
             return False
+
+    def is_conforming_mp3(self, file_path: Path, info: Optional[MediaInfo] = None) -> bool:
+        # Nome storico: confronta con il profilo principale, che può anche non essere MP3
+        return self.is_conforming(file_path, info, self.profile)
+
+    def measure_loudness(self, file_path: Path, info: Optional[MediaInfo] = None) -> Optional[LoudnessInfo]:
+        """Primo passaggio loudnorm, eseguito una sola volta per sorgente grazie alla cache"""
+        cache_key = None
+        if self.loudness_cache is not None:
+            stat = file_path.stat()
+            cache_key = (file_path.relative_to(self.input_dir).as_posix(), stat.st_size, stat.st_mtime_ns)
+            cached = self.loudness_cache.get(*cache_key)
+            if cached is not None:
+                self._count('loudness_cache_hits')
+                return LoudnessInfo(**cached)
+        try:
+            measured = self.runner.measure_loudness(
+                str(file_path), self.loudness_target, self.LOUDNESS_TRUE_PEAK, self.LOUDNESS_RANGE,
+                timeout=self.encode_timeout(info))
+            loudness = LoudnessInfo(
+                integrated=float(measured['input_i']),
+                true_peak=float(measured['input_tp']),
+                lra=float(measured['input_lra']),
+                threshold=float(measured['input_thresh'])
+            )
+        except Exception as e:
+            if not self.stop_requested:
+                self.logger.warning(f"Misura loudness non riuscita per {file_path.name}, loudnorm a passaggio singolo: {e}")
+            return None
+        self._count('loudness_measured')
+        if cache_key is not None:
+            self.loudness_cache.put(*cache_key, loudness._asdict())
+        return loudness
+
+    def is_loudness_conforming(self, loudness: Optional[LoudnessInfo]) -> bool:
+        if loudness is None or not math.isfinite(loudness.integrated):
+            return False
+        return (abs(loudness.integrated - self.loudness_target) <= self.LOUDNESS_TOLERANCE
+                and loudness.true_peak <= self.LOUDNESS_TRUE_PEAK + self.LOUDNESS_TOLERANCE)
+
+    def loudnorm_filter(self, loudness: Optional[LoudnessInfo] = None) -> str:
+        """Secondo passaggio loudnorm con le misure del primo (lineare); senza misure, passaggio singolo dinamico"""
+        params = [f"I={self.loudness_target:g}", f"TP={self.LOUDNESS_TRUE_PEAK:g}", f"LRA={self.LOUDNESS_RANGE:g}"]
+        if loudness is not None and all(math.isfinite(value) for value in loudness):
+            params += [f"measured_I={loudness.integrated:g}", f"measured_TP={loudness.true_peak:g}",
+                       f"measured_LRA={loudness.lra:g}", f"measured_thresh={loudness.threshold:g}",
+                       "linear=true"]
+        return 'loudnorm=' + ':'.join(params)
+
+    def encode_args(self, info: Optional[MediaInfo] = None, loudness: Optional[LoudnessInfo] = None,
+                    profile: Optional[Profile] = None) -> list:
+        """Argomenti di output ffmpeg: resample e downmix solo se la sorgente non è già nel formato target"""
+        profile = profile or self.profile
+        args = ['-c:a', profile.encoder] + profile.rate_args()
+        if self.loudness_target is not None:
+            args += ['-af', self.loudnorm_filter(loudness)]
+        # loudnorm lavora internamente a 192 kHz: con il filtro la frequenza di uscita va sempre indicata
+        if info is None or info.sample_rate != profile.sample_rate or self.loudness_target is not None:
+            args += ['-ar', str(profile.sample_rate)]
+        if info is None or info.channels != profile.channels:
+            args += ['-ac', str(profile.channels)]
+        return args
+
+    def encode_timeout(self, info: Optional[MediaInfo] = None, outputs: int = 1) -> Optional[float]:
+        """Timeout per file: un decoder bloccato non deve occupare un worker per sempre"""
+        if self.timeout is not None:
+            return self.timeout or None
+        if info is not None and info.duration > 0:
+            # La decodifica è una sola, ma ogni output ha il proprio encoder
+            return self.ENCODE_TIMEOUT_BASE + info.duration * outputs
+        return self.ENCODE_TIMEOUT_UNKNOWN
     
+    def _temp_path(self, dst: Path) -> Path:
+        return dst.with_name(f".{dst.name}.{self._run_token}-{uuid.uuid4().hex[:8]}{self.TEMP_SUFFIX}")
+
+    def _finalize_output(self, tmp: Path, dst: Path):
+        """Rende definitivo un output completo: fsync del contenuto, poi rename atomico"""
+        with open(tmp, 'rb') as f:
+            os.fsync(f.fileno())
+        os.replace(str(tmp), str(dst))
+        if os.name != 'nt':
+            # Su POSIX serve l'fsync della cartella perché il rename sopravviva a un crash
+            dir_fd = os.open(str(dst.parent), os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+
+    def cleanup_stale_temp_files(self, min_age: Optional[float] = None) -> int:
+        """Rimuove i file temporanei lasciati da esecuzioni interrotte; con min_age solo quelli non modificati
+        da almeno min_age secondi (altre istanze, ad esempio i worker di una coda, scrivono nella stessa cartella)"""
+        removed = 0
+        cutoff = time.time() - min_age if min_age is not None else None
+        for tmp in scan_audio_files(self.output_dir, {self.TEMP_SUFFIX}):
+            if self.stop_requested:
+                break
+            if f".{self._run_token}-" in tmp.name:
+                continue
+            if cutoff is not None:
+                try:
+                    if tmp.stat().st_mtime > cutoff:
+                        continue
+                except OSError:
+                    continue
+            self._remove_file(tmp)
+            removed += 1
+        if removed:
+            self.logger.info(f"Rimossi {removed} file temporanei di esecuzioni interrotte")
+        return removed
+
     def safe_copy(self, src: Path, dst: Path) -> bool:
+        tmp = self._temp_path(dst)
         try:
             dst.parent.mkdir(parents=True, exist_ok=True)
-            shutil.copy2(str(src), str(dst))
+            method = fastcopy.copy_file(src, tmp, self.copy_strategy)
+            self._finalize_output(tmp, dst)
+            with self._lock:
+                self.copy_methods[method] = self.copy_methods.get(method, 0) + 1
             return True
         except Exception as e:
-            self.logger.error(f"Errore copia {src.name}: {e}")
+            self._remove_file(tmp)
+            if not self._check_disk_full(e):
+                self.logger.error(f"Errore copia {src.name}: {e}")
             return False
     
-    def convert_to_mp3(self, src: Path, dst: Path) -> bool:
+    def convert_to_mp3(self, src: Path, dst: Path, info: Optional[MediaInfo] = None,
+                       loudness: Optional[LoudnessInfo] = None) -> bool:
+        """Converte nel profilo principale (nome storico: il profilo può anche non essere MP3)"""
+        return self.convert_multi(src, [(self.profile, dst)], info=info, loudness=loudness)
+
+    def convert_multi(self, src: Path, targets: list, info: Optional[MediaInfo] = None,
+                      loudness: Optional[LoudnessInfo] = None) -> bool:
+        """Codifica più profili con un solo processo ffmpeg: la sorgente viene decodificata una volta"""
+        temps = [(self._temp_path(dst), dst) for _, dst in targets]
+        source = self._stream_source(src)
         try:
-            dst.parent.mkdir(parents=True, exist_ok=True)
-            stream = ffmpeg.input(str(src))
-            stream = ffmpeg.output(
-                stream, str(dst),
-                acodec='libmp3lame',
-                audio_bitrate=f'{self.TARGET_BITRATE}k',
-                ar=self.TARGET_SAMPLE_RATE,
-                ac=2
-            )
-            ffmpeg.run(stream, overwrite_output=True, quiet=True, cmd=self.FFMPEG_PATH)
+            outputs = []
+            for (profile, dst), (tmp, _) in zip(targets, temps):
+                dst.parent.mkdir(parents=True, exist_ok=True)
+                # Il file temporaneo non ha l'estensione finale: il formato va indicato esplicitamente
+                outputs.append((self._map_args(profile) + self.encode_args(info, loudness, profile)
+                                + ['-f', profile.container], str(tmp)))
+            tag_set = self.source_tags(src)
+            tagged = set()
+            input_name, pipes = str(src), {}
+            if source is not None:
+                input_name, pipes = 'pipe:0', {'stdin': source}
+            if len(outputs) == 1 and self.streaming and pipe_output_ok(targets[0][0]):
+                # Output da stdout scritto a blocchi grandi invece delle piccole scritture di ffmpeg
+                with open(outputs[0][1], 'wb', buffering=WRITE_BUFFER) as sink:
+                    if tag_set and targets[0][0].container == 'mp3':
+                        # Tag ID3 scritto davanti all'audio: nessuna riscrittura del file dopo la codifica
+                        sink.write(tags.id3_bytes(tag_set))
+                        tagged.add(outputs[0][1])
+                    self.runner.encode(input_name, 'pipe:1', outputs[0][0], timeout=self.encode_timeout(info),
+                                       stdout=sink, **pipes)
+            elif len(outputs) == 1:
+                self.runner.encode(input_name, outputs[0][1], outputs[0][0], timeout=self.encode_timeout(info),
+                                   **pipes)
+            else:
+                self.runner.encode_multi(input_name, outputs, timeout=self.encode_timeout(info, len(outputs)),
+                                         **pipes)
+            if self.streaming:
+                self._count('streamed')
+            for (profile, _), (tmp, dst) in zip(targets, temps):
+                if tag_set and str(tmp) not in tagged:
+                    self._write_tags(tmp, dst, profile, tag_set)
+                elif tag_set:
+                    self._count('tagged')
+                self._finalize_output(tmp, dst)
             return True
         except Exception as e:
-            self.logger.error(f"Errore conversione {src.name}: {e}")
+            for tmp, _ in temps:
+                self._remove_file(tmp)
+            if self._check_disk_full(e):
+                return False
+            if self.stop_requested:
+                self.logger.info(f"Conversione interrotta: {src.name}")
+            else:
+                self.logger.error(f"Errore conversione {src.name}: {e}")
             return False
+        finally:
+            if source is not None:
+                # Già chiusa da ffexec se ffmpeg è partito; qui libera i blocchi letti in anticipo negli altri casi
+                source.close()
     
-    def process_single_file(self, file_path: Path) -> bool:
+    def _map_args(self, profile: Profile) -> list:
+        """Con i tag gestiti da mutagen ffmpeg produce solo l'audio: niente metadati né copertina come stream video"""
+        if not self.carry_tags:
+            return []
+        args = ['-map', '0:a:0', '-map_metadata', '-1']
+        if profile.container == 'mp3':
+            args += ['-write_id3v2', '0']
+        return args
+
+    def source_tags(self, src: Path) -> Optional[tags.TagSet]:
+        """Tag e copertina della sorgente da riportare negli output; None se non gestiti o illeggibili"""
+        if not self.carry_tags:
+            return None
+        try:
+            tag_set = tags.read_tags(src)
+        except Exception as e:
+            self.logger.warning(f"Tag illeggibili in {src.name}: {e}")
+            return None
+        fields = tag_set.fields
+        if self.loudness_target is not None:
+            # Dopo la normalizzazione i valori ReplayGain della sorgente non descrivono più l'audio
+            fields = {key: value for key, value in fields.items() if not key.startswith('replaygain_')}
+        artwork = tag_set.artwork
+        if artwork is not None:
+            artwork = self.artwork.process(artwork) if self.artwork is not None else None
+        return tags.TagSet(fields, artwork)
+
+    def _write_tags(self, tmp: Path, dst: Path, profile: Profile, tag_set: tags.TagSet):
+        """Tag nel file temporaneo, prima dell'fsync e del rename: l'output finale non viene più riaperto"""
+        try:
+            tags.write_tags(tmp, profile.container, tag_set)
+            self._count('tagged')
+        except Exception as e:
+            # L'audio è valido: un tag non scrivibile non fa fallire la conversione
+            self.logger.warning(f"Impossibile scrivere i tag di {dst.name}: {e}")
+
+    def _stream_source(self, src: Path):
+        """Blocchi della sorgente per stdin (letti in anticipo se disponibili); None se ffmpeg legge il file da sé"""
+        if not self.streaming or src.suffix.lower() not in PIPE_INPUT_FORMATS:
+            return None
+        source = self.prefetcher.take(src) if self.prefetcher is not None else None
+        if source is not None:
+            self._count('prefetched')
+            return source
+        return read_chunks(src)
+
+    def _prefetch_wanted(self, file_path: Path) -> bool:
+        """Lettura anticipata solo dei file che verranno probabilmente codificati (senza ffprobe né statistiche)"""
+        if file_path.suffix.lower() not in PIPE_INPUT_FORMATS:
+            return False
+        targets = [self.output_path_for(file_path, profile) for profile in self.profiles]
+        if all(dst.exists() for dst in targets) and (
+                self.manifest is None or self.is_up_to_date(file_path, targets[0])):
+            return False
+        if self.loudness_target is not None:
+            return True
+        info = None
+        if self.probe_cache is not None:
+            try:
+                cached = self.probe_cache.peek(*self._probe_cache_key(file_path, file_path.stat()))
+            except OSError:
+                return False
+            info = MediaInfo(**cached) if cached is not None else None
+        if info is None and file_path.suffix.lower() == '.mp3':
+            header = mp3header.read_mp3_info(file_path)
+            if header is not None:
+                info = MediaInfo('mp3', 0 if header.vbr else header.bitrate * 1000, header.sample_rate,
+                                 header.channels, header.duration)
+        # Un file già conforme a tutti i profili viene copiato, non letto da ffmpeg
+        return info is None or not all(self.is_conforming(file_path, info, profile) for profile in self.profiles)
+
+    def _check_disk_full(self, error: Exception) -> bool:
+        """Volume di output pieno: si interrompe subito, ogni file successivo fallirebbe allo stesso modo"""
+        # OSError da copia e rename, oppure messaggio di ffmpeg nella coda di stderr
+        stderr = getattr(error, 'stderr', None) or b''
+        if getattr(error, 'errno', None) != errno.ENOSPC and b'No space left on device' not in stderr:
+            return False
+        if not self.stop_requested:
+            self.logger.error(f"Spazio esaurito nella cartella di output {self.output_dir}: elaborazione interrotta")
+            self.stop()
+        return True
+
+    def output_path_for(self, file_path: Path, profile: Optional[Profile] = None) -> Path:
+        """Con più profili ogni profilo ha la propria sottocartella dell'output"""
+        profile = profile or self.profile
+        relative = file_path.relative_to(self.input_dir).with_suffix(profile.extension)
+        if len(self.profiles) > 1:
+            return self.output_dir / profile.name / relative
+        return self.output_dir / relative
+
+    @contextlib.contextmanager
+    def _timed(self, timings: dict, stage: str):
+        start = time.perf_counter()
         try:
-            rel_path = file_path.relative_to(self.input_dir)
-            output_path = self.output_dir / rel_path.with_suffix('.mp3')
+            yield
+        finally:
+            timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+
+    def process_single_file(self, file_path: Path, force: bool = False) -> bool:
+        """Elabora un file; con force lo rielabora anche se l'output esiste (sorgente cambiata, modalità watch)"""
+        if self.stop_requested:
+            return False
+        timings = {}
+        start = time.perf_counter()
+        self.progress.started(file_path.name)
+        try:
+            outcome = self._process_file(file_path, timings, force)
+        finally:
+            self.progress.ended()
+            if self.prefetcher is not None:
+                # File saltato o copiato: la lettura anticipata non serve più
+                self.prefetcher.discard(file_path)
+        total_seconds = time.perf_counter() - start
+        if self.report is not None:
+            self._report_file(file_path, outcome, timings, total_seconds)
+        if self.file_logger.isEnabledFor(logging.INFO):
+            self._log_file(file_path, outcome, timings, total_seconds)
+        return outcome in ('skipped', 'copied', 'converted', 'deduplicated')
+
+    def _log_file(self, file_path: Path, outcome: str, timings: dict, total_seconds: float):
+        """Record strutturato per file (solo nel log JSON): esito e tempi per fase"""
+        self.file_logger.info(f"{file_path.name}: {outcome}", extra={'fields': {
+            'event': 'file',
+            'path': str(file_path),
+            'outcome': outcome,
+            'seconds': round(total_seconds, 4),
+            'timings': {stage: round(seconds, 4) for stage, seconds in timings.items()},
+        }})
+
+    def _report_file(self, file_path: Path, outcome: str, timings: dict, total_seconds: float):
+        bytes_in = bytes_out = 0
+        if outcome in ('copied', 'converted', 'deduplicated'):
+            try:
+                bytes_in = file_path.stat().st_size
+                bytes_out = self.output_path_for(file_path).stat().st_size
+            except OSError:
+                pass
+        try:
+            rel_path = file_path.relative_to(self.input_dir).as_posix()
+        except ValueError:
+            rel_path = str(file_path)
+        self.report.record_file(rel_path, outcome, timings, total_seconds, bytes_in, bytes_out)
+
+    def _process_file(self, file_path: Path, timings: dict, force: bool = False) -> str:
+        """Elabora un file e restituisce l'esito: skipped, copied, converted, error o stopped"""
+        if len(self.profiles) > 1:
+            return self._process_multi(file_path, timings, force)
+        try:
+            output_path = self.output_path_for(file_path)
             
-            if output_path.exists():
-                self.stats['skipped'] += 1
-                return True
+            with self._timed(timings, 'check'):
+                if force:
+                    up_to_date = False
+                elif self.manifest is not None:
+                    up_to_date = self.is_up_to_date(file_path, output_path)
+                else:
+                    up_to_date = output_path.exists()
+            if up_to_date:
+                self._count('skipped')
+                return 'skipped'
             
             if file_path.suffix.lower() not in self.SUPPORTED_FORMATS:
-                self.stats['skipped'] += 1
-                return True
+                self._count('skipped')
+                return 'skipped'
             
-            if self.is_conforming_mp3(file_path):
-                if self.safe_copy(file_path, output_path):
-                    self.stats['copied'] += 1
-                    self.stats['processed'] += 1
-                    return True
+            with self._timed(timings, 'probe'):
+                info = self._probe_or_none(file_path)
+            loudness = None
+            loudness_checked = False
+            conforming = info is not None and self.is_conforming_mp3(file_path, info)
+            if conforming and self.loudness_target is not None:
+                with self._timed(timings, 'loudness'):
+                    loudness = self.measure_loudness(file_path, info)
+                loudness_checked = True
+                if not self.is_loudness_conforming(loudness):
+                    # Formato già conforme ma livello fuori target: si ricodifica con loudnorm
+                    conforming = False
+                    self._count('loudness_reencoded')
+            if conforming:
+                with self._timed(timings, 'copy'):
+                    copied = self.safe_copy(file_path, output_path)
+                if copied:
+                    self._record_sync(file_path, output_path, 'copied')
+                    self._count('copied')
+                    self._count('processed')
+                    return 'copied'
                 else:
-                    self.stats['errors'] += 1
-                    return False
+                    self._count('errors')
+                    return 'error'
             
-            if self.convert_to_mp3(file_path, output_path):
-                self.stats['converted'] += 1
-                self.stats['processed'] += 1
-                return True
+            claim = None
+            if self.content_index is not None:
+                with self._timed(timings, 'dedup'):
+                    claim = self._claim_content(file_path)
+            try:
+                if claim is not None and claim.existing is not None:
+                    with self._timed(timings, 'copy'):
+                        reused = self.safe_copy(claim.existing, output_path)
+                    if reused:
+                        self._record_sync(file_path, output_path, 'deduplicated')
+                        self._count('deduplicated')
+                        self._count('dedup_seconds_saved', info.duration if info is not None else 0.0)
+                        self._count('processed')
+                        return 'deduplicated'
+                
+                if self.loudness_target is not None and not loudness_checked:
+                    # Misura solo dopo la deduplicazione: un duplicato non richiede nessuna decodifica
+                    with self._timed(timings, 'loudness'):
+                        loudness = self.measure_loudness(file_path, info)
+                with self._timed(timings, 'encode'):
+                    converted = self.convert_to_mp3(file_path, output_path, info=info, loudness=loudness)
+                if converted and claim is not None:
+                    with self._timed(timings, 'dedup'):
+                        self._index_content(file_path, output_path, claim)
+            finally:
+                if claim is not None:
+                    self._release_claim(claim)
+            if converted:
+                self._record_sync(file_path, output_path, 'converted')
+                self._count('converted')
+                self._count('processed')
+                return 'converted'
+            elif self.stop_requested:
+                # Encode interrotto da stop(): non è un errore del file
+                return 'stopped'
             else:
-                self.stats['errors'] += 1
-                return False
+                self._count('errors')
+                return 'error'
                 
         except Exception as e:
             self.logger.error(f"Errore generale su {file_path.name}: {e}")
-            self.stats['errors'] += 1
-            return False
+            self._count('errors')
+            return 'error'
     
-    def run(self):
-        self.logger.info("=== INIZIO ELABORAZIONE ===")
-        all_files = list(self.input_dir.rglob("*"))
-        audio_files = [f for f in all_files if f.is_file() and f.suffix.lower() in self.SUPPORTED_FORMATS]
-        total_files = len(audio_files)
-        
-        for i, file_path in enumerate(audio_files, 1):
-            if self.stop_requested:
-                break
-            self.process_single_file(file_path)
-            if self.progress_callback:
-                self.progress_callback(i, total_files, file_path.name)
-
-class LanguageSelectionDialog(ctk.CTk):
-    def __init__(self):
-        super().__init__()
-        self.title("Language Selection")
-        self.geometry("400x300")
-        self.resizable(False, False)
-        
-        # Center window
-        screen_width = self.winfo_screenwidth()
-        screen_height = self.winfo_screenheight()
-        x = (screen_width - 400) // 2
-        y = (screen_height - 300) // 2
-        self.geometry(f"400x300+{x}+{y}")
+    def _process_multi(self, file_path: Path, timings: dict, force: bool = False) -> str:
+        """Più profili: copia gli output già conformi e codifica gli altri con una sola decodifica"""
+        try:
+            targets = [(profile, self.output_path_for(file_path, profile)) for profile in self.profiles]
+            primary_output = targets[0][1]
+            
+            with self._timed(timings, 'check'):
+                # Il manifest registra solo l'output principale: gli altri devono almeno esistere
+                up_to_date = not force and all(dst.exists() for _, dst in targets)
+                if up_to_date and self.manifest is not None:
+                    up_to_date = self.is_up_to_date(file_path, primary_output)
+            if up_to_date or file_path.suffix.lower() not in self.SUPPORTED_FORMATS:
+                self._count('skipped')
+                return 'skipped'
+            
+            with self._timed(timings, 'probe'):
+                info = self._probe_or_none(file_path)
+            loudness = None
+            copy_targets = []
+            if info is not None:
+                copy_targets = [(profile, dst) for profile, dst in targets
+                                if self.is_conforming(file_path, info, profile)]
+            if self.loudness_target is not None:
+                with self._timed(timings, 'loudness'):
+                    loudness = self.measure_loudness(file_path, info)
+                if copy_targets and not self.is_loudness_conforming(loudness):
+                    copy_targets = []
+                    self._count('loudness_reencoded')
+            encode_targets = [target for target in targets if target not in copy_targets]
+            
+            for _, dst in copy_targets:
+                with self._timed(timings, 'copy'):
+                    copied = self.safe_copy(file_path, dst)
+                if not copied:
+                    self._count('errors')
+                    return 'error'
+            if encode_targets:
+                with self._timed(timings, 'encode'):
+                    converted = self.convert_multi(file_path, encode_targets, info=info, loudness=loudness)
+                if not converted:
+                    if self.stop_requested:
+                        return 'stopped'
+                    self._count('errors')
+                    return 'error'
+            outcome = 'converted' if encode_targets else 'copied'
+            self._record_sync(file_path, primary_output, outcome)
+            self._count(outcome)
+            self._count('processed')
+            return outcome
         
-        # Icon
+        except Exception as e:
+            self.logger.error(f"Errore generale su {file_path.name}: {e}")
+            self._count('errors')
+            return 'error'
+    
+    def find_duplicate_output(self, file_path: Path, size: int, partial: str):
+        """Impronta completa (solo se l'impronta parziale è già nota) e output esistente con lo stesso contenuto"""
+        settings = self.settings_signature()
+        if not self.content_index.has_candidates(settings, size, partial):
+            return None, None
+        full = content_hash(file_path)
+        entry = self.content_index.lookup(settings, full)
+        if entry is None:
+            return full, None
+        existing = self.output_dir / entry['out_rel_path']
         try:
-            icon_path = get_resource_path("audioconv.png")
-            if Path(icon_path).exists():
-                self.iconbitmap(icon_path) # Windows only usually
-                img = Image.open(icon_path)
-                self.iconphoto(False, ImageTk.PhotoImage(img))
-        except:
-            pass
+            out_stat = existing.stat()
+        except OSError:
+            out_stat = None
+        if out_stat is None or (out_stat.st_size, out_stat.st_mtime_ns) != (entry['out_size'], entry['out_mtime_ns']):
+            # Output rimosso o modificato dopo la registrazione: non è più una copia fidata
+            self.content_index.remove(settings, full)
+            return full, None
+        return full, existing
 
-        self.grid_columnconfigure(0, weight=1)
-        self.grid_rowconfigure((0, 1, 2, 3), weight=1)
+    def _claim_content(self, file_path: Path) -> DedupClaim:
+        size = file_path.stat().st_size
+        key = (size, partial_hash(file_path, size))
+        while True:
+            with self._lock:
+                busy = self._dedup_inflight.get(key)
+                if busy is None:
+                    self._dedup_inflight[key] = threading.Event()
+                    break
+            # Stesso contenuto in codifica su un altro worker: si attende il suo output invece di ricodificare
+            busy.wait()
+        try:
+            full, existing = self.find_duplicate_output(file_path, *key)
+        except Exception:
+            self._release_claim(DedupClaim(key, None, None))
+            raise
+        return DedupClaim(key, full, existing)
 
-        ctk.CTkLabel(self, text="Select Language / Seleziona Lingua", 
-                     font=("Roboto", 18, "bold")).grid(row=0, column=0, pady=20)
+    def _release_claim(self, claim: DedupClaim):
+        with self._lock:
+            event = self._dedup_inflight.pop(claim.key, None)
+        if event is not None:
+            event.set()
 
-        ctk.CTkButton(self, text="🇮🇹 Italiano", 
-                      command=lambda: self.set_lang('IT'),
-                      font=("Roboto", 14), height=40).grid(row=1, column=0, pady=10, padx=50, sticky="ew")
+    def _index_content(self, file_path: Path, output_path: Path, claim: DedupClaim):
+        try:
+            full = claim.full_hash or content_hash(file_path)
+            out_stat = output_path.stat()
+            self.content_index.record(
+                self.settings_signature(), full, claim.key[0], claim.key[1],
+                output_path.relative_to(self.output_dir).as_posix(), out_stat.st_size, out_stat.st_mtime_ns)
+        except OSError as e:
+            self.logger.warning(f"Impossibile indicizzare il contenuto di {file_path.name}: {e}")
 
-        ctk.CTkButton(self, text="🇬🇧 English", 
-                      command=lambda: self.set_lang('EN'),
-                      font=("Roboto", 14), height=40).grid(row=2, column=0, pady=10, padx=50, sticky="ew")
-        
-        self.lang_selected = None
+    def settings_signature(self) -> str:
+        """Impostazioni che determinano l'output: se cambiano, il manifest forza la rielaborazione"""
+        signature = '+'.join(profile.signature() for profile in self.profiles)
+        if self.loudness_target is not None:
+            signature += f":loudnorm:{self.loudness_target:g}:{self.LOUDNESS_TRUE_PEAK:g}:{self.LOUDNESS_RANGE:g}"
+        return signature
 
-    def set_lang(self, lang):
-        self.lang_selected = lang
-        self.destroy()
+    def is_up_to_date(self, file_path: Path, output_path: Path) -> bool:
+        """Vero se sorgente, output e impostazioni coincidono con quanto registrato nel manifest"""
+        entry = self.manifest.get(file_path.relative_to(self.input_dir).as_posix())
+        if entry is None or entry['settings'] != self.settings_signature():
+            return False
+        try:
+            src_stat = file_path.stat()
+            out_stat = output_path.stat()
+        except OSError:
+            return False
+        return (entry['src_size'] == src_stat.st_size and entry['src_mtime_ns'] == src_stat.st_mtime_ns
+                and entry['out_size'] == out_stat.st_size and entry['out_mtime_ns'] == out_stat.st_mtime_ns)
 
-class App(ctk.CTk):
-    def __init__(self):
-        super().__init__()
+    def _record_sync(self, file_path: Path, output_path: Path, action: str):
+        if self.manifest is None:
+            return
+        src_stat = file_path.stat()
+        out_stat = output_path.stat()
+        self.manifest.record(
+            file_path.relative_to(self.input_dir).as_posix(), src_stat.st_size, src_stat.st_mtime_ns,
+            output_path.relative_to(self.output_dir).as_posix(), out_stat.st_size, out_stat.st_mtime_ns,
+            self.settings_signature(), action)
 
-        # Configuration
-        self.title(f"{t('app_title')} - {t('version_name')} v{APP_VERSION}")
-        self.geometry("800x700")
-        ctk.set_appearance_mode("Dark")
-        ctk.set_default_color_theme("dark-blue")
-        
-        # Icon
-        try:
-            icon_path = get_resource_path("audioconv.png")
-            if Path(icon_path).exists():
-                self.iconbitmap(icon_path)
-                self.icon_image = ctk.CTkImage(Image.open(icon_path), size=(40, 40))
-                self.large_icon = ctk.CTkImage(Image.open(icon_path), size=(100, 100))
-            else:
-                self.icon_image = None
-                self.large_icon = None
-        except:
-            self.icon_image = None
-            self.large_icon = None
-
-        # Variables
-        self.input_path = ctk.StringVar()
-        self.output_path = ctk.StringVar()
-        self.status_text = ctk.StringVar(value=t('status_ready'))
-        self.current_conformer = None
-
-        self.setup_ui()
-
-    def setup_ui(self):
-        # Grid Layout
-        self.grid_columnconfigure(0, weight=1)
-        self.grid_rowconfigure(0, weight=0) # Header
-        self.grid_rowconfigure(1, weight=1) # Content
-        self.grid_rowconfigure(2, weight=0) # Footer
-
-        # === Header ===
-        header_frame = ctk.CTkFrame(self, corner_radius=0)
-        header_frame.grid(row=0, column=0, sticky="ew")
-        
-        header_content = ctk.CTkFrame(header_frame, fg_color="transparent")
-        header_content.pack(pady=10)
-        
-        if self.icon_image:
-            ctk.CTkLabel(header_content, image=self.icon_image, text="").pack(side="left", padx=10)
-            
-        ctk.CTkLabel(header_content, text=t('app_title'), font=("Roboto", 20, "bold")).pack(side="left")
-        ctk.CTkLabel(header_content, text=f"v{APP_VERSION}", font=("Roboto", 12), text_color="gray").pack(side="left", padx=5, pady=(5,0))
+    def remove_orphans(self, seen_sources: set):
+        """Elimina gli output le cui sorgenti non esistono più e le relative voci del manifest"""
+        entries = self.manifest.entries()
+        # Più sorgenti possono produrre lo stesso output (song.flac e song.wav): si tiene se una è ancora viva
+        live_outputs = {out_rel for rel, out_rel in entries if rel in seen_sources}
+        for rel, out_rel in entries:
+            if rel in seen_sources:
+                continue
+            if out_rel not in live_outputs:
+                for orphan in self._outputs_of(rel, out_rel):
+                    self._remove_file(orphan)
+                    self._remove_empty_dirs(orphan.parent)
+                self.logger.info(f"Rimosso output orfano: {out_rel}")
+            self.manifest.remove(rel)
+            self._count('removed')
+        self.manifest.flush()
 
-        # === Main Content ===
-        main_frame = ctk.CTkFrame(self, fg_color="transparent")
-        main_frame.grid(row=1, column=0, sticky="nsew", padx=20, pady=20)
+    def _outputs_of(self, rel: str, out_rel: str) -> list:
+        """Output di una sorgente: quello registrato nel manifest più quelli degli altri profili"""
+        outputs = [self.output_dir / out_rel]
+        source = self.input_dir / rel
+        for profile in self.profiles[1:]:
+            outputs.append(self.output_path_for(source, profile))
+        return outputs
 
-        # Input Section
-        ctk.CTkLabel(main_frame, text=t('input_folder'), font=("Roboto", 14, "bold")).pack(anchor="w", pady=(0, 5))
-        input_row = ctk.CTkFrame(main_frame, fg_color="transparent")
-        input_row.pack(fill="x", pady=(0, 15))
-        
-        ctk.CTkEntry(input_row, textvariable=self.input_path, placeholder_text="C:/Music/Input").pack(side="left", fill="x", expand=True, padx=(0, 10))
-        ctk.CTkButton(input_row, text=t('browse'), width=100, command=self.browse_input).pack(side="right")
+    def _remove_empty_dirs(self, directory: Path):
+        while directory != self.output_dir and self.output_dir in directory.parents:
+            try:
+                directory.rmdir()
+            except OSError:
+                return
+            directory = directory.parent
 
-        # Output Section
-        ctk.CTkLabel(main_frame, text=t('output_folder'), font=("Roboto", 14, "bold")).pack(anchor="w", pady=(0, 5))
-        output_row = ctk.CTkFrame(main_frame, fg_color="transparent")
-        output_row.pack(fill="x", pady=(0, 20))
-        
-        ctk.CTkEntry(output_row, textvariable=self.output_path, placeholder_text="C:/Music/Output").pack(side="left", fill="x", expand=True, padx=(0, 10))
-        ctk.CTkButton(output_row, text=t('browse'), width=100, command=self.browse_output).pack(side="right")
+    def _scan_error(self, error: OSError):
+        with self._lock:
+            self.scan_errors += 1
+        self.logger.warning(f"Impossibile leggere {error.filename}: {error.strerror}")
 
-        # Info Card
-        info_card = ctk.CTkFrame(main_frame)
-        info_card.pack(fill="x", pady=(0, 20))
-        
-        ctk.CTkLabel(info_card, text=f"ℹ️ {t('info_title')}", font=("Roboto", 14, "bold")).pack(anchor="w", padx=15, pady=(10, 5))
-        ctk.CTkLabel(info_card, text=t('info_text'), justify="left", font=("Roboto", 12)).pack(anchor="w", padx=15, pady=(0, 15))
+    def iter_audio_files(self):
+        return scan_audio_files(self.input_dir, self.SUPPORTED_FORMATS, on_error=self._scan_error)
 
-        # Progress Section
-        self.status_label = ctk.CTkLabel(main_frame, textvariable=self.status_text, anchor="w", text_color="gray")
-        self.status_label.pack(fill="x", pady=(0, 5))
-        
-        self.progress_bar = ctk.CTkProgressBar(main_frame)
-        self.progress_bar.pack(fill="x", pady=(0, 20))
-        self.progress_bar.set(0)
+    def estimate_work(self, file_path: Path) -> WorkEstimate:
+        """Costo stimato di un file per lo scheduler: durata e codec dalla cache probe se noti, altrimenti dalla dimensione"""
+        try:
+            stat = file_path.stat()
+        except OSError:
+            return WorkEstimate(0.0, 0)
+        extension = file_path.suffix.lower()
+        if self.probe_cache is not None:
+            cached = self.probe_cache.peek(*self._probe_cache_key(file_path, stat))
+            if cached is not None:
+                info = MediaInfo(**cached)
+                copy = self.loudness_target is None and self.is_conforming_mp3(file_path, info)
+                return WorkEstimate(estimate_cost(stat.st_size, extension, info.duration, info.codec, copy=copy),
+                                    stat.st_size)
+        return WorkEstimate(estimate_cost(stat.st_size, extension), stat.st_size)
 
-        # Action Buttons
-        action_row = ctk.CTkFrame(main_frame, fg_color="transparent")
-        action_row.pack(pady=10)
-        
-        self.start_btn = ctk.CTkButton(action_row, text=t('start_process'), 
-                                     command=self.start_process,
-                                     font=("Roboto", 16, "bold"),
-                                     height=50, width=200,
-                                     fg_color="#2ecc71", hover_color="#27ae60")
-        self.start_btn.pack(side="left", padx=10)
+    def priority_of(self, file_path: Path) -> int:
+        return self.priority_rules.priority(file_path.relative_to(self.input_dir).as_posix())
+
+    def progress_estimate(self):
+        """Frazione del lavoro stimato già completata e secondi rimanenti (None finché non c'è una misura)"""
+        scheduler = self.scheduler
+        if scheduler is None or scheduler.work_total <= 0 or self._run_started is None:
+            return 0.0, None
+        if scheduler.scan_done and scheduler.completed >= scheduler.discovered:
+            # Somme di float in ordine diverso: a lavoro finito il rapporto può valere 0.9999999999999999
+            return 1.0, 0.0
+        fraction = min(1.0, scheduler.work_done / scheduler.work_total)
+        if fraction <= 0:
+            return 0.0, None
+        elapsed = time.perf_counter() - self._run_started
+        return fraction, elapsed * (1 - fraction) / fraction
+
+    def progress_snapshot(self) -> ProgressSnapshot:
+        """Istantanea dell'avanzamento per la GUI: frazione sul lavoro stimato, ETA sui byte rimanenti"""
+        scheduler = self.scheduler
+        discovered = scheduler.discovered if scheduler is not None else 0
+        bytes_total = scheduler.bytes_total if scheduler is not None else 0
+        fraction, _ = self.progress_estimate()
+        return self.progress.snapshot(max(self.estimated_total, discovered), bytes_total,
+                                      fraction=fraction if fraction > 0 else None)
+
+    def _estimate_total(self):
+        """Conta i file in background per la barra di avanzamento, senza trattenere i percorsi"""
+        count = 0
+        for _ in scan_audio_files(self.input_dir, self.SUPPORTED_FORMATS):
+            if self.stop_requested:
+                return
+            count += 1
+            if count % 500 == 0:
+                self.estimated_total = count
+        self.estimated_total = count
+
+    def run(self):
+        self.logger.info("=== INIZIO ELABORAZIONE ===")
+        self.report = RunReport(self.input_dir, self.output_dir, report_dir=self.report_dir, jobs=self.jobs)
+        self.estimated_total = 0
+        self.scan_errors = 0
+        threading.Thread(target=self._estimate_total, daemon=True).start()
+        if self.output_dir.exists():
+            threading.Thread(target=self.cleanup_stale_temp_files, daemon=True).start()
         
-        self.stop_btn = ctk.CTkButton(action_row, text=t('stop_process'), 
-                                    command=self.stop_process,
-                                    font=("Roboto", 16, "bold"),
-                                    height=50, width=100,
-                                    fg_color="#e74c3c", hover_color="#c0392b",
-                                    state="disabled")
-        self.stop_btn.pack(side="left", padx=10)
-
-        # === Footer ===
-        footer_frame = ctk.CTkFrame(self, corner_radius=0, fg_color="#1a1a1a")
-        footer_frame.grid(row=2, column=0, sticky="ew")
+        audio_files = self.iter_audio_files()
+        seen_sources = None
+        if self.manifest is not None:
+            seen_sources = set()
+            audio_files = self._track_seen(audio_files, seen_sources)
+        self._run_started = time.perf_counter()
+        if self.streaming:
+            self.logger.info(f"I/O in streaming: sorgenti e output via pipe, lettura anticipata di {self.prefetch} file"
+                             + (" (condivisione di rete)" if self.io_mode == 'auto' else ""))
+        if self.schedule == 'lpt':
+            self.scheduler = Scheduler(audio_files, self.estimate_work,
+                                       self.priority_of if self.priority_rules else None,
+                                       window=window_for(self.jobs))
+        else:
+            # Finestra di un solo file: nessun riordino, ma stessa stima del lavoro per avanzamento ed ETA
+            self.scheduler = Scheduler(audio_files, self.estimate_work, window=1)
+        self._run_pool(self.scheduler.start())
         
-        ctk.CTkLabel(footer_frame, text=f"{t('developed_by')} {AUTHOR} | {t('llm_credit')}", 
-                     font=("Roboto", 10), text_color="gray").pack(pady=5)
+        if self.manifest is not None:
+            if self.stop_requested:
+                self.manifest.flush()
+            elif self.scan_errors:
+                # Una cartella illeggibile (NAS non montato, permessi) farebbe sembrare orfani tutti i suoi output
+                self.logger.warning(f"Rimozione degli orfani saltata: {self.scan_errors} errori di scansione")
+                self.manifest.flush()
+            else:
+                # Solo a scansione completa: un'interruzione non deve far sembrare orfani i file non visti
+                self.remove_orphans(seen_sources)
+        if self.probe_cache is not None:
+            self.probe_cache.flush()
+        for store in (self.content_index, self.loudness_cache):
+            if store is not None:
+                store.flush()
+        self.report.finish()
+        self.log_summary()
+        self.write_reports()
+
+    def write_reports(self):
+        """Scrive report JSON (il CSV per file è già stato scritto durante l'esecuzione) e textfile Prometheus"""
+        try:
+            if self.report.json_path is not None:
+                self.report.write_json(self.report.json_path, self.stats)
+                self.logger.info(f"Report di esecuzione: {self.report.json_path}")
+            if self.prometheus_path:
+                self.report.write_prometheus(self.prometheus_path, self.stats)
+        except OSError as e:
+            self.logger.error(f"Impossibile scrivere il report di esecuzione: {e}")
+
+    def log_summary(self):
+        stats = self.stats
+        self.logger.info(
+            f"=== FINE ELABORAZIONE === processati: {stats['processed']}, copiati: {stats['copied']}, "
+            f"convertiti: {stats['converted']}, saltati: {stats['skipped']}, errori: {stats['errors']}")
+        if self.manifest is not None:
+            self.logger.info(f"Sincronizzazione incrementale: {stats['removed']} output orfani rimossi")
+        if self.copy_methods:
+            methods = ', '.join(f"{name}: {count}" for name, count in sorted(self.copy_methods.items()))
+            self.logger.info(f"Copie per strategia ({self.copy_strategy}): {methods}")
+        if self.content_index is not None:
+            self.logger.info(
+                f"Deduplicazione: {stats['deduplicated']} duplicati riusati, "
+                f"{stats['dedup_seconds_saved']:.0f}s di audio non ricodificati")
+        if self.loudness_target is not None:
+            self.logger.info(
+                f"Loudness {self.loudness_target:g} LUFS: {stats['loudness_measured']} misure, "
+                f"{stats['loudness_cache_hits']} dalla cache, {stats['loudness_reencoded']} MP3 ricodificati")
+        if self.probe_cache is not None:
+            self.logger.info(
+                f"Cache probe: {stats['probe_cache_hits']} hit, {stats['probe_cache_misses']} miss")
+        if stats['header_scans']:
+            self.logger.info(f"MP3 analizzati dagli header senza ffprobe: {stats['header_scans']}")
+        if stats['tagged']:
+            artwork = ''
+            if self.artwork is not None and (self.artwork.hits or self.artwork.misses):
+                artwork = (f", copertine elaborate {self.artwork.misses} "
+                           f"(riusate dalla cache {self.artwork.hits})")
+            self.logger.info(f"Output con tag della sorgente: {stats['tagged']}{artwork}")
+        if stats['streamed']:
+            self.logger.info(f"Conversioni in streaming: {stats['streamed']} "
+                             f"({stats['prefetched']} da lettura anticipata)")
+
+    def _track_seen(self, audio_files, seen_sources: set):
+        for file_path in audio_files:
+            seen_sources.add(file_path.relative_to(self.input_dir).as_posix())
+            yield file_path
+
+    def _run_pool(self, audio_files):
+        """Esegue process_single_file su un pool di self.jobs worker (un processo ffmpeg ciascuno)"""
+        # Al massimo 2 file in coda per worker: stop() non deve attendere migliaia di job già sottomessi
+        max_pending = self.jobs * 2
+        files = iter(audio_files)
+        pending = {}
+        completed = 0
         
-        ctk.CTkButton(footer_frame, text=f"💝 {t('donate_btn')}", 
-                      command=lambda: webbrowser.open('https://paypal.me/runtimeradio'),
-                      fg_color="transparent", border_width=1, border_color="#f39c12",
-                      text_color="#f39c12", hover_color="#2c2c2c", height=25).pack(pady=(0, 10))
-
-    def browse_input(self):
-        path = ctk.filedialog.askdirectory()
-        if path:
-            self.input_path.set(path)
-
-    def browse_output(self):
-        path = ctk.filedialog.askdirectory()
-        if path:
-            self.output_path.set(path)
-
-    def update_progress_safe(self, current, total, filename):
-        progress = current / total
-        self.progress_bar.set(progress)
-        self.status_text.set(t('status_processing').format(filename=filename, current=current, total=total))
-
-    def start_process(self):
-        in_dir = self.input_path.get()
-        out_dir = self.output_path.get()
+        governor = self.governor
+        exhausted = False
+        # Streaming: i file in coda vengono letti in anticipo mentre i worker codificano quelli correnti
+        if self.streaming and self.prefetch > 0:
+            self.prefetcher = Prefetcher(self.prefetch, self.prefetch_memory, wanted=self._prefetch_wanted,
+                                         initializer=self.limits.apply if self.limits else None)
         
-        if not in_dir or not out_dir:
-            ctk.filedialog.showerror(t('error_title'), t('error_input_output'))
-            return
-            
-        if not Path(in_dir).exists():
-            ctk.filedialog.showerror(t('error_title'), t('error_input_not_found').format(path=in_dir))
-            return
+        executor = self.executor or self.new_executor()
+        try:
+            while True:
+                if governor is not None:
+                    governor.update()
+                while not self.stop_requested and not exhausted and len(pending) < max_pending:
+                    # Con il governatore un file parte solo se c'è uno slot libero (condiviso tra librerie)
+                    if governor is not None and not governor.try_acquire():
+                        break
+                    scan_start = time.perf_counter()
+                    file_path = next(files, None)
+                    self.report.add_stage_time('scan', time.perf_counter() - scan_start)
+                    if file_path is None:
+                        exhausted = True
+                        if governor is not None:
+                            governor.release()
+                        break
+                    pending[executor.submit(self.process_single_file, file_path)] = file_path
+                    if self.prefetcher is not None:
+                        self.prefetcher.request(file_path)
+                
+                if not pending:
+                    if exhausted or self.stop_requested:
+                        break
+                    # Tutti gli slot occupati da altre librerie: si riprova al prossimo campione
+                    time.sleep(0.1)
+                    continue
+                
+                done, _ = concurrent.futures.wait(pending, timeout=governor.interval if governor else None,
+                                                  return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    file_path = pending.pop(future)
+                    if governor is not None:
+                        governor.release()
+                    completed += 1
+                    size = self.scheduler.complete(file_path).size if self.scheduler is not None else 0
+                    self.progress.completed_file(file_path.name, size)
+                    if self.progress_callback:
+                        # Il totale è una stima finché il conteggio in background non termina
+                        discovered = self.scheduler.discovered if self.scheduler is not None else 0
+                        total_files = max(self.estimated_total, discovered, completed)
+                        self.progress_callback(completed, total_files, file_path.name)
+        finally:
+            if self.executor is None:
+                executor.shutdown(wait=True)
+            if self.prefetcher is not None:
+                self.prefetcher.close()
+                self.prefetcher = None
 
-        self.start_btn.configure(state="disabled")
-        self.stop_btn.configure(state="normal")
-        self.progress_bar.set(0)
-        self.status_text.set(t('status_ready'))
+    def new_executor(self) -> concurrent.futures.ThreadPoolExecutor:
+        """Pool di self.jobs worker con i limiti di risorse applicati a ogni thread"""
+        return concurrent.futures.ThreadPoolExecutor(max_workers=self.jobs,
+                                                     initializer=self.limits.apply if self.limits else None)
 
-        def worker():
-            try:
-                self.current_conformer = SimpleConformer(
-                    in_dir, out_dir, 
-                    progress_callback=lambda c, t, f: self.after(0, self.update_progress_safe, c, t, f)
-                )
-                self.current_conformer.run()
-                
-                if self.current_conformer.stop_requested:
-                    self.after(0, lambda: self.status_text.set(t('status_stopped')))
-                    self.after(0, lambda: ctk.filedialog.showinfo("Info", t('status_stopped')))
+    def _plan_file(self, file_path: Path) -> PlanEntry:
+        """Decisione prevista per un file, con le stesse regole di _process_file ma senza scrivere output"""
+        try:
+            stat = file_path.stat()
+            targets = [(profile, self.output_path_for(file_path, profile)) for profile in self.profiles]
+            up_to_date = all(dst.exists() for _, dst in targets)
+            if up_to_date and self.manifest is not None:
+                up_to_date = self.is_up_to_date(file_path, targets[0][1])
+            if up_to_date:
+                return PlanEntry('skip', stat.st_size)
+            
+            extension = file_path.suffix.lower()
+            info = self._probe_or_none(file_path)
+            duration = estimate_duration(stat.st_size, extension, info.duration if info is not None else None)
+            loudness_ok = True
+            if self.loudness_target is not None:
+                # Senza una misura in cache non si decodifica qui: il file conta come da ricodificare
+                cached = None
+                if self.loudness_cache is not None:
+                    cached = self.loudness_cache.get(file_path.relative_to(self.input_dir).as_posix(),
+                                                     stat.st_size, stat.st_mtime_ns)
+                loudness_ok = cached is not None and self.is_loudness_conforming(LoudnessInfo(**cached))
+            
+            output_bytes = replaced = converted = 0
+            for profile, dst in targets:
+                if info is not None and loudness_ok and self.is_conforming(file_path, info, profile):
+                    # Un hardlink non occupa spazio; reflink e copie sono contati per intero (stima prudente)
+                    output_bytes += 0 if self.copy_strategy == 'hardlink' else stat.st_size
                 else:
-                    self.after(0, lambda: self.status_text.set(t('status_completed')))
-                    stats = self.current_conformer.stats
-                    msg = t('success_body').format(
-                        processed=stats['processed'],
-                        copied=stats['copied'],
-                        converted=stats['converted'],
-                        skipped=stats['skipped'],
-                        errors=stats['errors'],
-                        out_dir=out_dir
-                    )
-                    self.after(0, lambda: ctk.filedialog.showinfo(t('success_title'), msg))
-                    
-            except Exception as e:
-                self.after(0, lambda: ctk.filedialog.showerror(t('error_title'), str(e)))
-            finally:
-                self.after(0, self.reset_ui)
+                    output_bytes += estimate_output_bytes(duration, profile)
+                    converted += 1
+                if dst.exists():
+                    replaced += dst.stat().st_size
+            if not converted:
+                return PlanEntry('copy', stat.st_size, output_bytes, replaced,
+                                 estimate_cost(stat.st_size, extension, duration, copy=True), duration)
+            # Una sola decodifica, un encoder per profilo da convertire
+            cost = estimate_cost(stat.st_size, extension, duration, info.codec if info is not None else None)
+            return PlanEntry('convert', stat.st_size, output_bytes, replaced, cost * converted, duration)
+        except OSError as e:
+            self.logger.warning(f"Impossibile pianificare {file_path.name}: {e}")
+            return PlanEntry('skip')
+
+    def build_plan(self) -> RunPlan:
+        """Passaggio preliminare: scansione e analisi (dalla cache probe, che resta popolata per l'esecuzione)"""
+        plan = RunPlan(self.jobs)
+        # Le statistiche restano quelle dell'esecuzione vera e propria
+        saved_stats = dict(self.stats)
+        max_pending = self.jobs * 2
+        files = self.iter_audio_files()
+        pending = set()
+        with self.new_executor() as executor:
+            while True:
+                while not self.stop_requested and len(pending) < max_pending:
+                    file_path = next(files, None)
+                    if file_path is None:
+                        break
+                    pending.add(executor.submit(self._plan_file, file_path))
+                if not pending:
+                    break
+                done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    plan.add(future.result())
+        self.stats.update(saved_stats)
+        if self.probe_cache is not None:
+            self.probe_cache.flush()
+        plan.free_bytes = free_space(self.output_dir)
+        return plan
 
-        threading.Thread(target=worker, daemon=True).start()
+def format_duration(seconds: float) -> str:
+    """Durata leggibile per l'ETA: 1h 05m, 4m 10s, 12s"""
+    seconds = int(round(seconds))
+    if seconds >= 3600:
+        return f"{seconds // 3600}h {seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m {seconds % 60:02d}s"
+    return f"{seconds}s"
 
-    def stop_process(self):
-        if self.current_conformer:
-            self.current_conformer.stop()
-            self.status_text.set(t('status_stopping'))
-            self.stop_btn.configure(state="disabled")
+def parse_loudness(value: str) -> float:
+    """Target di loudness da riga di comando: '-16', '-16LUFS' o '-16 LUFS'"""
+    text = value.strip()
+    if text.upper().endswith('LUFS'):
+        text = text[:-4].strip()
+    try:
+        target = float(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid loudness target: {value}")
+    if not -70 <= target <= -5:
+        raise argparse.ArgumentTypeError(f"loudness target out of range (-70..-5 LUFS): {value}")
+    return target
 
-    def reset_ui(self):
-        self.start_btn.configure(state="normal")
-        self.stop_btn.configure(state="disabled")
-        self.current_conformer = None
+def launch_gui():
+    """Avvia la GUI: customtkinter, PIL e le traduzioni vengono importati solo qui, mai dal percorso CLI"""
+    try:
+        import gui
+    except ImportError as e:
+        print(f"Errore: Modulo mancante {e}")
+        print("Installa le dipendenze con: pip install customtkinter pillow packaging")
+        sys.exit(1)
+    gui.launch()
 
 def main():
-    global CURRENT_LANG
-    
     # Parse args for CLI usage
     parser = argparse.ArgumentParser(description='Audio & Metadata Converter')
     parser.add_argument('input_dir', nargs='?', help='Input Directory')
     parser.add_argument('output_dir', nargs='?', help='Output Directory')
     parser.add_argument('--gui', action='store_true', help='Force GUI')
+    parser.add_argument('--jobs', '-j', type=int, metavar='N',
+                        help='Number of parallel ffmpeg encodes (default: 1, with --batch all cores)')
+    parser.add_argument('--batch', metavar='JOBFILE',
+                        help='Run every library listed in a TOML/JSON job file on one shared worker pool')
+    queue_modes = parser.add_mutually_exclusive_group()
+    queue_modes.add_argument('--enqueue', metavar='QUEUE_DB',
+                             help='Coordinator: scan the library into a shared SQLite work queue for --worker '
+                                  'processes (possibly on other hosts mounting the same share), then exit')
+    queue_modes.add_argument('--worker', metavar='QUEUE_DB',
+                             help='Claim files from a work queue until it is drained; input and output '
+                                  'directories default to the coordinator ones')
+    queue_modes.add_argument('--queue-status', metavar='QUEUE_DB',
+                             help='Print work queue progress and the stats aggregated over all workers')
+    parser.add_argument('--lease', type=float, default=workqueue.DEFAULT_LEASE_SECONDS, metavar='SECONDS',
+                        help=f'Work queue: a claimed file returns to the queue if its worker stops renewing '
+                             f'the lease for this long (default: {workqueue.DEFAULT_LEASE_SECONDS:g})')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Re-encode only changed sources and delete outputs whose source is gone')
+    parser.add_argument('--copy-strategy', choices=fastcopy.STRATEGIES, default='auto',
+                        help='How conforming MP3s are copied: reflink/copy_file_range/copy (auto), '
+                             'or hardlink to share the source inode (default: auto)')
+    parser.add_argument('--dedup', action='store_true',
+                        help='Reuse the output of identical sources (content hash) instead of encoding them again')
+    parser.add_argument('--watch', action='store_true',
+                        help='Keep running and conform new or changed files as soon as they are complete')
+    parser.add_argument('--settle', type=float, default=watch.DEFAULT_SETTLE_SECONDS, metavar='SECONDS',
+                        help=f'Watch mode: seconds a file must stay unchanged before it is processed '
+                             f'(default: {watch.DEFAULT_SETTLE_SECONDS:g})')
+    parser.add_argument('--poll-interval', type=float, default=watch.DEFAULT_POLL_INTERVAL, metavar='SECONDS',
+                        help=f'Watch mode: directory polling interval when inotify is unavailable '
+                             f'(default: {watch.DEFAULT_POLL_INTERVAL:g})')
+    parser.add_argument('--loudness', type=parse_loudness, metavar='LUFS',
+                        help='Normalize integrated loudness to this target, e.g. -16 or -16LUFS (EBU R128, two-pass)')
+    parser.add_argument('--schedule', choices=SimpleConformer.SCHEDULES, default='lpt',
+                        help='Processing order: priority folders then longest jobs first (lpt), '
+                             'or plain directory walk order (scan) (default: lpt)')
+    parser.add_argument('--priority', action='append', default=[], type=parse_priority_rule, metavar='PATTERN[=N]',
+                        help='Process matching paths first, e.g. new_releases/ or "*/live/*=5" '
+                             '(repeatable, default priority 10)')
+    parser.add_argument('--profile', action='append', choices=list(PROFILES), metavar='NAME',
+                        help=f'Output profile, repeatable to produce several formats from one decode '
+                             f'({", ".join(PROFILES)}; default: {DEFAULT_PROFILE})')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Scan and probe only, print the plan (files to skip/copy/convert, output size, '
+                             'free space, estimated time) and exit without writing outputs')
+    parser.add_argument('--preflight', action='store_true',
+                        help='Print the plan first and refuse to start if the output volume lacks space')
+    parser.add_argument('--no-tags', action='store_true',
+                        help='Do not carry source tags and artwork over with mutagen, keep ffmpeg default mapping')
+    parser.add_argument('--no-artwork', action='store_true', help='Do not embed source artwork in converted outputs')
+    parser.add_argument('--artwork-size', type=int, default=tags.ARTWORK_MAX_SIZE, metavar='PX',
+                        help=f'Downscale embedded artwork to at most PX pixels, 0 keeps it unchanged '
+                             f'(default: {tags.ARTWORK_MAX_SIZE})')
+    parser.add_argument('--io-mode', choices=IO_MODES, default='auto',
+                        help='stream: feed ffmpeg through pipes with large sequential reads and writes; '
+                             'path: let ffmpeg open the files; auto: stream on network shares (default: auto)')
+    parser.add_argument('--prefetch', type=int, default=DEFAULT_PREFETCH, metavar='N',
+                        help=f'In stream mode, files read ahead while others encode '
+                             f'(default: {DEFAULT_PREFETCH}, 0 disables)')
+    parser.add_argument('--prefetch-memory', type=int, default=DEFAULT_PREFETCH_MEMORY // (1024 * 1024), metavar='MB',
+                        help=f'Memory for read-ahead buffers (default: {DEFAULT_PREFETCH_MEMORY // (1024 * 1024)})')
+    parser.add_argument('--nice', type=int, metavar='N',
+                        help='CPU niceness of the workers and their ffmpeg processes (0-19)')
+    parser.add_argument('--ionice', metavar='CLASS[:LEVEL]',
+                        help='I/O priority of the workers: idle or best-effort[:0-7] (Linux)')
+    parser.add_argument('--cpus', metavar='LIST',
+                        help='Pin the workers and ffmpeg to these CPUs, e.g. 2-7 or 4,5,6 (Linux)')
+    parser.add_argument('--max-load', type=float, metavar='RATIO',
+                        help='Lower parallelism while the 1-minute load average per core is above RATIO')
+    parser.add_argument('--max-iowait', type=float, metavar='PERCENT',
+                        help='Lower parallelism while CPU I/O wait is above PERCENT (Linux)')
+    parser.add_argument('--live-hours', metavar='HH:MM-HH:MM',
+                        help='Daily window (local time) with reduced parallelism, e.g. 06:00-22:00')
+    parser.add_argument('--live-jobs', type=int, metavar='N',
+                        help='Maximum files in progress during --live-hours (default: half of --jobs)')
+    parser.add_argument('--timeout', type=float, metavar='SECONDS',
+                        help='Per-file encode timeout, 0 disables (default: 300s + track duration)')
+    parser.add_argument('--log-file', metavar='FILE',
+                        help='JSON-lines log, rotated by size (default: <output_dir>/.conformer-logs/conformer.jsonl, '
+                             'with --batch next to the job file)')
+    parser.add_argument('--report-dir', metavar='DIR',
+                        help='Where to write the JSON/CSV run report (default: <output_dir>/.conformer-reports)')
+    parser.add_argument('--prometheus-textfile', metavar='FILE',
+                        help='Also write run metrics in Prometheus textfile format (node exporter)')
+    parser.add_argument('--probe-cache', metavar='PATH',
+                        help='Probe cache database (default: <output_dir>/.conformer.db)')
+    parser.add_argument('--no-probe-cache', action='store_true', help='Always run ffprobe, ignore the cache')
+    parser.add_argument('--clear-probe-cache', action='store_true', help='Invalidate the probe cache before running')
+    parser.add_argument('--probe-cache-size', type=int, default=ProbeCache.DEFAULT_MAX_ENTRIES, metavar='N',
+                        help=f'Maximum cached entries (default: {ProbeCache.DEFAULT_MAX_ENTRIES})')
     args = parser.parse_args()
 
+    if args.jobs is not None and args.jobs < 1:
+        print("Error: --jobs must be >= 1")
+        sys.exit(1)
+
+    if args.profile:
+        try:
+            resolve_profiles(args.profile)
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        if args.dedup and len(args.profile) > 1:
+            print("Error: --dedup requires a single --profile")
+            sys.exit(1)
+
+    if args.lease <= 0:
+        print("Error: --lease must be > 0")
+        sys.exit(1)
+    if args.queue_status:
+        try:
+            queue = workqueue.WorkQueue(args.queue_status, create=False)
+        except (OSError, ValueError) as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        for line in queue.summary_lines(args.lease):
+            print(line)
+        queue.close()
+        return
+    if args.enqueue or args.worker:
+        if args.batch or args.watch or args.gui:
+            print("Error: --enqueue and --worker cannot be combined with --batch, --watch or --gui")
+            sys.exit(1)
+        if args.enqueue and not (args.input_dir and args.output_dir):
+            print("Error: --enqueue requires input and output directories")
+            sys.exit(1)
+        if args.worker and (args.incremental or args.dedup):
+            print("Error: --worker cannot be combined with --incremental or --dedup "
+                  "(the queue tracks completed files)")
+            sys.exit(1)
+    if args.worker and not (args.input_dir and args.output_dir):
+        # Stesse cartelle del coordinatore, se non montate altrove su questo host
+        try:
+            queue = workqueue.WorkQueue(args.worker, create=False)
+        except (OSError, ValueError) as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        args.input_dir = args.input_dir or queue.meta('input_dir')
+        args.output_dir = args.output_dir or queue.meta('output_dir')
+        queue.close()
+        if not (args.input_dir and args.output_dir):
+            print("Error: the queue has no library yet, run --enqueue first or pass input and output directories")
+            sys.exit(1)
+
+    resource_options = {'nice': args.nice, 'ionice': args.ionice, 'cpus': args.cpus, 'max_load': args.max_load,
+                        'max_iowait': args.max_iowait, 'live_hours': args.live_hours, 'live_jobs': args.live_jobs}
+    if args.batch:
+        if args.dry_run or args.preflight:
+            # BatchRunner non ha una modalità di prova: senza questo controllo la conversione partirebbe davvero
+            print("Error: --dry-run and --preflight cannot be combined with --batch")
+            sys.exit(1)
+        import batch
+        try:
+            config = batch.parse_batch(batch.load_job_file(args.batch), Path(args.batch).resolve().parent,
+                                       workers=args.jobs, resources=resource_options)
+        except (OSError, ValueError) as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        configure_logging(args.log_file or default_log_path(Path(args.batch).resolve().parent))
+        runner = batch.BatchRunner(config, SimpleConformer)
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: runner.stop())
+        summary = runner.run()
+        sys.exit(1 if any(job['status'] == 'failed' for job in summary['jobs']) else 0)
+
     # If CLI args provided, run headless
     if args.input_dir and args.output_dir and not args.gui:
         if not Path(args.input_dir).exists():
             print(f"Error: {args.input_dir} not found")
             sys.exit(1)
-        conformer = SimpleConformer(args.input_dir, args.output_dir)
-        conformer.run()
+        try:
+            limits = limits_from(args.nice, args.ionice, args.cpus)
+            governor = governor_from(args.jobs or 1, args.max_load, args.max_iowait, args.live_hours, args.live_jobs)
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        worker_id = workqueue.default_worker_id()
+        log_path = args.log_file or default_log_path(args.output_dir)
+        if args.worker and not args.log_file:
+            # Più worker sulla stessa cartella: un log per worker, la rotazione non è condivisibile
+            log_path = log_path.with_name(f"{log_path.stem}-{worker_id}{log_path.suffix}")
+        # Un dry-run non crea file di log nella cartella di output
+        configure_logging(None if args.dry_run else log_path)
+        probe_cache = manifest = content_index = loudness_cache = None
+        if args.dry_run:
+            # Un dry-run non scrive nulla: i database di stato esistenti si leggono soltanto, quelli assenti
+            # non vengono creati (nemmeno la cartella di output)
+            if not args.no_probe_cache:
+                probe_cache = open_readonly(ProbeCache, args.probe_cache or default_db_path(args.output_dir),
+                                            max_entries=args.probe_cache_size)
+            if args.incremental:
+                manifest = open_readonly(SyncManifest, default_db_path(args.output_dir))
+            if args.loudness is not None:
+                loudness_cache = open_readonly(LoudnessCache, default_db_path(args.output_dir))
+        else:
+            # I database di stato nella cartella di output sono in WAL, non condivisibile tra host: un worker
+            # usa una cache probe solo se indicata esplicitamente (locale al nodo)
+            if not args.no_probe_cache and not (args.worker and not args.probe_cache):
+                probe_cache = ProbeCache(args.probe_cache or default_db_path(args.output_dir),
+                                         max_entries=args.probe_cache_size)
+                if args.clear_probe_cache:
+                    probe_cache.invalidate()
+            manifest = SyncManifest(default_db_path(args.output_dir)) if args.incremental else None
+            content_index = ContentIndex(default_db_path(args.output_dir)) if args.dedup else None
+            if args.loudness is not None and not args.worker:
+                loudness_cache = LoudnessCache(default_db_path(args.output_dir))
+        queue = None
+        try:
+            conformer = SimpleConformer(args.input_dir, args.output_dir, jobs=args.jobs or 1,
+                                        probe_cache=probe_cache, manifest=manifest,
+                                        report_dir=args.report_dir or default_report_dir(args.output_dir),
+                                        prometheus_path=args.prometheus_textfile,
+                                        timeout=args.timeout, copy_strategy=args.copy_strategy,
+                                        content_index=content_index, loudness_target=args.loudness,
+                                        loudness_cache=loudness_cache, schedule=args.schedule,
+                                        priorities=args.priority, profiles=args.profile,
+                                        limits=limits, governor=governor, io_mode=args.io_mode,
+                                        prefetch=args.prefetch, prefetch_memory=args.prefetch_memory * 1024 * 1024,
+                                        carry_tags=not args.no_tags, artwork=not args.no_artwork,
+                                        artwork_size=args.artwork_size)
+            if args.dry_run or args.preflight:
+                plan = conformer.build_plan()
+                for line in plan.summary_lines(format_duration):
+                    print(line)
+                if not plan.fits and not args.dry_run:
+                    print("Error: not enough free space on the output volume")
+                    sys.exit(2)
+                if args.dry_run:
+                    return
+            if args.enqueue:
+                queue = workqueue.WorkQueue(args.enqueue)
+                for signum in (signal.SIGINT, signal.SIGTERM):
+                    signal.signal(signum, lambda *_: conformer.stop())
+                workqueue.enqueue_library(conformer, queue)
+                for line in queue.summary_lines(args.lease):
+                    print(line)
+            elif args.worker:
+                try:
+                    queue = workqueue.WorkQueue(args.worker, create=False)
+                except (OSError, ValueError) as e:
+                    print(f"Error: {e}")
+                    sys.exit(1)
+                settings = queue.meta('settings')
+                if settings is not None and settings != conformer.settings_signature():
+                    # Output diversi da quelli degli altri worker: il risultato non sarebbe idempotente
+                    print(f"Error: worker settings ({conformer.settings_signature()}) differ from "
+                          f"the queue ones ({settings})")
+                    sys.exit(1)
+                worker = workqueue.QueueWorker(conformer, queue, lease=args.lease, worker_id=worker_id)
+                for signum in (signal.SIGINT, signal.SIGTERM):
+                    signal.signal(signum, lambda *_: worker.stop())
+                worker.run()
+            elif args.watch:
+                service = watch.WatchService(conformer, settle=args.settle, poll_interval=args.poll_interval)
+                # SIGTERM da systemd o docker: arresto pulito come con Ctrl+C
+                for signum in (signal.SIGINT, signal.SIGTERM):
+                    signal.signal(signum, lambda *_: service.stop())
+                service.run()
+            else:
+                conformer.run()
+        finally:
+            if queue is not None:
+                queue.close()
+            for store in (content_index, loudness_cache):
+                if store is not None:
+                    store.close()
+            if manifest is not None:
+                manifest.close()
+            if probe_cache is not None:
+                probe_cache.close()
         return
 
     # GUI Mode
-    
-    # 1. Language Selection
-    lang_dialog = LanguageSelectionDialog()
-    lang_dialog.mainloop()
-    
-    if not lang_dialog.lang_selected:
-        sys.exit(0) # User closed dialog
-        
-    CURRENT_LANG = lang_dialog.lang_selected
-    
-    # 2. Main App
-    app = App()
-    app.mainloop()
+    launch_gui()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
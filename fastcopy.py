@@ -0,0 +1,98 @@
+"""
+Strategie di copia per i file già conformi
+reflink (FICLONE), hardlink, copy_file_range/sendfile o copia classica,
+con ripiego automatico se sorgente e destinazione sono su filesystem diversi
+"""
+
+import os
+import sys
+import errno
+import shutil
+
+STRATEGIES = ('auto', 'reflink', 'hardlink', 'copy_file_range', 'copy')
+# Ordine tentato da 'auto': solo strategie con la semantica di una copia vera (niente hardlink)
+AUTO_ORDER = ('reflink', 'copy_file_range', 'copy')
+# ioctl Linux FICLONE = _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+# Errori che indicano "non supportato qui": si passa alla strategia successiva
+FALLBACK_ERRNOS = {errno.EXDEV, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EINVAL,
+                   errno.ENOSYS, errno.ENOTTY, errno.EPERM, errno.EMLINK}
+CHUNK_SIZE = 64 * 1024 * 1024
+
+
+def reflink(src, dst):
+    """Clone copy-on-write (XFS, Btrfs): nessun byte copiato, blocchi condivisi finché non cambiano"""
+    if not sys.platform.startswith('linux'):
+        raise OSError(errno.EOPNOTSUPP, "reflink non supportato su questa piattaforma")
+    import fcntl
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        except OSError:
+            fdst.close()
+            os.unlink(dst)
+            raise
+    shutil.copystat(src, dst)
+
+
+def hardlink(src, dst):
+    """Stesso inode della sorgente: attenzione, modificare l'uno modifica l'altro"""
+    os.link(src, dst)
+
+
+def copy_range(src, dst):
+    """Copia nel kernel con copy_file_range (o sendfile), senza passare i dati in user space"""
+    copy_fn = getattr(os, 'copy_file_range', None)
+    if copy_fn is None and (not hasattr(os, 'sendfile') or not sys.platform.startswith('linux')):
+        raise OSError(errno.ENOSYS, "copy_file_range/sendfile non disponibili")
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        remaining = os.fstat(fsrc.fileno()).st_size
+        offset = 0
+        try:
+            while remaining > 0:
+                if copy_fn is not None:
+                    copied = copy_fn(fsrc.fileno(), fdst.fileno(), min(remaining, CHUNK_SIZE))
+                else:
+                    copied = os.sendfile(fdst.fileno(), fsrc.fileno(), offset, min(remaining, CHUNK_SIZE))
+                if copied == 0:
+                    break
+                offset += copied
+                remaining -= copied
+        except OSError:
+            fdst.close()
+            os.unlink(dst)
+            raise
+    shutil.copystat(src, dst)
+
+
+def plain_copy(src, dst):
+    shutil.copy2(src, dst)
+
+
+_IMPLEMENTATIONS = {
+    'reflink': reflink,
+    'hardlink': hardlink,
+    'copy_file_range': copy_range,
+    'copy': plain_copy,
+}
+
+
+def copy_file(src, dst, strategy: str = 'auto') -> str:
+    """Copia src in dst (che non deve esistere) e restituisce la strategia effettivamente usata"""
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Strategia di copia sconosciuta: {strategy}")
+    if strategy == 'auto':
+        attempts = AUTO_ORDER[:-1]
+    elif strategy == 'copy':
+        attempts = ()
+    else:
+        attempts = (strategy,)
+    for name in attempts:
+        try:
+            _IMPLEMENTATIONS[name](str(src), str(dst))
+            return name
+        except OSError as e:
+            if e.errno not in FALLBACK_ERRNOS:
+                raise
+    plain_copy(str(src), str(dst))
+    return 'copy'
@@ -0,0 +1,208 @@
+"""
+Livello di esecuzione FFmpeg/FFprobe per Audio & Metadata Converter
+Argomenti costruiti direttamente (nessun grafo ffmpeg-python), stdout scartato o scritto su un file,
+stdin opzionalmente alimentato a blocchi, solo la coda di stderr in memoria e timeout per file
+"""
+
+import json
+import threading
+import subprocess
+from collections import deque
+from typing import Optional
+
+# Byte di stderr conservati per i messaggi d'errore: un decoder bloccato può scriverne senza limite
+STDERR_TAIL_BYTES = 8192
+PROBE_TIMEOUT = 60
+# Campi richiesti a ffprobe: un JSON ridotto si analizza più in fretta di -show_streams completo
+PROBE_ENTRIES = 'stream=codec_type,codec_name,bit_rate,sample_rate,channels,duration:format=duration'
+
+
+class FFmpegError(Exception):
+    """Processo ffmpeg/ffprobe terminato con errore"""
+
+    def __init__(self, cmd: str, returncode: int, stderr: bytes = b''):
+        self.cmd = cmd
+        self.returncode = returncode
+        self.stderr = stderr
+        message = stderr.decode('utf-8', errors='replace').strip().splitlines()
+        detail = message[-1] if message else f'exit code {returncode}'
+        super().__init__(f"{cmd}: {detail}")
+
+
+class FFmpegTimeout(FFmpegError):
+    """Processo terminato per superamento del timeout"""
+
+    def __init__(self, cmd: str, timeout: float, stderr: bytes = b''):
+        self.timeout = timeout
+        FFmpegError.__init__(self, cmd, -1, stderr)
+        self.args = (f"{cmd}: timeout dopo {timeout:.0f}s",)
+
+
+def _drain_tail(stream, tail: deque):
+    """Legge stderr fino alla chiusura tenendo solo gli ultimi STDERR_TAIL_BYTES"""
+    for chunk in iter(lambda: stream.read(4096), b''):
+        tail.append(chunk)
+        while sum(len(c) for c in tail) > STDERR_TAIL_BYTES and len(tail) > 1:
+            tail.popleft()
+    stream.close()
+
+
+def _drain_all(stream, chunks: list):
+    for chunk in iter(lambda: stream.read(65536), b''):
+        chunks.append(chunk)
+    stream.close()
+
+
+def _feed(process, stream, chunks, errors: list):
+    """Scrive i blocchi della sorgente su stdin; un errore di lettura termina ffmpeg (niente output troncati)"""
+    iterator = iter(chunks)
+    try:
+        while True:
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                break
+            except Exception as e:
+                errors.append(e)
+                process.kill()
+                break
+            try:
+                stream.write(chunk)
+            except OSError:
+                # ffmpeg è uscito prima della fine dell'input: l'errore arriva dal codice di uscita
+                break
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+        try:
+            stream.close()
+        except OSError:
+            pass
+
+
+def _drain_to(process, stream, sink, errors: list):
+    """Copia stdout nel file di destinazione; un errore di scrittura (disco pieno) termina ffmpeg"""
+    try:
+        for chunk in iter(lambda: stream.read(65536), b''):
+            sink.write(chunk)
+    except OSError as e:
+        errors.append(e)
+        process.kill()
+    finally:
+        stream.close()
+
+
+class FFmpegRunner:
+    """Esegue ffmpeg e ffprobe tenendo traccia dei processi attivi, così stop() può terminarli"""
+
+    def __init__(self, ffmpeg_path: str = 'ffmpeg', ffprobe_path: str = 'ffprobe'):
+        self.ffmpeg_path = ffmpeg_path
+        self.ffprobe_path = ffprobe_path
+        self._lock = threading.Lock()
+        self._active = set()
+        self._terminated = False
+
+    def _run(self, argv: list, timeout: Optional[float], capture_stdout: bool = False,
+             return_stderr: bool = False, stdin_source=None, stdout_sink=None) -> bytes:
+        """stdin_source: blocchi di byte passati su stdin; stdout_sink: file in cui scrivere stdout"""
+        process = subprocess.Popen(
+            argv,
+            stdin=subprocess.PIPE if stdin_source is not None else subprocess.DEVNULL,
+            stdout=subprocess.PIPE if capture_stdout or stdout_sink is not None else subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+        )
+        with self._lock:
+            self._active.add(process)
+            terminated = self._terminated
+        if terminated:
+            process.terminate()
+
+        # Le pipe vengono svuotate da thread dedicati: wait() può così applicare il timeout
+        tail = deque()
+        stdout_chunks = []
+        io_errors = []
+        readers = [threading.Thread(target=_drain_tail, args=(process.stderr, tail), daemon=True)]
+        if capture_stdout:
+            readers.append(threading.Thread(target=_drain_all, args=(process.stdout, stdout_chunks), daemon=True))
+        elif stdout_sink is not None:
+            readers.append(threading.Thread(target=_drain_to, args=(process, process.stdout, stdout_sink, io_errors),
+                                            daemon=True))
+        if stdin_source is not None:
+            readers.append(threading.Thread(target=_feed, args=(process, process.stdin, stdin_source, io_errors),
+                                            daemon=True))
+        for reader in readers:
+            reader.start()
+        try:
+            process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+            for reader in readers:
+                reader.join(timeout=5)
+            raise FFmpegTimeout(argv[0], timeout, b''.join(tail))
+        finally:
+            with self._lock:
+                self._active.discard(process)
+        for reader in readers:
+            reader.join(timeout=5)
+        if io_errors:
+            # Errore di lettura della sorgente o di scrittura dell'output: più utile del codice di uscita
+            raise io_errors[0]
+        if process.returncode != 0:
+            raise FFmpegError(argv[0], process.returncode, b''.join(tail))
+        if return_stderr:
+            return b''.join(tail)
+        return b''.join(stdout_chunks)
+
+    def probe(self, path: str, timeout: Optional[float] = PROBE_TIMEOUT) -> dict:
+        """Equivalente ridotto di ffmpeg.probe: solo il primo stream audio e la durata del contenitore"""
+        argv = [self.ffprobe_path, '-v', 'error', '-print_format', 'json',
+                '-select_streams', 'a:0', '-show_entries', PROBE_ENTRIES, path]
+        return json.loads(self._run(argv, timeout, capture_stdout=True) or b'{}')
+
+    def measure_loudness(self, path: str, integrated: float, true_peak: float, lra: float,
+                         timeout: Optional[float] = None) -> dict:
+        """Primo passaggio loudnorm: decodifica completa, misure EBU R128 stampate in JSON alla fine di stderr"""
+        argv = [self.ffmpeg_path, '-nostdin', '-hide_banner', '-nostats', '-i', path, '-vn',
+                '-af', f'loudnorm=I={integrated:g}:TP={true_peak:g}:LRA={lra:g}:print_format=json',
+                '-f', 'null', '-']
+        stderr = self._run(argv, timeout, return_stderr=True)
+        text = stderr.decode('utf-8', errors='replace')
+        start, end = text.rfind('{'), text.rfind('}')
+        if start < 0 or end < start:
+            raise FFmpegError(argv[0], 0, stderr)
+        return json.loads(text[start:end + 1])
+
+    def encode_argv(self, src: str, dst: str, output_args: list, input_args: Optional[list] = None) -> list:
+        return self.multi_encode_argv(src, [(output_args, dst)], input_args)
+
+    def multi_encode_argv(self, src: str, outputs: list, input_args: Optional[list] = None) -> list:
+        """Più output da un solo processo: la sorgente viene decodificata una volta sola per tutti"""
+        argv = [self.ffmpeg_path, '-nostdin', '-hide_banner', '-loglevel', 'error', '-y'] + (input_args or [])
+        argv += ['-i', src]
+        for output_args, dst in outputs:
+            argv += list(output_args) + [dst]
+        return argv
+
+    def encode(self, src: str, dst: str, output_args: list, timeout: Optional[float] = None,
+               input_args: Optional[list] = None, stdin=None, stdout=None):
+        """Con stdin (blocchi della sorgente) src è 'pipe:0'; con stdout (file aperto) dst è 'pipe:1'"""
+        self._run(self.encode_argv(src, dst, output_args, input_args), timeout,
+                  stdin_source=stdin, stdout_sink=stdout)
+
+    def encode_multi(self, src: str, outputs: list, timeout: Optional[float] = None,
+                     input_args: Optional[list] = None, stdin=None):
+        """outputs: coppie (argomenti di output, destinazione)"""
+        self._run(self.multi_encode_argv(src, outputs, input_args), timeout, stdin_source=stdin)
+
+    def terminate_all(self):
+        """Termina i processi in corso e quelli che partiranno da ora in poi"""
+        with self._lock:
+            self._terminated = True
+            processes = list(self._active)
+        for process in processes:
+            try:
+                process.terminate()
+            except OSError:
+                pass
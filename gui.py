@@ -0,0 +1,341 @@
+"""
+Interfaccia grafica di Audio & Metadata Converter
+Separata dal motore: il percorso CLI (cron, container, watch) non importa customtkinter, PIL e traduzioni
+"""
+
+import os
+import sys
+import threading
+import webbrowser
+from pathlib import Path
+
+import customtkinter as ctk
+from PIL import Image, ImageTk
+import locales
+
+from conformer import SimpleConformer, APP_VERSION, AUTHOR, format_duration
+from store import ProbeCache, default_db_path
+from report import default_report_dir
+from progress import ProgressSnapshot, REFRESH_INTERVAL_MS
+from logsetup import configure_logging, default_log_path
+
+# Global Language Variable
+CURRENT_LANG = 'IT'  # Default
+
+def get_resource_path(relative_path):
+    """Ottiene il percorso assoluto della risorsa, compatibile con PyInstaller"""
+    try:
+        # PyInstaller crea una cartella temporanea e memorizza il percorso in _MEIPASS
+        base_path = sys._MEIPASS
+    except Exception:
+        base_path = os.path.abspath(".")
+
+    return os.path.join(base_path, relative_path)
+
+def t(key):
+    """Helper per le traduzioni"""
+    return locales.TRANSLATIONS[CURRENT_LANG].get(key, key)
+
+class LanguageSelectionDialog(ctk.CTk):
+    def __init__(self):
+        super().__init__()
+        self.title("Language Selection")
+        self.geometry("400x300")
+        self.resizable(False, False)
+        
+        # Center window
+        screen_width = self.winfo_screenwidth()
+        screen_height = self.winfo_screenheight()
+        x = (screen_width - 400) // 2
+        y = (screen_height - 300) // 2
+        self.geometry(f"400x300+{x}+{y}")
+        
+        # Icon
+        try:
+            icon_path = get_resource_path("audioconv.png")
+            if Path(icon_path).exists():
+                self.iconbitmap(icon_path) # Windows only usually
+                img = Image.open(icon_path)
+                self.iconphoto(False, ImageTk.PhotoImage(img))
+        except:
+            pass
+
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure((0, 1, 2, 3), weight=1)
+
+        ctk.CTkLabel(self, text="Select Language / Seleziona Lingua", 
+                     font=("Roboto", 18, "bold")).grid(row=0, column=0, pady=20)
+
+        ctk.CTkButton(self, text="🇮🇹 Italiano", 
+                      command=lambda: self.set_lang('IT'),
+                      font=("Roboto", 14), height=40).grid(row=1, column=0, pady=10, padx=50, sticky="ew")
+
+        ctk.CTkButton(self, text="🇬🇧 English", 
+                      command=lambda: self.set_lang('EN'),
+                      font=("Roboto", 14), height=40).grid(row=2, column=0, pady=10, padx=50, sticky="ew")
+        
+        self.lang_selected = None
+
+    def set_lang(self, lang):
+        self.lang_selected = lang
+        self.destroy()
+
+class App(ctk.CTk):
+    def __init__(self):
+        super().__init__()
+
+        # Configuration
+        self.title(f"{t('app_title')} - {t('version_name')} v{APP_VERSION}")
+        self.geometry("800x700")
+        ctk.set_appearance_mode("Dark")
+        ctk.set_default_color_theme("dark-blue")
+        
+        # Icon
+        try:
+            icon_path = get_resource_path("audioconv.png")
+            if Path(icon_path).exists():
+                self.iconbitmap(icon_path)
+                self.icon_image = ctk.CTkImage(Image.open(icon_path), size=(40, 40))
+                self.large_icon = ctk.CTkImage(Image.open(icon_path), size=(100, 100))
+            else:
+                self.icon_image = None
+                self.large_icon = None
+        except:
+            self.icon_image = None
+            self.large_icon = None
+
+        # Variables
+        self.input_path = ctk.StringVar()
+        self.output_path = ctk.StringVar()
+        # Come --batch: un encode per core; con più worker compaiono le righe per worker della vista avanzamento
+        self.jobs = ctk.StringVar(value=str(os.cpu_count() or 1))
+        self.status_text = ctk.StringVar(value=t('status_ready'))
+        self.throughput_text = ctk.StringVar(value='')
+        self.workers_text = ctk.StringVar(value='')
+        self.current_conformer = None
+
+        self.setup_ui()
+
+    def setup_ui(self):
+        # Grid Layout
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(0, weight=0) # Header
+        self.grid_rowconfigure(1, weight=1) # Content
+        self.grid_rowconfigure(2, weight=0) # Footer
+
+        # === Header ===
+        header_frame = ctk.CTkFrame(self, corner_radius=0)
+        header_frame.grid(row=0, column=0, sticky="ew")
+        
+        header_content = ctk.CTkFrame(header_frame, fg_color="transparent")
+        header_content.pack(pady=10)
+        
+        if self.icon_image:
+            ctk.CTkLabel(header_content, image=self.icon_image, text="").pack(side="left", padx=10)
+            
+        ctk.CTkLabel(header_content, text=t('app_title'), font=("Roboto", 20, "bold")).pack(side="left")
+        ctk.CTkLabel(header_content, text=f"v{APP_VERSION}", font=("Roboto", 12), text_color="gray").pack(side="left", padx=5, pady=(5,0))
+
+        # === Main Content ===
+        main_frame = ctk.CTkFrame(self, fg_color="transparent")
+        main_frame.grid(row=1, column=0, sticky="nsew", padx=20, pady=20)
+
+        # Input Section
+        ctk.CTkLabel(main_frame, text=t('input_folder'), font=("Roboto", 14, "bold")).pack(anchor="w", pady=(0, 5))
+        input_row = ctk.CTkFrame(main_frame, fg_color="transparent")
+        input_row.pack(fill="x", pady=(0, 15))
+        
+        ctk.CTkEntry(input_row, textvariable=self.input_path, placeholder_text="C:/Music/Input").pack(side="left", fill="x", expand=True, padx=(0, 10))
+        ctk.CTkButton(input_row, text=t('browse'), width=100, command=self.browse_input).pack(side="right")
+
+        # Output Section
+        ctk.CTkLabel(main_frame, text=t('output_folder'), font=("Roboto", 14, "bold")).pack(anchor="w", pady=(0, 5))
+        output_row = ctk.CTkFrame(main_frame, fg_color="transparent")
+        output_row.pack(fill="x", pady=(0, 15))
+        
+        ctk.CTkEntry(output_row, textvariable=self.output_path, placeholder_text="C:/Music/Output").pack(side="left", fill="x", expand=True, padx=(0, 10))
+        ctk.CTkButton(output_row, text=t('browse'), width=100, command=self.browse_output).pack(side="right")
+
+        # Parallel Encodes
+        jobs_row = ctk.CTkFrame(main_frame, fg_color="transparent")
+        jobs_row.pack(fill="x", pady=(0, 20))
+        
+        ctk.CTkLabel(jobs_row, text=t('parallel_jobs'), font=("Roboto", 14, "bold")).pack(side="left", padx=(0, 10))
+        ctk.CTkOptionMenu(jobs_row, variable=self.jobs, width=80,
+                          values=[str(n) for n in range(1, (os.cpu_count() or 1) + 1)]).pack(side="left")
+
+        # Info Card
+        info_card = ctk.CTkFrame(main_frame)
+        info_card.pack(fill="x", pady=(0, 20))
+        
+        ctk.CTkLabel(info_card, text=f"ℹ️ {t('info_title')}", font=("Roboto", 14, "bold")).pack(anchor="w", padx=15, pady=(10, 5))
+        ctk.CTkLabel(info_card, text=t('info_text'), justify="left", font=("Roboto", 12)).pack(anchor="w", padx=15, pady=(0, 15))
+
+        # Progress Section
+        self.status_label = ctk.CTkLabel(main_frame, textvariable=self.status_text, anchor="w", text_color="gray")
+        self.status_label.pack(fill="x", pady=(0, 5))
+        
+        ctk.CTkLabel(main_frame, textvariable=self.throughput_text, anchor="w", text_color="gray",
+                     font=("Roboto", 11)).pack(fill="x")
+        ctk.CTkLabel(main_frame, textvariable=self.workers_text, anchor="w", justify="left", text_color="gray",
+                     font=("Roboto", 11)).pack(fill="x", pady=(0, 5))
+        
+        self.progress_bar = ctk.CTkProgressBar(main_frame)
+        self.progress_bar.pack(fill="x", pady=(0, 20))
+        self.progress_bar.set(0)
+
+        # Action Buttons
+        action_row = ctk.CTkFrame(main_frame, fg_color="transparent")
+        action_row.pack(pady=10)
+        
+        self.start_btn = ctk.CTkButton(action_row, text=t('start_process'), 
+                                     command=self.start_process,
+                                     font=("Roboto", 16, "bold"),
+                                     height=50, width=200,
+                                     fg_color="#2ecc71", hover_color="#27ae60")
+        self.start_btn.pack(side="left", padx=10)
+        
+        self.stop_btn = ctk.CTkButton(action_row, text=t('stop_process'), 
+                                    command=self.stop_process,
+                                    font=("Roboto", 16, "bold"),
+                                    height=50, width=100,
+                                    fg_color="#e74c3c", hover_color="#c0392b",
+                                    state="disabled")
+        self.stop_btn.pack(side="left", padx=10)
+
+        # === Footer ===
+        footer_frame = ctk.CTkFrame(self, corner_radius=0, fg_color="#1a1a1a")
+        footer_frame.grid(row=2, column=0, sticky="ew")
+        
+        ctk.CTkLabel(footer_frame, text=f"{t('developed_by')} {AUTHOR} | {t('llm_credit')}", 
+                     font=("Roboto", 10), text_color="gray").pack(pady=5)
+        
+        ctk.CTkButton(footer_frame, text=f"💝 {t('donate_btn')}", 
+                      command=lambda: webbrowser.open('https://paypal.me/runtimeradio'),
+                      fg_color="transparent", border_width=1, border_color="#f39c12",
+                      text_color="#f39c12", hover_color="#2c2c2c", height=25).pack(pady=(0, 10))
+
+    def browse_input(self):
+        path = ctk.filedialog.askdirectory()
+        if path:
+            self.input_path.set(path)
+
+    def browse_output(self):
+        path = ctk.filedialog.askdirectory()
+        if path:
+            self.output_path.set(path)
+
+    def update_progress_safe(self, snapshot: ProgressSnapshot):
+        # Barra sul lavoro stimato (un DJ set di due ore pesa più di cento singoli), ETA sui byte rimanenti
+        self.progress_bar.set(snapshot.fraction)
+        if snapshot.completed:
+            status = t('status_processing').format(filename=snapshot.filename, current=snapshot.completed,
+                                                   total=snapshot.total)
+            if snapshot.eta is not None:
+                status += t('status_eta').format(eta=format_duration(snapshot.eta))
+            self.status_text.set(status)
+            self.throughput_text.set(t('status_throughput').format(
+                files=snapshot.files_per_sec, mb=snapshot.mb_per_sec))
+        # Vista per worker solo quando più file sono in lavorazione contemporaneamente
+        if len(snapshot.workers) > 1:
+            self.workers_text.set('\n'.join(f"#{i}: {name}" for i, (_, name) in enumerate(snapshot.workers, 1)))
+        else:
+            self.workers_text.set('')
+
+    def _refresh_progress(self):
+        """Ridisegna l'avanzamento a frequenza fissa finché l'elaborazione è in corso"""
+        conformer = self.current_conformer
+        # A elaborazione conclusa il messaggio finale del worker non va sovrascritto
+        if conformer is None or (conformer.report is not None and conformer.report.finished is not None):
+            return
+        if not conformer.stop_requested:
+            self.update_progress_safe(conformer.progress_snapshot())
+        self.after(REFRESH_INTERVAL_MS, self._refresh_progress)
+
+    def start_process(self):
+        in_dir = self.input_path.get()
+        out_dir = self.output_path.get()
+        
+        if not in_dir or not out_dir:
+            ctk.filedialog.showerror(t('error_title'), t('error_input_output'))
+            return
+            
+        if not Path(in_dir).exists():
+            ctk.filedialog.showerror(t('error_title'), t('error_input_not_found').format(path=in_dir))
+            return
+
+        self.start_btn.configure(state="disabled")
+        self.stop_btn.configure(state="normal")
+        self.progress_bar.set(0)
+        self.status_text.set(t('status_ready'))
+        # Le variabili Tk si leggono dal thread della GUI, non dal worker
+        jobs = int(self.jobs.get())
+
+        def worker():
+            probe_cache = None
+            try:
+                configure_logging(default_log_path(out_dir))
+                probe_cache = ProbeCache(default_db_path(out_dir))
+                self.current_conformer = SimpleConformer(
+                    in_dir, out_dir, 
+                    jobs=jobs,
+                    probe_cache=probe_cache,
+                    report_dir=default_report_dir(out_dir)
+                )
+                # Nessun after() per file: il timer della GUI legge un'istantanea ogni REFRESH_INTERVAL_MS
+                self.after(0, self._refresh_progress)
+                self.current_conformer.run()
+                
+                if self.current_conformer.stop_requested:
+                    self.after(0, lambda: self.status_text.set(t('status_stopped')))
+                    self.after(0, lambda: ctk.filedialog.showinfo("Info", t('status_stopped')))
+                else:
+                    self.after(0, lambda: self.status_text.set(t('status_completed')))
+                    self.after(0, lambda: self.progress_bar.set(1))
+                    stats = self.current_conformer.stats
+                    msg = t('success_body').format(
+                        processed=stats['processed'],
+                        copied=stats['copied'],
+                        converted=stats['converted'],
+                        skipped=stats['skipped'],
+                        errors=stats['errors'],
+                        out_dir=out_dir
+                    )
+                    self.after(0, lambda: ctk.filedialog.showinfo(t('success_title'), msg))
+                    
+            except Exception as e:
+                self.after(0, lambda: ctk.filedialog.showerror(t('error_title'), str(e)))
+            finally:
+                if probe_cache is not None:
+                    probe_cache.close()
+                self.after(0, self.reset_ui)
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def stop_process(self):
+        if self.current_conformer:
+            self.current_conformer.stop()
+            self.status_text.set(t('status_stopping'))
+            self.stop_btn.configure(state="disabled")
+
+    def reset_ui(self):
+        self.start_btn.configure(state="normal")
+        self.stop_btn.configure(state="disabled")
+        self.workers_text.set('')
+        self.current_conformer = None
+
+def launch():
+    global CURRENT_LANG
+    
+    # 1. Language Selection
+    lang_dialog = LanguageSelectionDialog()
+    lang_dialog.mainloop()
+    
+    if not lang_dialog.lang_selected:
+        sys.exit(0) # User closed dialog
+        
+    CURRENT_LANG = lang_dialog.lang_selected
+    
+    # 2. Main App
+    app = App()
+    app.mainloop()
@@ -10,11 +10,14 @@ TRANSLATIONS = {
         'start_app': "Avvia Applicazione",
         'input_folder': "Cartella di Input",
         'output_folder': "Cartella di Output",
+        'parallel_jobs': "Conversioni parallele",
         'browse': "Sfoglia",
         'start_process': "AVVIA ELABORAZIONE",
         'stop_process': "STOP",
         'status_ready': "Pronto",
         'status_processing': "Elaborazione: {filename} ({current}/{total})",
+        'status_eta': " - circa {eta} rimanenti",
+        'status_throughput': "{files:.1f} file/s - {mb:.1f} MB/s",
         'status_stopping': "Interruzione in corso...",
         'status_stopped': "Elaborazione interrotta dall'utente.",
         'status_completed': "Elaborazione completata!",
@@ -49,11 +52,14 @@ TRANSLATIONS = {
         'start_app': "Start Application",
         'input_folder': "Input Folder",
         'output_folder': "Output Folder",
+        'parallel_jobs': "Parallel encodes",
         'browse': "Browse",
         'start_process': "START PROCESSING",
         'stop_process': "STOP",
         'status_ready': "Ready",
         'status_processing': "Processing: {filename} ({current}/{total})",
+        'status_eta': " - about {eta} left",
+        'status_throughput': "{files:.1f} files/s - {mb:.1f} MB/s",
         'status_stopping': "Stopping...",
         'status_stopped': "Processing stopped by user.",
         'status_completed': "Processing completed!",
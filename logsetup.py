@@ -0,0 +1,114 @@
+"""
+Logging di processo per Audio & Metadata Converter
+Configurato una volta sola: i worker accodano i record in memoria (QueueHandler) e un unico thread
+(QueueListener) li scrive su console e in un file JSON-lines a rotazione sotto la cartella di output
+"""
+
+import json
+import queue
+import atexit
+import logging
+import logging.handlers
+import threading
+from pathlib import Path
+from typing import Optional
+
+LOG_DIR_NAME = '.conformer-logs'
+LOG_FILE_NAME = 'conformer.jsonl'
+# Rotazione per dimensione: al massimo (LOG_BACKUPS + 1) * LOG_MAX_BYTES su disco
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUPS = 5
+# Logger dei record per file: solo nel file JSON, la console resta leggibile anche con 100k file
+FILE_LOGGER_NAME = 'conformer.files'
+CONSOLE_FORMAT = '%(asctime)s - %(message)s'
+
+_lock = threading.Lock()
+_state = {'listener': None, 'handler': None, 'path': None}
+
+
+def default_log_path(output_dir) -> Path:
+    return Path(output_dir) / LOG_DIR_NAME / LOG_FILE_NAME
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Un oggetto JSON per riga; i campi passati con extra={'fields': {...}} diventano chiavi del record"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        fields = getattr(record, 'fields', None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class _ConsoleFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        return not record.name.startswith(FILE_LOGGER_NAME)
+
+
+def configure_logging(log_path=None, level: int = logging.INFO, console: bool = True,
+                      max_bytes: int = LOG_MAX_BYTES, backups: int = LOG_BACKUPS) -> Optional[Path]:
+    """Installa il logging asincrono sul logger radice; una nuova chiamata sostituisce la precedente
+
+    Senza log_path scrive solo su console. Restituisce il percorso del file di log.
+    """
+    handlers = []
+    if console:
+        stream = logging.StreamHandler()
+        stream.setFormatter(logging.Formatter(CONSOLE_FORMAT))
+        stream.addFilter(_ConsoleFilter())
+        handlers.append(stream)
+    path = None
+    if log_path is not None:
+        path = Path(log_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        rotating = logging.handlers.RotatingFileHandler(str(path), maxBytes=max_bytes, backupCount=backups,
+                                                        encoding='utf-8')
+        rotating.setFormatter(JsonLinesFormatter())
+        handlers.append(rotating)
+
+    with _lock:
+        _stop_listener()
+        records = queue.SimpleQueue()
+        handler = logging.handlers.QueueHandler(records)
+        listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+        root = logging.getLogger()
+        root.addHandler(handler)
+        root.setLevel(level)
+        listener.start()
+        _state.update(listener=listener, handler=handler, path=path)
+    return path
+
+
+def _stop_listener():
+    listener, handler = _state['listener'], _state['handler']
+    if handler is not None:
+        logging.getLogger().removeHandler(handler)
+    if listener is not None:
+        # Svuota la coda prima di chiudere i file
+        listener.stop()
+        for target in listener.handlers:
+            target.close()
+    _state.update(listener=None, handler=None, path=None)
+
+
+def shutdown_logging():
+    with _lock:
+        _stop_listener()
+
+
+def current_log_path() -> Optional[Path]:
+    return _state['path']
+
+
+atexit.register(shutdown_logging)
@@ -0,0 +1,176 @@
+"""
+Lettura degli header MP3 per Audio & Metadata Converter
+Bitrate, frequenza, canali, CBR/VBR e durata dai primi frame e dal tag Xing/Info/VBRI, senza ffprobe:
+pochi KB letti invece di un processo. Restituisce None per i file ambigui, che passano a ffprobe.
+"""
+
+import os
+import struct
+from typing import NamedTuple, Optional
+
+# Byte letti dopo l'eventuale tag ID3v2: bastano per una ventina di frame a 320 kbps
+SCAN_BYTES = 16384
+# Frame consecutivi da validare prima di fidarsi di una sincronizzazione (evita falsi sync nei dati)
+MIN_FRAMES = 3
+
+_VERSIONS = {0: '2.5', 2: '2', 3: '1'}
+_BITRATES = {
+    '1': (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    '2': (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_SAMPLE_RATES = {
+    '1': (44100, 48000, 32000),
+    '2': (22050, 24000, 16000),
+    '2.5': (11025, 12000, 8000),
+}
+_MODES = ('stereo', 'joint_stereo', 'dual_channel', 'mono')
+
+
+class FrameHeader(NamedTuple):
+    version: str
+    bitrate: int        # kbps
+    sample_rate: int
+    mode: str
+    length: int         # byte del frame, header compreso
+
+    @property
+    def channels(self) -> int:
+        return 1 if self.mode == 'mono' else 2
+
+    @property
+    def samples(self) -> int:
+        return 1152 if self.version == '1' else 576
+
+    @property
+    def side_info(self) -> int:
+        if self.version == '1':
+            return 17 if self.mode == 'mono' else 32
+        return 9 if self.mode == 'mono' else 17
+
+
+class Mp3Info(NamedTuple):
+    """Caratteristiche lette dagli header; bitrate è quello nominale (per i VBR il medio dal tag, se noto)"""
+    bitrate: int
+    sample_rate: int
+    channels: int
+    mode: str
+    vbr: bool
+    duration: float
+
+
+def parse_frame_header(data: bytes, offset: int = 0) -> Optional[FrameHeader]:
+    """Header di un frame MPEG Layer III valido all'offset indicato, altrimenti None"""
+    if offset + 4 > len(data):
+        return None
+    value = struct.unpack_from('>I', data, offset)[0]
+    if value >> 21 != 0x7FF:
+        return None
+    version = _VERSIONS.get((value >> 19) & 0x3)
+    layer = (value >> 17) & 0x3
+    bitrate_index = (value >> 12) & 0xF
+    rate_index = (value >> 10) & 0x3
+    # Solo Layer III; free format (indice 0) e valori riservati non sono decidibili dall'header
+    if version is None or layer != 1 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    bitrate = _BITRATES['1' if version == '1' else '2'][bitrate_index]
+    sample_rate = _SAMPLE_RATES[version][rate_index]
+    padding = (value >> 9) & 0x1
+    coefficient = 144 if version == '1' else 72
+    length = coefficient * bitrate * 1000 // sample_rate + padding
+    return FrameHeader(version, bitrate, sample_rate, _MODES[(value >> 6) & 0x3], length)
+
+
+def _id3v2_size(head: bytes) -> int:
+    """Byte occupati da un tag ID3v2 iniziale (0 se assente): dimensione syncsafe più header e footer"""
+    if len(head) < 10 or head[:3] != b'ID3':
+        return 0
+    size = 0
+    for byte in head[6:10]:
+        if byte & 0x80:
+            return 0
+        size = (size << 7) | byte
+    footer = 10 if head[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def _vbr_tag(data: bytes, offset: int, header: FrameHeader):
+    """Tag Xing/Info (LAME) o VBRI (Fraunhofer) nel primo frame: (tipo, numero di frame o None)"""
+    position = offset + 4 + header.side_info
+    tag = data[position:position + 4]
+    if tag in (b'Xing', b'Info') and position + 8 <= len(data):
+        flags = struct.unpack_from('>I', data, position + 4)[0]
+        frames = None
+        if flags & 0x1 and position + 12 <= len(data):
+            frames = struct.unpack_from('>I', data, position + 8)[0]
+        return tag.decode('ascii'), frames
+    position = offset + 36
+    if data[position:position + 4] == b'VBRI' and position + 18 <= len(data):
+        return 'VBRI', struct.unpack_from('>I', data, position + 14)[0]
+    return None, None
+
+
+def _sync(data: bytes) -> Optional[int]:
+    """Primo offset da cui partono MIN_FRAMES frame consecutivi coerenti (stessa versione e frequenza)"""
+    offset = data.find(b'\xff')
+    while 0 <= offset < len(data) - 4:
+        first = parse_frame_header(data, offset)
+        if first is not None:
+            position, count = offset, 0
+            while count < MIN_FRAMES:
+                header = parse_frame_header(data, position)
+                if header is None or (header.version, header.sample_rate) != (first.version, first.sample_rate):
+                    break
+                position += header.length
+                count += 1
+            if count >= MIN_FRAMES:
+                return offset
+        offset = data.find(b'\xff', offset + 1)
+    return None
+
+
+def read_mp3_info(path) -> Optional[Mp3Info]:
+    """Legge gli header di un file MP3; None se il file non è decidibile (serve ffprobe)"""
+    try:
+        with open(path, 'rb') as f:
+            file_size = os.fstat(f.fileno()).st_size
+            head = f.read(10)
+            audio_start = _id3v2_size(head)
+            f.seek(audio_start)
+            data = f.read(SCAN_BYTES)
+    except OSError:
+        return None
+
+    offset = _sync(data)
+    if offset is None:
+        return None
+    first = parse_frame_header(data, offset)
+    tag, tag_frames = _vbr_tag(data, offset, first)
+    frames_start = offset + first.length if tag else offset
+
+    # Bitrate dei frame audio letti: in un CBR sono tutti uguali
+    bitrates = set()
+    position = frames_start
+    while True:
+        header = parse_frame_header(data, position)
+        if header is None or position + header.length > len(data):
+            break
+        bitrates.add(header.bitrate)
+        position += header.length
+    if not bitrates:
+        return None
+
+    vbr = tag in ('Xing', 'VBRI') or len(bitrates) > 1
+    audio_bytes = file_size - audio_start - frames_start
+    if vbr:
+        if not tag_frames:
+            # VBR senza numero di frame: durata e bitrate medio non ricavabili dagli header
+            return None
+        duration = tag_frames * first.samples / first.sample_rate
+        bitrate = int(audio_bytes * 8 / duration / 1000) if duration > 0 else 0
+    else:
+        bitrate = bitrates.pop()
+        if tag_frames:
+            duration = tag_frames * first.samples / first.sample_rate
+        else:
+            duration = audio_bytes * 8 / (bitrate * 1000)
+    return Mp3Info(bitrate, first.sample_rate, first.channels, first.mode, vbr, duration)
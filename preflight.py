@@ -0,0 +1,134 @@
+"""
+Pianificazione preliminare per Audio & Metadata Converter
+Prima di convertire: quanti file verranno saltati, copiati o convertiti, quanti byte verranno scritti,
+se ci stanno nel volume di output e quanto durerà l'esecuzione (--dry-run, --preflight)
+"""
+
+import os
+import shutil
+from pathlib import Path
+from typing import NamedTuple
+
+ACTIONS = ('skip', 'copy', 'convert')
+# Bitrate medio tipico di LAME per -q:a, per stimare l'output dei profili VBR
+VBR_QUALITY_KBPS = {0: 245, 1: 225, 2: 190, 3: 175, 4: 165, 5: 130, 6: 115, 7: 100, 8: 85, 9: 65}
+# Contenitore, header e tag oltre all'audio codificato
+CONTAINER_OVERHEAD = 1.02
+# Velocità di riferimento per la durata stimata: secondi di audio a costo 1.0 codificati al secondo
+# da un worker, e throughput delle copie
+ENCODE_SPEED = 40.0
+COPY_BYTES_PER_SECOND = 200 * 1024 * 1024
+# Spazio da lasciare comunque libero sul volume di output (temporanei, database di stato, log)
+RESERVE_BYTES = 64 * 1024 * 1024
+
+
+class PlanEntry(NamedTuple):
+    """Decisione prevista per un file e suo contributo a byte scritti e lavoro"""
+    action: str
+    size: int = 0
+    output_bytes: int = 0
+    replaced_bytes: int = 0
+    cost: float = 0.0
+    duration: float = 0.0
+
+
+def profile_kbps(profile) -> int:
+    if profile.bitrate is not None:
+        return profile.bitrate
+    return VBR_QUALITY_KBPS.get(profile.vbr_quality, 192)
+
+
+def estimate_output_bytes(duration: float, profile) -> int:
+    """Byte di un output codificato: durata × bitrate del profilo, più il contenitore"""
+    return int(duration * profile_kbps(profile) * 1000 / 8 * CONTAINER_OVERHEAD)
+
+
+def free_space(path) -> int:
+    """Byte disponibili (per un utente non privilegiato) sul volume di path o del primo antenato esistente"""
+    path = Path(path).absolute()
+    while not path.exists() and path.parent != path:
+        path = path.parent
+    if hasattr(os, 'statvfs'):
+        stat = os.statvfs(str(path))
+        return stat.f_bavail * stat.f_frsize
+    return shutil.disk_usage(str(path)).free
+
+
+def format_bytes(size: float) -> str:
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if abs(size) < 1024:
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+class RunPlan:
+    """Totali del passaggio preliminare"""
+
+    def __init__(self, jobs: int = 1):
+        self.jobs = max(1, jobs)
+        self.files = {action: 0 for action in ACTIONS}
+        self.input_bytes = {action: 0 for action in ACTIONS}
+        self.copy_bytes = 0
+        self.output_bytes = 0
+        self.replaced_bytes = 0
+        self.encode_cost = 0.0
+        self.audio_seconds = 0.0
+        self.free_bytes = None
+
+    def add(self, entry: PlanEntry):
+        self.files[entry.action] += 1
+        self.input_bytes[entry.action] += entry.size
+        if entry.action == 'skip':
+            return
+        if entry.action == 'copy':
+            self.copy_bytes += entry.output_bytes
+        self.output_bytes += entry.output_bytes
+        self.replaced_bytes += entry.replaced_bytes
+        self.encode_cost += entry.cost
+        self.audio_seconds += entry.duration
+
+    @property
+    def total_files(self) -> int:
+        return sum(self.files.values())
+
+    @property
+    def required_bytes(self) -> int:
+        """Spazio necessario: gli output sostituiti liberano il proprio spazio al rename"""
+        return max(0, self.output_bytes - self.replaced_bytes) + RESERVE_BYTES
+
+    @property
+    def fits(self) -> bool:
+        return self.free_bytes is None or self.required_bytes <= self.free_bytes
+
+    @property
+    def estimated_seconds(self) -> float:
+        return self.encode_cost / (ENCODE_SPEED * self.jobs) + self.copy_bytes / COPY_BYTES_PER_SECOND
+
+    def to_dict(self) -> dict:
+        return {
+            'files': dict(self.files),
+            'input_bytes': dict(self.input_bytes),
+            'output_bytes': self.output_bytes,
+            'replaced_bytes': self.replaced_bytes,
+            'required_bytes': self.required_bytes,
+            'free_bytes': self.free_bytes,
+            'fits': self.fits,
+            'audio_seconds': round(self.audio_seconds, 1),
+            'estimated_seconds': round(self.estimated_seconds, 1),
+            'jobs': self.jobs,
+        }
+
+    def summary_lines(self, format_duration=None) -> list:
+        duration = format_duration(self.estimated_seconds) if format_duration else f"{self.estimated_seconds:.0f}s"
+        lines = [
+            f"Piano: {self.total_files} file — {self.files['skip']} da saltare, "
+            f"{self.files['copy']} da copiare, {self.files['convert']} da convertire",
+            f"Scrittura stimata: {format_bytes(self.output_bytes)} "
+            f"(sostituiti {format_bytes(self.replaced_bytes)}, richiesti {format_bytes(self.required_bytes)})",
+        ]
+        if self.free_bytes is not None:
+            lines.append(f"Spazio libero: {format_bytes(self.free_bytes)} — "
+                         f"{'sufficiente' if self.fits else 'INSUFFICIENTE'}")
+        lines.append(f"Durata stimata con {self.jobs} worker: {duration}")
+        return lines
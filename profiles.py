@@ -0,0 +1,80 @@
+"""
+Profili di destinazione per Audio & Metadata Converter
+Codec, bitrate (CBR o VBR), frequenza, canali e contenitore di ogni output
+"""
+
+from typing import NamedTuple, Optional
+
+# Scarto ammesso sul bitrate misurato da ffprobe rispetto al bitrate nominale del profilo
+BITRATE_TOLERANCE = 10000
+
+
+class Profile(NamedTuple):
+    """Formato di un output: encoder ffmpeg, parametri e come riconoscere un file già conforme"""
+    name: str
+    encoder: str                # encoder ffmpeg (-c:a)
+    codec: str                  # codec_name riportato da ffprobe per un file conforme
+    extension: str
+    container: str              # muxer ffmpeg (-f): il file temporaneo non ha l'estensione finale
+    bitrate: Optional[int]      # kbps per CBR/ABR; None per VBR
+    vbr_quality: Optional[int]  # -q:a per VBR
+    sample_rate: int
+    channels: int
+
+    def rate_args(self) -> list:
+        if self.bitrate is not None:
+            return ['-b:a', f'{self.bitrate}k']
+        return ['-q:a', str(self.vbr_quality)]
+
+    def signature(self) -> str:
+        """Impostazioni che determinano l'output (manifest, indice dei duplicati)"""
+        rate = f'{self.bitrate}k' if self.bitrate is not None else f'q{self.vbr_quality}'
+        return f"{self.container}:{self.encoder}:{rate}:{self.sample_rate}:ac{self.channels}"
+
+    def matches(self, extension: str, codec: Optional[str], bit_rate: int, sample_rate: int, channels: int) -> bool:
+        """Vero se un file con queste caratteristiche può essere copiato invece che ricodificato"""
+        if extension != self.extension or codec != self.codec or sample_rate != self.sample_rate:
+            return False
+        # ffprobe non sempre riporta i canali: un valore assente non rende il file non conforme
+        if channels and channels != self.channels:
+            return False
+        if self.bitrate is None:
+            # VBR: il bitrate medio non dice nulla sulla qualità, basta formato e frequenza
+            return True
+        return abs(bit_rate - self.bitrate * 1000) < BITRATE_TOLERANCE
+
+
+def mp3_cbr(bitrate: int, sample_rate: int, channels: int = 2, name: Optional[str] = None) -> Profile:
+    return Profile(name or f'mp3-{bitrate}', 'libmp3lame', 'mp3', '.mp3', 'mp3', bitrate, None, sample_rate, channels)
+
+
+PROFILES = {
+    # Playout FM: il formato storico del convertitore
+    'mp3-192': mp3_cbr(192, 44100),
+    'mp3-320': mp3_cbr(320, 44100),
+    'mp3-vbr': Profile('mp3-vbr', 'libmp3lame', 'mp3', '.mp3', 'mp3', None, 2, 44100, 2),
+    # Broadcast a 48 kHz (catene DAB/TV)
+    'broadcast-48k': mp3_cbr(256, 48000, name='broadcast-48k'),
+    # Parlato: mono a bitrate ridotto
+    'speech-mono': mp3_cbr(64, 44100, channels=1, name='speech-mono'),
+    # Streaming
+    'aac-128': Profile('aac-128', 'aac', 'aac', '.m4a', 'ipod', 128, None, 44100, 2),
+    'opus-96': Profile('opus-96', 'libopus', 'opus', '.opus', 'opus', 96, None, 48000, 2),
+}
+DEFAULT_PROFILE = 'mp3-192'
+
+
+def resolve_profiles(names) -> list:
+    """Nomi o Profile in una lista di Profile, senza duplicati; il primo è il profilo principale"""
+    profiles = []
+    for item in names:
+        if isinstance(item, Profile):
+            profile = item
+        elif item in PROFILES:
+            profile = PROFILES[item]
+        else:
+            raise ValueError(f"Profilo sconosciuto: {item} (disponibili: {', '.join(PROFILES)})")
+        if profile.name in (p.name for p in profiles):
+            raise ValueError(f"Profilo ripetuto: {profile.name}")
+        profiles.append(profile)
+    return profiles
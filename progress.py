@@ -0,0 +1,96 @@
+"""
+Avanzamento aggregato per Audio & Metadata Converter
+I worker aggiornano contatori in memoria; GUI e CLI leggono un'istantanea a frequenza fissa,
+così 100k file saltati non generano 100k ridisegni
+"""
+
+import time
+import threading
+from collections import deque
+from typing import NamedTuple, Optional
+
+# Finestra delle velocità mobili (file/s, MB/s) e frequenza di aggiornamento della GUI
+RATE_WINDOW_SECONDS = 10.0
+REFRESH_INTERVAL_MS = 100
+
+
+class ProgressSnapshot(NamedTuple):
+    """Stato di avanzamento in un istante: tutto ciò che serve per disegnare barra e statistiche"""
+    completed: int
+    total: int
+    filename: str
+    fraction: float
+    files_per_sec: float
+    mb_per_sec: float
+    eta: Optional[float]
+    workers: tuple
+
+
+class ProgressTracker:
+    """Contatori di avanzamento thread-safe con velocità su finestra mobile"""
+
+    def __init__(self, window: float = RATE_WINDOW_SECONDS):
+        self.window = window
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.bytes_done = 0
+        self.last_file = ''
+        self._active = {}
+        self._samples = deque()
+
+    def started(self, filename: str, worker: Optional[str] = None):
+        """Un worker ha iniziato un file (vista per worker quando i job sono più di uno)"""
+        with self._lock:
+            self._active[worker or threading.current_thread().name] = filename
+
+    def ended(self, worker: Optional[str] = None):
+        with self._lock:
+            self._active.pop(worker or threading.current_thread().name, None)
+
+    def completed_file(self, filename: str, size: int = 0, now: Optional[float] = None):
+        now = now if now is not None else time.monotonic()
+        with self._lock:
+            self.completed += 1
+            self.bytes_done += size
+            self.last_file = filename
+            self._samples.append((now, size))
+            self._trim(now)
+
+    def _trim(self, now: float):
+        while self._samples and now - self._samples[0][0] > self.window:
+            self._samples.popleft()
+
+    def rates(self, now: Optional[float] = None) -> tuple:
+        """File/s e byte/s sulla finestra mobile"""
+        now = now if now is not None else time.monotonic()
+        with self._lock:
+            self._trim(now)
+            if not self._samples:
+                return 0.0, 0.0
+            # Con pochi campioni la finestra è il tempo dal primo, non la finestra intera
+            span = max(now - self._samples[0][0], 1.0) if len(self._samples) > 1 else self.window
+            files = len(self._samples)
+            size = sum(s for _, s in self._samples)
+        return files / span, size / span
+
+    def snapshot(self, total: int, bytes_total: int = 0, fraction: Optional[float] = None,
+                 now: Optional[float] = None) -> ProgressSnapshot:
+        """Istantanea per la visualizzazione; l'ETA è pesata sui byte rimanenti alla velocità mobile"""
+        files_per_sec, bytes_per_sec = self.rates(now)
+        with self._lock:
+            completed = self.completed
+            bytes_done = self.bytes_done
+            filename = self.last_file
+            workers = tuple(sorted(self._active.items()))
+        total = max(total, completed)
+        if fraction is None:
+            fraction = completed / total if total else 0.0
+        eta = None
+        if bytes_total > bytes_done and bytes_per_sec > 0:
+            eta = (bytes_total - bytes_done) / bytes_per_sec
+        elif total > completed and files_per_sec > 0:
+            eta = (total - completed) / files_per_sec
+        elif total and completed >= total:
+            eta = 0.0
+        return ProgressSnapshot(completed, total, filename, fraction, files_per_sec,
+                                bytes_per_sec / 1e6, eta, workers)
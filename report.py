@@ -0,0 +1,192 @@
+"""
+Report di esecuzione per Audio & Metadata Converter
+Tempi per fase e per file, percentili di latenza, byte letti/scritti
+Output JSON, CSV e textfile Prometheus (node exporter)
+"""
+
+import os
+import csv
+import math
+import json
+import time
+import heapq
+import threading
+from array import array
+from pathlib import Path
+from typing import Optional
+
+# Fasi misurate per ogni file, nell'ordine in cui compaiono nel CSV
+FILE_STAGES = ('check', 'probe', 'loudness', 'dedup', 'copy', 'encode')
+# Nome della cartella dei report dentro la cartella di output
+REPORT_DIR_NAME = '.conformer-reports'
+SLOWEST_FILES = 10
+
+
+def default_report_dir(output_dir) -> Path:
+    return Path(output_dir) / REPORT_DIR_NAME
+
+
+def percentile(sorted_values, fraction: float) -> float:
+    """Percentile nearest-rank su valori già ordinati"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def _latency_summary(values) -> dict:
+    ordered = sorted(values)
+    return {
+        'count': len(ordered),
+        'total_seconds': round(sum(ordered), 6),
+        'p50': round(percentile(ordered, 0.50), 6),
+        'p95': round(percentile(ordered, 0.95), 6),
+        'p99': round(percentile(ordered, 0.99), 6),
+        'max': round(ordered[-1], 6) if ordered else 0.0,
+    }
+
+
+class RunReport:
+    """Raccoglie i tempi di un'esecuzione; le righe per file vanno subito su CSV per non crescere in memoria"""
+
+    def __init__(self, input_dir, output_dir, report_dir=None, jobs: int = 1):
+        self.input_dir = str(input_dir)
+        self.output_dir = str(output_dir)
+        self.jobs = jobs
+        self.started = time.time()
+        self.finished = None
+        self._wall_start = time.perf_counter()
+        self.wall_seconds = 0.0
+        self._lock = threading.Lock()
+        # array('d') tiene un float in 8 byte: percentili esatti anche su milioni di file
+        self._stage_latencies = {stage: array('d') for stage in FILE_STAGES}
+        self._file_latencies = array('d')
+        self._aggregate_stages = {}
+        self._slowest = []
+        self.outcomes = {}
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+        self.report_dir = Path(report_dir) if report_dir else None
+        self.csv_path = None
+        self.json_path = None
+        self._csv_file = None
+        self._csv = None
+        if self.report_dir is not None:
+            self.report_dir.mkdir(parents=True, exist_ok=True)
+            stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(self.started))
+            self.csv_path = self.report_dir / f"conformer-report-{stamp}.csv"
+            self.json_path = self.report_dir / f"conformer-report-{stamp}.json"
+            self._csv_file = open(self.csv_path, 'w', newline='', encoding='utf-8')
+            self._csv = csv.writer(self._csv_file)
+            self._csv.writerow(['file', 'outcome', 'total_seconds']
+                               + [f'{stage}_seconds' for stage in FILE_STAGES]
+                               + ['bytes_in', 'bytes_out'])
+
+    def add_stage_time(self, stage: str, seconds: float):
+        """Tempo di una fase non legata a un singolo file (es. scansione delle cartelle)"""
+        with self._lock:
+            self._aggregate_stages[stage] = self._aggregate_stages.get(stage, 0.0) + seconds
+
+    def record_file(self, rel_path: str, outcome: str, timings: dict, total_seconds: float,
+                    bytes_in: int = 0, bytes_out: int = 0):
+        with self._lock:
+            self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+            self._file_latencies.append(total_seconds)
+            for stage, seconds in timings.items():
+                self._stage_latencies[stage].append(seconds)
+            item = (total_seconds, rel_path, outcome)
+            if len(self._slowest) < SLOWEST_FILES:
+                heapq.heappush(self._slowest, item)
+            else:
+                heapq.heappushpop(self._slowest, item)
+            if self._csv is not None:
+                self._csv.writerow([rel_path, outcome, f"{total_seconds:.6f}"]
+                                   + [f"{timings[stage]:.6f}" if stage in timings else '' for stage in FILE_STAGES]
+                                   + [bytes_in, bytes_out])
+
+    def finish(self):
+        with self._lock:
+            if self.finished is None:
+                self.finished = time.time()
+                self.wall_seconds = time.perf_counter() - self._wall_start
+            if self._csv_file is not None:
+                self._csv_file.close()
+                self._csv_file = None
+                self._csv = None
+
+    def summary(self, stats: Optional[dict] = None) -> dict:
+        with self._lock:
+            stages = {stage: _latency_summary(values)
+                      for stage, values in self._stage_latencies.items() if len(values)}
+            for stage, seconds in self._aggregate_stages.items():
+                stages[stage] = {'total_seconds': round(seconds, 6)}
+            wall = self.wall_seconds or (time.perf_counter() - self._wall_start)
+            return {
+                'input_dir': self.input_dir,
+                'output_dir': self.output_dir,
+                'jobs': self.jobs,
+                'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started)),
+                'finished': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.finished or time.time())),
+                'wall_seconds': round(wall, 3),
+                'stats': dict(stats or {}),
+                'outcomes': dict(self.outcomes),
+                'bytes_in': self.bytes_in,
+                'bytes_out': self.bytes_out,
+                'mb_per_sec_in': round(self.bytes_in / wall / 1e6, 3) if wall > 0 else 0.0,
+                'file_latency': _latency_summary(self._file_latencies),
+                'stages': stages,
+                'slowest_files': [{'file': path, 'outcome': outcome, 'seconds': round(seconds, 3)}
+                                  for seconds, path, outcome in sorted(self._slowest, reverse=True)],
+            }
+
+    def write_json(self, path, stats: Optional[dict] = None):
+        Path(path).write_text(json.dumps(self.summary(stats), indent=2, ensure_ascii=False), encoding='utf-8')
+
+    def write_prometheus(self, path, stats: Optional[dict] = None):
+        """Textfile per il collector di node exporter; scritto con rename atomico come richiesto dal collector"""
+        summary = self.summary(stats)
+        library = self.input_dir.replace('\\', '\\\\').replace('"', '\\"')
+        label = f'library="{library}"'
+        lines = [
+            '# HELP conformer_last_run_files Files handled in the last run by outcome.',
+            '# TYPE conformer_last_run_files gauge',
+        ]
+        for outcome, count in sorted(summary['outcomes'].items()):
+            lines.append(f'conformer_last_run_files{{{label},outcome="{outcome}"}} {count}')
+        lines += [
+            '# HELP conformer_last_run_stage_seconds Time spent per pipeline stage in the last run.',
+            '# TYPE conformer_last_run_stage_seconds gauge',
+        ]
+        for stage, values in sorted(summary['stages'].items()):
+            lines.append(f'conformer_last_run_stage_seconds{{{label},stage="{stage}"}} {values["total_seconds"]}')
+        lines += [
+            '# HELP conformer_last_run_stage_latency_seconds Per-file stage latency quantiles in the last run.',
+            '# TYPE conformer_last_run_stage_latency_seconds gauge',
+        ]
+        for stage, values in sorted(summary['stages'].items()):
+            for quantile in ('p50', 'p95', 'p99'):
+                if quantile in values:
+                    q = f"0.{quantile[1:]}"
+                    lines.append(f'conformer_last_run_stage_latency_seconds{{{label},stage="{stage}",quantile="{q}"}} '
+                                 f'{values[quantile]}')
+        lines += [
+            '# HELP conformer_last_run_bytes_in Source bytes read by copies and conversions in the last run.',
+            '# TYPE conformer_last_run_bytes_in gauge',
+            f'conformer_last_run_bytes_in{{{label}}} {summary["bytes_in"]}',
+            '# HELP conformer_last_run_bytes_out Output bytes written in the last run.',
+            '# TYPE conformer_last_run_bytes_out gauge',
+            f'conformer_last_run_bytes_out{{{label}}} {summary["bytes_out"]}',
+            '# HELP conformer_last_run_wall_seconds Wall time of the last run.',
+            '# TYPE conformer_last_run_wall_seconds gauge',
+            f'conformer_last_run_wall_seconds{{{label}}} {summary["wall_seconds"]}',
+            '# HELP conformer_last_run_timestamp_seconds Unix time at which the last run finished.',
+            '# TYPE conformer_last_run_timestamp_seconds gauge',
+            f'conformer_last_run_timestamp_seconds{{{label}}} {int(self.finished or time.time())}',
+        ]
+        path = Path(path)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        tmp.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+        os.replace(str(tmp), str(path))
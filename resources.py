@@ -0,0 +1,273 @@
+"""
+Isolamento delle risorse per Audio & Metadata Converter
+Priorità CPU e I/O e affinità applicate ai thread worker (e quindi ereditate dai processi ffmpeg che avviano),
+più un governatore che riduce il parallelismo quando il carico della macchina di messa in onda sale
+"""
+
+import os
+import sys
+import time
+import logging
+import platform
+import threading
+from typing import NamedTuple, Optional
+
+# Classi ioprio (linux/ioprio.h); realtime richiede privilegi e non ha senso per un lavoro di sfondo
+IO_CLASSES = {'best-effort': 2, 'idle': 3}
+IOPRIO_WHO_PROCESS = 1
+IOPRIO_CLASS_SHIFT = 13
+# Numero della syscall ioprio_set per architettura (nessun wrapper in libc né in os)
+IOPRIO_SET_SYSCALL = {'x86_64': 251, 'amd64': 251, 'i386': 289, 'i686': 289, 'aarch64': 30, 'arm64': 30,
+                      'armv7l': 314, 'ppc64le': 273, 's390x': 282}
+# Governatore: campionamento, e isteresi per risalire solo quando il carico è ben sotto la soglia
+GOVERNOR_INTERVAL = 5.0
+GOVERNOR_RECOVERY = 0.8
+
+logger = logging.getLogger(__name__)
+
+
+def parse_cpu_list(spec: str) -> frozenset:
+    """'0-3,6' -> {0, 1, 2, 3, 6}"""
+    cpus = set()
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        first, sep, last = part.partition('-')
+        if sep:
+            if int(last) < int(first):
+                raise ValueError(f"Intervallo di CPU non valido: {part}")
+            cpus.update(range(int(first), int(last) + 1))
+        else:
+            cpus.add(int(first))
+    if not cpus:
+        raise ValueError(f"Nessuna CPU in '{spec}'")
+    return frozenset(cpus)
+
+
+def parse_io_priority(spec: str) -> tuple:
+    """'idle' o 'best-effort[:0-7]' -> (classe, livello)"""
+    name, sep, level = spec.partition(':')
+    name = name.strip().lower()
+    if name not in IO_CLASSES:
+        raise ValueError(f"Classe ionice non valida: {name} (disponibili: {', '.join(IO_CLASSES)})")
+    level = int(level) if sep else 7
+    if not 0 <= level <= 7:
+        raise ValueError(f"Livello ionice fuori intervallo (0-7): {level}")
+    return name, level
+
+
+def parse_hours(spec: str) -> tuple:
+    """'06:00-22:00' -> (360, 1320) in minuti dalla mezzanotte; l'intervallo può scavalcare la mezzanotte"""
+    def minutes(value: str) -> int:
+        hours, _, mins = value.strip().partition(':')
+        total = int(hours) * 60 + int(mins or 0)
+        if not 0 <= total <= 24 * 60:
+            raise ValueError(f"Orario non valido: {value}")
+        return total
+    start, sep, end = spec.partition('-')
+    if not sep:
+        raise ValueError(f"Fascia oraria non valida: {spec} (formato HH:MM-HH:MM)")
+    return minutes(start), minutes(end)
+
+
+def in_hours(hours: tuple, now: Optional[time.struct_time] = None) -> bool:
+    now = now or time.localtime()
+    current = now.tm_hour * 60 + now.tm_min
+    start, end = hours
+    if start <= end:
+        return start <= current < end
+    return current >= start or current < end
+
+
+def _set_io_priority(io_class: str, level: int):
+    """ioprio_set sul thread chiamante via syscall (ctypes), come inotify in watch.py"""
+    import ctypes
+    import ctypes.util
+    number = IOPRIO_SET_SYSCALL.get(platform.machine().lower())
+    if number is None:
+        raise OSError(f"ioprio_set non supportata su {platform.machine()}")
+    libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+    value = (IO_CLASSES[io_class] << IOPRIO_CLASS_SHIFT) | level
+    if libc.syscall(number, IOPRIO_WHO_PROCESS, 0, value) < 0:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err))
+
+
+class ResourceLimits(NamedTuple):
+    """Limiti di un thread worker; su Linux nice, ionice e affinità sono per thread e passano ai figli"""
+    nice: Optional[int] = None
+    io_priority: Optional[tuple] = None     # (classe, livello)
+    cpus: Optional[frozenset] = None
+
+    def __bool__(self):
+        return any(value is not None for value in self)
+
+    def apply(self):
+        """Initializer dei ThreadPoolExecutor: ogni processo ffmpeg avviato dal thread eredita i limiti alla fork"""
+        # Su Linux PRIO_PROCESS con il tid agisce sul solo thread; altrove sull'intero processo
+        target = threading.get_native_id() if sys.platform.startswith('linux') else 0
+        if self.nice is not None:
+            try:
+                # Senza privilegi la priorità può solo scendere: non si alza mai un nice già più alto
+                current = os.getpriority(os.PRIO_PROCESS, target)
+                os.setpriority(os.PRIO_PROCESS, target, max(current, self.nice))
+            except (AttributeError, OSError) as e:
+                logger.warning(f"Impossibile impostare nice {self.nice}: {e}")
+        if self.io_priority is not None:
+            try:
+                _set_io_priority(*self.io_priority)
+            except (AttributeError, OSError) as e:
+                logger.warning(f"Impossibile impostare ionice {self.io_priority[0]}: {e}")
+        if self.cpus is not None:
+            try:
+                os.sched_setaffinity(0, self.cpus)
+            except (AttributeError, OSError) as e:
+                logger.warning(f"Impossibile limitare i worker alle CPU {sorted(self.cpus)}: {e}")
+
+
+def read_load() -> Optional[float]:
+    """Load average a un minuto per core"""
+    try:
+        return os.getloadavg()[0] / (os.cpu_count() or 1)
+    except (AttributeError, OSError):
+        return None
+
+
+class IowaitSampler:
+    """Percentuale di tempo CPU in attesa di I/O tra due letture di /proc/stat"""
+
+    def __init__(self, path: str = '/proc/stat'):
+        self.path = path
+        self._last = self._read()
+
+    def _read(self) -> Optional[tuple]:
+        try:
+            with open(self.path) as f:
+                fields = [int(value) for value in f.readline().split()[1:]]
+        except (OSError, ValueError):
+            return None
+        if len(fields) < 5:
+            return None
+        return sum(fields), fields[4]
+
+    def sample(self) -> Optional[float]:
+        current = self._read()
+        last, self._last = self._last, current
+        if current is None or last is None or current[0] <= last[0]:
+            return None
+        return 100.0 * (current[1] - last[1]) / (current[0] - last[0])
+
+
+class Governor:
+    """Parallelismo adattivo: meno file in lavorazione quando load o iowait superano la soglia
+
+    I worker (anche di più librerie in modalità batch) occupano uno slot per file in lavorazione;
+    il limite scende di uno a ogni campione oltre soglia e risale di uno quando il carico torna
+    ben sotto. Nelle ore di diretta il limite non supera live_jobs.
+    """
+
+    def __init__(self, max_jobs: int, min_jobs: int = 1, max_load: Optional[float] = None,
+                 max_iowait: Optional[float] = None, live_hours: Optional[tuple] = None,
+                 live_jobs: Optional[int] = None, interval: float = GOVERNOR_INTERVAL,
+                 load_sampler=read_load, iowait_sampler=None):
+        self.max_jobs = max(1, max_jobs)
+        self.min_jobs = max(1, min(min_jobs, self.max_jobs))
+        self.max_load = max_load
+        self.max_iowait = max_iowait
+        self.live_hours = live_hours
+        self.live_jobs = live_jobs
+        self.interval = interval
+        self._load_sampler = load_sampler
+        if iowait_sampler is None and max_iowait is not None:
+            iowait_sampler = IowaitSampler().sample
+        self._iowait_sampler = iowait_sampler
+        self._lock = threading.Lock()
+        self._limit = self.max_jobs
+        self._active = 0
+        self._last_sample = None
+
+    @property
+    def limit(self) -> int:
+        return self._limit
+
+    def _ceiling(self, now_local: Optional[time.struct_time] = None) -> int:
+        if self.live_hours is not None and self.live_jobs is not None and in_hours(self.live_hours, now_local):
+            return max(1, min(self.live_jobs, self.max_jobs))
+        return self.max_jobs
+
+    def update(self, now: Optional[float] = None, now_local: Optional[time.struct_time] = None) -> int:
+        """Ricalcola il limite se è passato un intervallo di campionamento; restituisce il limite corrente"""
+        now = now if now is not None else time.monotonic()
+        with self._lock:
+            if self._last_sample is not None and now - self._last_sample < self.interval:
+                return self._limit
+            self._last_sample = now
+            load = self._load_sampler() if self.max_load is not None else None
+            iowait = self._iowait_sampler() if self._iowait_sampler is not None else None
+            over = ((load is not None and load > self.max_load)
+                    or (iowait is not None and iowait > self.max_iowait))
+            calm = ((load is None or load <= self.max_load * GOVERNOR_RECOVERY)
+                    and (iowait is None or iowait <= self.max_iowait * GOVERNOR_RECOVERY))
+            limit = self._limit
+            if over:
+                limit -= 1
+            elif calm:
+                limit += 1
+            limit = max(self.min_jobs, min(limit, self._ceiling(now_local)))
+            if limit != self._limit:
+                details = []
+                if load is not None:
+                    details.append(f"load/core {load:.2f}")
+                if iowait is not None:
+                    details.append(f"iowait {iowait:.0f}%")
+                logger.info(f"Governatore: parallelismo {self._limit} -> {limit}"
+                            + (f" ({', '.join(details)})" if details else ''))
+                self._limit = limit
+            return self._limit
+
+    def try_acquire(self) -> bool:
+        """Occupa uno slot se i file in lavorazione sono sotto il limite"""
+        with self._lock:
+            if self._active >= self._limit:
+                return False
+            self._active += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self._active = max(0, self._active - 1)
+
+
+def limits_from(nice: Optional[int] = None, ionice: Optional[str] = None, cpus=None) -> ResourceLimits:
+    """ResourceLimits da opzioni testuali (CLI o file di job); valori non validi sollevano ValueError"""
+    if nice is not None and not 0 <= int(nice) <= 19:
+        raise ValueError(f"nice fuori intervallo (0-19): {nice}")
+    if isinstance(cpus, str):
+        cpus = parse_cpu_list(cpus)
+    elif cpus is not None:
+        cpus = frozenset(int(cpu) for cpu in cpus)
+    if cpus is not None and hasattr(os, 'sched_getaffinity'):
+        available = os.sched_getaffinity(0)
+        if not cpus <= available:
+            raise ValueError(f"CPU non disponibili: {sorted(cpus - available)}")
+    return ResourceLimits(
+        nice=int(nice) if nice is not None else None,
+        io_priority=parse_io_priority(ionice) if isinstance(ionice, str) else ionice,
+        cpus=cpus,
+    )
+
+
+def governor_from(jobs: int, max_load: Optional[float] = None, max_iowait: Optional[float] = None,
+                  live_hours=None, live_jobs: Optional[int] = None) -> Optional[Governor]:
+    """Governatore per le opzioni indicate, None se nessuna soglia né fascia oraria è impostata"""
+    if max_load is None and max_iowait is None and live_hours is None:
+        return None
+    if isinstance(live_hours, str):
+        live_hours = parse_hours(live_hours)
+    if live_hours is not None and live_jobs is None:
+        # Senza un limite esplicito, in diretta metà dei worker
+        live_jobs = max(1, jobs // 2)
+    return Governor(jobs, max_load=float(max_load) if max_load is not None else None,
+                    max_iowait=float(max_iowait) if max_iowait is not None else None,
+                    live_hours=live_hours, live_jobs=live_jobs)
@@ -0,0 +1,199 @@
+"""
+Pianificazione della coda di lavoro per Audio & Metadata Converter
+Stima del costo di ogni file, priorità per cartella e ordine LPT (prima i lavori più lunghi)
+"""
+
+import heapq
+import fnmatch
+import threading
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+# Byte per secondo di audio tipici per formato, per stimare la durata senza ffprobe
+BYTES_PER_AUDIO_SECOND = {
+    '.wav': 176400,   # PCM 16 bit 44.1 kHz stereo
+    '.flac': 110000,
+    '.mp3': 24000,    # 192 kbps
+    '.m4a': 32000,
+    '.aac': 32000,
+    '.ogg': 20000,
+}
+DEFAULT_BYTES_PER_AUDIO_SECOND = 32000
+# Costo relativo di decodifica + codifica per secondo di audio (la codifica LAME domina)
+CODEC_COST = {
+    'pcm_s16le': 1.0,
+    'pcm_s24le': 1.05,
+    'flac': 1.15,
+    'mp3': 1.1,
+    'aac': 1.25,
+    'alac': 1.2,
+    'vorbis': 1.25,
+    'opus': 1.3,
+}
+EXTENSION_CODEC = {'.wav': 'pcm_s16le', '.flac': 'flac', '.mp3': 'mp3', '.m4a': 'aac', '.aac': 'aac',
+                   '.ogg': 'vorbis'}
+# Una copia costa quanto pochi millisecondi di codifica per secondo di audio
+COPY_COST = 0.01
+# File in attesa nel heap: oltre questo limite la scansione si ferma finché i worker non ne consumano.
+# Compromesso tra memoria e ordine: l'LPT ordina solo i file nella finestra, quindi un brano lunghissimo
+# scoperto tardi parte più tardi; qualche migliaio di file per pochi worker mantiene la memoria piatta
+# anche su librerie da centinaia di migliaia di file. Un pool più grande consuma più in fretta e ne
+# tiene di più (WINDOW_PER_JOB per worker)
+DEFAULT_WINDOW = 2000
+WINDOW_PER_JOB = 256
+DEFAULT_RULE_PRIORITY = 10
+
+
+class WorkEstimate(NamedTuple):
+    """Costo stimato di un file e sua dimensione in byte (per l'ETA pesata sui byte)"""
+    cost: float
+    size: int
+
+
+def estimate_duration(size: int, extension: str, duration: Optional[float] = None) -> float:
+    """Durata nota da ffprobe, altrimenti stimata dalla dimensione e dal formato"""
+    if duration is None or duration <= 0:
+        return size / BYTES_PER_AUDIO_SECOND.get(extension, DEFAULT_BYTES_PER_AUDIO_SECOND)
+    return duration
+
+
+def estimate_cost(size: int, extension: str, duration: Optional[float] = None,
+                  codec: Optional[str] = None, copy: bool = False) -> float:
+    """Costo stimato in "secondi di audio equivalenti": durata (nota o stimata dalla dimensione) × costo del codec"""
+    duration = estimate_duration(size, extension, duration)
+    if copy:
+        return duration * COPY_COST
+    codec = codec or EXTENSION_CODEC.get(extension)
+    return duration * CODEC_COST.get(codec, 1.2)
+
+
+def parse_priority_rule(spec: str) -> tuple:
+    """'new_releases/' o 'new_releases/*=50': pattern relativo alla cartella di input e priorità (default 10)"""
+    pattern, sep, value = spec.rpartition('=')
+    if not sep:
+        pattern, value = spec, str(DEFAULT_RULE_PRIORITY)
+    pattern = pattern.strip().replace('\\', '/')
+    if not pattern:
+        raise ValueError(f"Regola di priorità senza pattern: {spec}")
+    return pattern, int(value)
+
+
+class PriorityRules:
+    """Priorità per percorso relativo: un pattern che termina con '/' è una cartella, altrimenti un glob"""
+
+    def __init__(self, rules=()):
+        self.rules = [parse_priority_rule(rule) if isinstance(rule, str) else tuple(rule) for rule in rules]
+
+    def __bool__(self):
+        return bool(self.rules)
+
+    def priority(self, rel_path: str) -> int:
+        best = 0
+        for pattern, value in self.rules:
+            if pattern.endswith('/'):
+                matched = rel_path.startswith(pattern) or ('/' + pattern) in ('/' + rel_path)
+            else:
+                matched = fnmatch.fnmatch(rel_path, pattern)
+            if matched:
+                best = max(best, value)
+        return best
+
+
+def window_for(jobs: int) -> int:
+    """Finestra del heap per un pool di jobs worker"""
+    return max(DEFAULT_WINDOW, jobs * WINDOW_PER_JOB)
+
+
+class Scheduler:
+    """Coda tra scansione ed esecuzione: la scansione riempie un heap in background, i worker
+    ricevono sempre il file a priorità più alta e, a parità, quello più costoso (LPT)
+
+    Tiene anche il conto del lavoro stimato (e dei byte) scoperto e completato per avanzamento ed ETA.
+    La funzione estimate restituisce un WorkEstimate per ogni file.
+    """
+
+    def __init__(self, files, estimate, priority=None, window: int = DEFAULT_WINDOW):
+        self._files = files
+        self._estimate = estimate
+        self._priority = priority
+        self.window = window
+        self._heap = []
+        self._sequence = 0
+        self._issued = {}
+        self._cond = threading.Condition()
+        self._scan_done = False
+        self._stopped = False
+        self._error = None
+        self.discovered = 0
+        self.completed = 0
+        self.work_total = 0.0
+        self.work_done = 0.0
+        self.bytes_total = 0
+        self.bytes_done = 0
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._fill, daemon=True)
+        self._thread.start()
+        return self
+
+    def _fill(self):
+        try:
+            for file_path in self._files:
+                estimate = self._estimate(file_path)
+                priority = self._priority(file_path) if self._priority else 0
+                with self._cond:
+                    while len(self._heap) >= self.window and not self._stopped:
+                        self._cond.wait()
+                    if self._stopped:
+                        return
+                    self._sequence += 1
+                    # Il numero di sequenza mantiene l'ordine di scansione a parità di priorità e costo
+                    heapq.heappush(self._heap, (-priority, -estimate.cost, self._sequence, file_path, estimate))
+                    self.discovered += 1
+                    self.work_total += estimate.cost
+                    self.bytes_total += estimate.size
+                    self._cond.notify_all()
+        except Exception as e:
+            self._error = e
+        finally:
+            with self._cond:
+                self._scan_done = True
+                self._cond.notify_all()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> Path:
+        with self._cond:
+            while not self._heap and not self._scan_done and not self._stopped:
+                self._cond.wait()
+            if self._stopped or not self._heap:
+                if self._error is not None:
+                    raise self._error
+                raise StopIteration
+            file_path, estimate = heapq.heappop(self._heap)[3:]
+            self._issued[file_path] = estimate
+            self._cond.notify_all()
+            return file_path
+
+    def complete(self, file_path: Path) -> WorkEstimate:
+        """Segnala la fine di un file: il suo costo stimato passa nel lavoro completato"""
+        with self._cond:
+            estimate = self._issued.pop(file_path, None)
+            if estimate is None:
+                return WorkEstimate(0.0, 0)
+            self.completed += 1
+            self.work_done += estimate.cost
+            self.bytes_done += estimate.size
+            return estimate
+
+    @property
+    def scan_done(self) -> bool:
+        return self._scan_done
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
@@ -0,0 +1,420 @@
+"""
+Archivi persistenti SQLite per Audio & Metadata Converter
+Cache e indici condivisi tra esecuzioni successive sulla stessa libreria
+"""
+
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+# Database di stato creato nella cartella di output
+STATE_DB_NAME = '.conformer.db'
+# Byte letti all'inizio e alla fine del file per l'impronta parziale
+PARTIAL_HASH_BYTES = 64 * 1024
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def default_db_path(output_dir) -> Path:
+    """Percorso predefinito del database di stato per una cartella di output"""
+    return Path(output_dir) / STATE_DB_NAME
+
+
+def partial_hash(path, size: int) -> str:
+    """Impronta veloce (dimensione, testa e coda del file): scarta i non duplicati senza leggere tutto"""
+    digest = hashlib.blake2b(str(size).encode(), digest_size=16)
+    with open(path, 'rb') as f:
+        digest.update(f.read(PARTIAL_HASH_BYTES))
+        if size > 2 * PARTIAL_HASH_BYTES:
+            f.seek(size - PARTIAL_HASH_BYTES)
+            digest.update(f.read(PARTIAL_HASH_BYTES))
+    return digest.hexdigest()
+
+
+def content_hash(path) -> str:
+    """Impronta dell'intero contenuto, per confermare un duplicato trovato con partial_hash"""
+    digest = hashlib.blake2b(digest_size=32)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class _Database:
+    """Connessione condivisa da tutti gli archivi aperti sullo stesso file"""
+
+    def __init__(self, db_path: Path, readonly: bool = False):
+        self.key = (str(db_path.resolve()), readonly)
+        self.lock = threading.RLock()
+        self.refs = 0
+        self.pending_writes = 0
+        if readonly:
+            # Sola lettura (dry-run): nessuna scrittura né creazione di file. Anche in mode=ro un database WAL
+            # crea -wal e -shm; senza un WAL già presente (nessuna esecuzione in corso) si apre immutable
+            wal = db_path.with_name(db_path.name + '-wal')
+            option = 'mode=ro' if wal.exists() else 'immutable=1'
+            self.conn = sqlite3.connect(f"{db_path.resolve().as_uri()}?{option}", uri=True, timeout=30,
+                                        check_same_thread=False)
+            return
+        self.conn = sqlite3.connect(str(db_path), timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+
+
+# Con connessioni separate una transazione a blocchi aperta da un archivio bloccherebbe gli altri
+_databases = {}
+_databases_lock = threading.Lock()
+
+
+def _acquire_database(db_path: Path, readonly: bool = False) -> _Database:
+    if not readonly:
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+    with _databases_lock:
+        key = (str(db_path.resolve()), readonly)
+        db = _databases.get(key)
+        if db is None:
+            db = _databases[key] = _Database(db_path, readonly)
+        db.refs += 1
+        return db
+
+
+def open_readonly(store_class, db_path, **kwargs):
+    """Archivio esistente in sola lettura, None se il database manca o non ha ancora la tabella"""
+    if not Path(db_path).exists():
+        return None
+    try:
+        return store_class(db_path, readonly=True, **kwargs)
+    except sqlite3.Error:
+        return None
+
+
+def _release_database(db: _Database):
+    with _databases_lock:
+        db.refs -= 1
+        if db.refs == 0:
+            del _databases[db.key]
+            with db.lock:
+                if not db.key[1]:
+                    db.conn.commit()
+                db.conn.close()
+
+
+class _SQLiteStore:
+    """Base comune: una tabella per archivio, accesso serializzato da un lock (i worker sono thread)"""
+
+    SCHEMA_VERSION = 1
+    TABLE = None
+    SCHEMA = None
+    # Le scritture vengono confermate a blocchi: un commit per file rallenterebbe le librerie grandi
+    COMMIT_EVERY = 200
+
+    def __init__(self, db_path, readonly: bool = False):
+        self.db_path = Path(db_path)
+        # In sola lettura le scritture sono ignorate: il dry-run usa i dati esistenti senza modificarli
+        self.readonly = readonly
+        self._db = _acquire_database(self.db_path, readonly)
+        self._conn = self._db.conn
+        self._lock = self._db.lock
+        self._closed = False
+        try:
+            if readonly:
+                self._check_schema()
+            else:
+                self._create_schema()
+        except Exception:
+            _release_database(self._db)
+            raise
+
+    def _check_schema(self):
+        """In sola lettura uno schema assente o di un'altra versione non si può ricreare"""
+        with self._lock:
+            row = self._conn.execute(f"SELECT version FROM _{self.TABLE}_version").fetchone()
+        if row is None or row[0] != self.SCHEMA_VERSION:
+            raise sqlite3.OperationalError(f"schema di {self.TABLE} non aggiornato")
+
+    def _create_schema(self):
+        version_table = f"_{self.TABLE}_version"
+        with self._lock:
+            self._conn.execute(f"CREATE TABLE IF NOT EXISTS {version_table} (version INTEGER)")
+            row = self._conn.execute(f"SELECT version FROM {version_table}").fetchone()
+            if row is None or row[0] != self.SCHEMA_VERSION:
+                # Schema cambiato: i dati sono rigenerabili, si riparte da zero
+                self._conn.execute(f"DROP TABLE IF EXISTS {self.TABLE}")
+                self._conn.execute(f"DELETE FROM {version_table}")
+                self._conn.execute(f"INSERT INTO {version_table} VALUES (?)", (self.SCHEMA_VERSION,))
+            self._conn.executescript(self.SCHEMA)
+            self._conn.commit()
+
+    def _write(self, sql: str, params=()):
+        if self.readonly:
+            return
+        with self._lock:
+            self._conn.execute(sql, params)
+            self._db.pending_writes += 1
+            if self._db.pending_writes >= self.COMMIT_EVERY:
+                self._conn.commit()
+                self._db.pending_writes = 0
+
+    def _read(self, sql: str, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def flush(self):
+        if self.readonly:
+            return
+        with self._lock:
+            self._conn.commit()
+            self._db.pending_writes = 0
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self.flush()
+        _release_database(self._db)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ProbeCache(_SQLiteStore):
+    """Cache dei risultati di ffprobe (primo stream audio), chiave (percorso relativo, dimensione, mtime_ns)"""
+
+    SCHEMA_VERSION = 2
+    TABLE = 'probe_cache'
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS probe_cache (
+            rel_path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            codec TEXT,
+            bit_rate INTEGER,
+            sample_rate INTEGER,
+            channels INTEGER,
+            duration REAL,
+            last_used REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS probe_cache_last_used ON probe_cache (last_used);
+    """
+    FIELDS = ('codec', 'bit_rate', 'sample_rate', 'channels', 'duration')
+    DEFAULT_MAX_ENTRIES = 500000
+
+    def __init__(self, db_path, max_entries: int = DEFAULT_MAX_ENTRIES, readonly: bool = False):
+        super().__init__(db_path, readonly)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        # Gli hit aggiornano last_used solo alla chiusura, per non scrivere a ogni lettura
+        self._touched = {}
+
+    def get(self, rel_path: str, size: int, mtime_ns: int) -> Optional[dict]:
+        rows = self._read(
+            "SELECT codec, bit_rate, sample_rate, channels, duration FROM probe_cache "
+            "WHERE rel_path = ? AND size = ? AND mtime_ns = ?",
+            (rel_path, size, mtime_ns))
+        if not rows:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+            self._touched[rel_path] = time.time()
+        return dict(zip(self.FIELDS, rows[0]))
+
+    def peek(self, rel_path: str, size: int, mtime_ns: int) -> Optional[dict]:
+        """Come get, ma senza contare hit/miss né aggiornare last_used (stime dello scheduler)"""
+        rows = self._read(
+            "SELECT codec, bit_rate, sample_rate, channels, duration FROM probe_cache "
+            "WHERE rel_path = ? AND size = ? AND mtime_ns = ?",
+            (rel_path, size, mtime_ns))
+        return dict(zip(self.FIELDS, rows[0])) if rows else None
+
+    def put(self, rel_path: str, size: int, mtime_ns: int, info: dict):
+        self._write(
+            "INSERT OR REPLACE INTO probe_cache "
+            "(rel_path, size, mtime_ns, codec, bit_rate, sample_rate, channels, duration, last_used) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (rel_path, size, mtime_ns) + tuple(info.get(field) for field in self.FIELDS) + (time.time(),))
+
+    def invalidate(self, rel_path: Optional[str] = None):
+        """Rimuove una voce, o l'intera cache se rel_path è None"""
+        if rel_path is None:
+            self._write("DELETE FROM probe_cache")
+        else:
+            self._write("DELETE FROM probe_cache WHERE rel_path = ?", (rel_path,))
+        self.flush()
+
+    def __len__(self):
+        return self._read("SELECT COUNT(*) FROM probe_cache")[0][0]
+
+    def prune(self):
+        """Applica il limite max_entries eliminando le voci usate meno di recente"""
+        if not self.max_entries:
+            return
+        excess = len(self) - self.max_entries
+        if excess > 0:
+            self._write(
+                "DELETE FROM probe_cache WHERE rel_path IN "
+                "(SELECT rel_path FROM probe_cache ORDER BY last_used LIMIT ?)",
+                (excess,))
+
+    def close(self):
+        if self._closed:
+            return
+        with self._lock:
+            touched = [] if self.readonly else list(self._touched.items())
+            self._touched.clear()
+            self._conn.executemany(
+                "UPDATE probe_cache SET last_used = ? WHERE rel_path = ?",
+                [(used, path) for path, used in touched])
+        self.prune()
+        super().close()
+
+
+class LoudnessCache(_SQLiteStore):
+    """Misure EBU R128 del primo passaggio loudnorm, chiave (percorso relativo, dimensione, mtime_ns)
+
+    Le misure dipendono solo dal contenuto: restano valide anche se il target di loudness cambia.
+    """
+
+    TABLE = 'loudness_cache'
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS loudness_cache (
+            rel_path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            integrated REAL,
+            true_peak REAL,
+            lra REAL,
+            threshold REAL,
+            updated REAL NOT NULL
+        );
+    """
+    FIELDS = ('integrated', 'true_peak', 'lra', 'threshold')
+
+    def __init__(self, db_path, readonly: bool = False):
+        super().__init__(db_path, readonly)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, rel_path: str, size: int, mtime_ns: int) -> Optional[dict]:
+        rows = self._read(
+            "SELECT integrated, true_peak, lra, threshold FROM loudness_cache "
+            "WHERE rel_path = ? AND size = ? AND mtime_ns = ?",
+            (rel_path, size, mtime_ns))
+        with self._lock:
+            if not rows:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return dict(zip(self.FIELDS, rows[0]))
+
+    def put(self, rel_path: str, size: int, mtime_ns: int, measures: dict):
+        self._write(
+            "INSERT OR REPLACE INTO loudness_cache "
+            "(rel_path, size, mtime_ns, integrated, true_peak, lra, threshold, updated) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (rel_path, size, mtime_ns) + tuple(measures.get(field) for field in self.FIELDS) + (time.time(),))
+
+    def __len__(self):
+        return self._read("SELECT COUNT(*) FROM loudness_cache")[0][0]
+
+
+class SyncManifest(_SQLiteStore):
+    """Manifest della sincronizzazione incrementale: impronta sorgente, impronta output e impostazioni per file"""
+
+    TABLE = 'sync_manifest'
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS sync_manifest (
+            rel_path TEXT PRIMARY KEY,
+            src_size INTEGER NOT NULL,
+            src_mtime_ns INTEGER NOT NULL,
+            out_rel_path TEXT NOT NULL,
+            out_size INTEGER NOT NULL,
+            out_mtime_ns INTEGER NOT NULL,
+            settings TEXT NOT NULL,
+            action TEXT NOT NULL,
+            updated REAL NOT NULL
+        );
+    """
+
+    def get(self, rel_path: str) -> Optional[dict]:
+        rows = self._read(
+            "SELECT src_size, src_mtime_ns, out_rel_path, out_size, out_mtime_ns, settings, action "
+            "FROM sync_manifest WHERE rel_path = ?", (rel_path,))
+        if not rows:
+            return None
+        keys = ('src_size', 'src_mtime_ns', 'out_rel_path', 'out_size', 'out_mtime_ns', 'settings', 'action')
+        return dict(zip(keys, rows[0]))
+
+    def record(self, rel_path: str, src_size: int, src_mtime_ns: int, out_rel_path: str,
+               out_size: int, out_mtime_ns: int, settings: str, action: str):
+        self._write(
+            "INSERT OR REPLACE INTO sync_manifest "
+            "(rel_path, src_size, src_mtime_ns, out_rel_path, out_size, out_mtime_ns, settings, action, updated) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (rel_path, src_size, src_mtime_ns, out_rel_path, out_size, out_mtime_ns,
+             settings, action, time.time()))
+
+    def remove(self, rel_path: str):
+        self._write("DELETE FROM sync_manifest WHERE rel_path = ?", (rel_path,))
+
+    def entries(self):
+        """Coppie (sorgente, output) registrate, entrambe relative"""
+        return self._read("SELECT rel_path, out_rel_path FROM sync_manifest")
+
+    def __len__(self):
+        return self._read("SELECT COUNT(*) FROM sync_manifest")[0][0]
+
+
+class ContentIndex(_SQLiteStore):
+    """Indice dei contenuti già convertiti: impronta della sorgente e output prodotto, per impostazioni"""
+
+    TABLE = 'content_index'
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS content_index (
+            settings TEXT NOT NULL,
+            full_hash TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            partial_hash TEXT NOT NULL,
+            out_rel_path TEXT NOT NULL,
+            out_size INTEGER NOT NULL,
+            out_mtime_ns INTEGER NOT NULL,
+            updated REAL NOT NULL,
+            PRIMARY KEY (settings, full_hash)
+        );
+        CREATE INDEX IF NOT EXISTS content_index_partial ON content_index (settings, size, partial_hash);
+    """
+
+    def has_candidates(self, settings: str, size: int, partial: str) -> bool:
+        """Vero se almeno un contenuto indicizzato ha la stessa impronta parziale"""
+        return bool(self._read(
+            "SELECT 1 FROM content_index WHERE settings = ? AND size = ? AND partial_hash = ? LIMIT 1",
+            (settings, size, partial)))
+
+    def lookup(self, settings: str, full_hash: str) -> Optional[dict]:
+        rows = self._read(
+            "SELECT out_rel_path, out_size, out_mtime_ns FROM content_index WHERE settings = ? AND full_hash = ?",
+            (settings, full_hash))
+        if not rows:
+            return None
+        return dict(zip(('out_rel_path', 'out_size', 'out_mtime_ns'), rows[0]))
+
+    def record(self, settings: str, full_hash: str, size: int, partial: str,
+               out_rel_path: str, out_size: int, out_mtime_ns: int):
+        self._write(
+            "INSERT OR REPLACE INTO content_index "
+            "(settings, full_hash, size, partial_hash, out_rel_path, out_size, out_mtime_ns, updated) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (settings, full_hash, size, partial, out_rel_path, out_size, out_mtime_ns, time.time()))
+
+    def remove(self, settings: str, full_hash: str):
+        self._write("DELETE FROM content_index WHERE settings = ? AND full_hash = ?", (settings, full_hash))
+
+    def __len__(self):
+        return self._read("SELECT COUNT(*) FROM content_index")[0][0]
@@ -0,0 +1,225 @@
+"""
+I/O in streaming per Audio & Metadata Converter
+Su condivisioni di rete (NFS/SMB) le piccole letture casuali e i seek di ffmpeg costano più della codifica:
+la sorgente viene letta da Python a blocchi grandi e sequenziali, eventualmente in anticipo per i prossimi
+file, e passata a ffmpeg su stdin; l'output torna da stdout e viene scritto a blocchi grandi
+"""
+
+import os
+import threading
+import concurrent.futures
+from collections import deque
+from pathlib import Path
+from typing import Optional
+
+IO_MODES = ('auto', 'path', 'stream')
+# Blocchi di lettura e buffer di scrittura: poche richieste grandi invece di molte da 32 KB
+CHUNK_SIZE = 1024 * 1024
+WRITE_BUFFER = 1024 * 1024
+# File letti in anticipo contemporaneamente e memoria massima dei blocchi in attesa
+DEFAULT_PREFETCH = 2
+DEFAULT_PREFETCH_MEMORY = 256 * 1024 * 1024
+# Blocchi pronti davanti a un file già in codifica: la lettura non corre oltre ffmpeg
+LIVE_AHEAD_CHUNKS = 4
+# Formati decodificabili da una pipe: MP4/M4A ha l'indice (moov) spesso in fondo al file e richiede il seek
+PIPE_INPUT_FORMATS = {'.mp3', '.flac', '.wav', '.aac', '.ogg'}
+# Filesystem per cui la modalità auto passa allo streaming
+NETWORK_FILESYSTEMS = {'nfs', 'nfs4', 'cifs', 'smb3', 'smbfs', '9p', 'afs', 'ceph', 'glusterfs',
+                       'fuse.glusterfs', 'fuse.sshfs', 'fuse.rclone'}
+
+
+def _unescape_mount(value: str) -> str:
+    # /proc/mounts codifica spazi, tab e a capo in ottale (\040)
+    return value.replace('\\040', ' ').replace('\\011', '\t').replace('\\012', '\n').replace('\\134', '\\')
+
+
+def filesystem_type(path, mounts_file: str = '/proc/mounts') -> Optional[str]:
+    """Tipo del filesystem che contiene path (punto di montaggio più lungo), None se non determinabile"""
+    try:
+        target = os.path.realpath(str(path))
+        with open(mounts_file) as f:
+            entries = [line.split() for line in f]
+    except OSError:
+        return None
+    best, best_type = '', None
+    for fields in entries:
+        if len(fields) < 3:
+            continue
+        mount_point = _unescape_mount(fields[1])
+        prefix = mount_point.rstrip('/') + '/'
+        if (target == mount_point or target.startswith(prefix)) and len(mount_point) >= len(best):
+            best, best_type = mount_point, fields[2]
+    return best_type
+
+
+def is_network_path(path, mounts_file: str = '/proc/mounts') -> bool:
+    return filesystem_type(path, mounts_file) in NETWORK_FILESYSTEMS
+
+
+def pipe_output_ok(profile) -> bool:
+    """Output scrivibile su stdout: il muxer MP3 aggiorna il tag Xing (frame, durata dei VBR) solo su file
+    con seek, MP4 scrive l'indice alla fine; Ogg/Opus non torna mai indietro"""
+    if profile.container == 'mp3':
+        return profile.bitrate is not None
+    return profile.container in ('opus', 'ogg')
+
+
+def read_chunks(path, chunk_size: int = CHUNK_SIZE):
+    """Blocchi sequenziali di un file, con lettura anticipata del kernel al massimo"""
+    with open(path, 'rb', buffering=0) as f:
+        if hasattr(os, 'posix_fadvise'):
+            try:
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            except OSError:
+                pass
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            yield chunk
+
+
+class _Entry:
+    """Stato di un file in lettura anticipata"""
+    __slots__ = ('chunks', 'buffered', 'started', 'skipped', 'done', 'error', 'taken', 'cancelled')
+
+    def __init__(self):
+        self.chunks = deque()
+        self.buffered = 0
+        self.started = False
+        self.skipped = False
+        self.done = False
+        self.error = None
+        self.taken = False
+        self.cancelled = False
+
+
+class PrefetchedSource:
+    """Blocchi di un file letto in anticipo, consumati dal thread che alimenta ffmpeg; close() libera la memoria"""
+
+    def __init__(self, prefetcher: 'Prefetcher', entry: _Entry):
+        self._prefetcher = prefetcher
+        self._entry = entry
+
+    def __iter__(self):
+        cond, entry = self._prefetcher._cond, self._entry
+        while True:
+            with cond:
+                while not entry.chunks and not entry.done and not entry.cancelled:
+                    cond.wait()
+                if entry.chunks:
+                    chunk = entry.chunks.popleft()
+                    entry.buffered -= len(chunk)
+                    self._prefetcher._used -= len(chunk)
+                    cond.notify_all()
+                elif entry.error is not None:
+                    raise entry.error
+                else:
+                    return
+            yield chunk
+
+    def close(self):
+        self._prefetcher._cancel(self._entry)
+
+
+class Prefetcher:
+    """Legge in anticipo i file in coda mentre i worker codificano quelli correnti
+
+    Al più depth file alla volta, con un budget di memoria condiviso; un file il cui worker è già partito
+    viene letto solo pochi blocchi avanti. wanted(path) esclude i file che non verranno codificati.
+    """
+
+    def __init__(self, depth: int = DEFAULT_PREFETCH, memory: int = DEFAULT_PREFETCH_MEMORY,
+                 chunk_size: int = CHUNK_SIZE, wanted=None, initializer=None):
+        self.memory = memory
+        self.chunk_size = chunk_size
+        self._wanted = wanted
+        self._cond = threading.Condition()
+        self._entries = {}
+        self._used = 0
+        self._closed = False
+        # initializer: gli stessi limiti di risorse dei worker (ionice idle vale anche per le letture anticipate)
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(1, depth), thread_name_prefix='prefetch', initializer=initializer)
+
+    @property
+    def buffered_bytes(self) -> int:
+        return self._used
+
+    def request(self, path: Path):
+        with self._cond:
+            if self._closed or path in self._entries:
+                return
+            entry = self._entries[path] = _Entry()
+        self._executor.submit(self._fetch, path, entry)
+
+    def _fetch(self, path: Path, entry: _Entry):
+        with self._cond:
+            if entry.cancelled or entry.taken:
+                # Il worker è partito prima della lettura anticipata: legge direttamente
+                entry.done = True
+                return
+            entry.started = True
+        try:
+            wanted = self._wanted is None or self._wanted(path)
+            with self._cond:
+                # Un file già preso da un worker si legge comunque: il worker attende i blocchi
+                if not wanted and not entry.taken:
+                    entry.skipped = True
+                    return
+            for chunk in read_chunks(path, self.chunk_size):
+                with self._cond:
+                    while not (entry.cancelled or self._closed) and self._must_wait(entry, len(chunk)):
+                        self._cond.wait()
+                    if entry.cancelled or self._closed:
+                        return
+                    entry.chunks.append(chunk)
+                    entry.buffered += len(chunk)
+                    self._used += len(chunk)
+                    self._cond.notify_all()
+        except Exception as e:
+            entry.error = e
+        finally:
+            with self._cond:
+                entry.done = True
+                self._cond.notify_all()
+
+    def _must_wait(self, entry: _Entry, size: int) -> bool:
+        if entry.taken:
+            return entry.buffered >= LIVE_AHEAD_CHUNKS * self.chunk_size
+        # Un blocco alla volta passa sempre: un budget più piccolo di un blocco non blocca la lettura
+        return self._used > 0 and self._used + size > self.memory
+
+    def take(self, path: Path) -> Optional[PrefetchedSource]:
+        """Sorgente letta in anticipo per path; None se la lettura non è mai partita (il chiamante legge da sé)"""
+        with self._cond:
+            entry = self._entries.pop(path, None)
+            if entry is None:
+                return None
+            entry.taken = True
+            self._cond.notify_all()
+            if not entry.started or entry.skipped:
+                entry.cancelled = True
+                return None
+        return PrefetchedSource(self, entry)
+
+    def _cancel(self, entry: _Entry):
+        with self._cond:
+            entry.cancelled = True
+            self._used -= entry.buffered
+            entry.buffered = 0
+            entry.chunks.clear()
+            self._cond.notify_all()
+
+    def discard(self, path: Path):
+        """File non codificato (saltato, copiato, errore): la sua lettura anticipata non serve più"""
+        with self._cond:
+            entry = self._entries.pop(path, None)
+        if entry is not None:
+            self._cancel(entry)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            entries = list(self._entries.values())
+            self._entries.clear()
+        for entry in entries:
+            self._cancel(entry)
+        self._executor.shutdown(wait=True)
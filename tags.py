@@ -0,0 +1,324 @@
+"""
+Metadati e copertine per Audio & Metadata Converter
+I tag della sorgente (Vorbis/FLAC, MP4, ID3) vengono letti con mutagen in un formato neutro e scritti
+nel file temporaneo di ogni output (ID3v2.4, MP4, Vorbis comment) prima del rename: nessun secondo
+passaggio sull'albero di output. La copertina è ridimensionata una volta per immagine distinta.
+"""
+
+import io
+import base64
+import hashlib
+import threading
+import importlib.util
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+# Lato massimo della copertina incorporata negli output e qualità JPEG della ricompressione
+ARTWORK_MAX_SIZE = 600
+ARTWORK_JPEG_QUALITY = 85
+# Memoria delle copertine già elaborate (una per album tipicamente)
+ARTWORK_CACHE_BYTES = 64 * 1024 * 1024
+# Padding del tag ID3: spazio per modifiche successive senza riscrivere il file
+ID3_PADDING = 1024
+
+# Chiavi neutre (nomi Vorbis comment in minuscolo) -> frame ID3v2.4 di testo
+ID3_TEXT_FRAMES = {
+    'title': 'TIT2', 'artist': 'TPE1', 'album': 'TALB', 'albumartist': 'TPE2', 'date': 'TDRC',
+    'originaldate': 'TDOR', 'genre': 'TCON', 'composer': 'TCOM', 'tracknumber': 'TRCK', 'discnumber': 'TPOS',
+    'isrc': 'TSRC', 'label': 'TPUB', 'copyright': 'TCOP', 'bpm': 'TBPM', 'grouping': 'TIT1',
+    'conductor': 'TPE3', 'remixer': 'TPE4', 'lyricist': 'TEXT', 'encodedby': 'TENC', 'compilation': 'TCMP',
+    'albumsort': 'TSOA', 'artistsort': 'TSOP', 'titlesort': 'TSOT', 'albumartistsort': 'TSO2',
+    'mood': 'TMOO', 'media': 'TMED', 'language': 'TLAN', 'key': 'TKEY',
+}
+# Chiavi neutre -> atomi MP4
+MP4_ATOMS = {
+    'title': '\xa9nam', 'artist': '\xa9ART', 'album': '\xa9alb', 'albumartist': 'aART', 'date': '\xa9day',
+    'genre': '\xa9gen', 'composer': '\xa9wrt', 'comment': '\xa9cmt', 'lyrics': '\xa9lyr', 'copyright': 'cprt',
+    'grouping': '\xa9grp', 'encodedby': '\xa9too', 'albumsort': 'soal', 'artistsort': 'soar', 'titlesort': 'sonm',
+    'albumartistsort': 'soaa',
+}
+MP4_FREEFORM = '----:com.apple.iTunes:'
+# Descrizioni TXXX usate da MusicBrainz Picard per i campi Vorbis senza frame dedicato
+ID3_TXXX_NAMES = {
+    'musicbrainz_albumid': 'MusicBrainz Album Id', 'musicbrainz_artistid': 'MusicBrainz Artist Id',
+    'musicbrainz_albumartistid': 'MusicBrainz Album Artist Id',
+    'musicbrainz_releasegroupid': 'MusicBrainz Release Group Id',
+    'musicbrainz_releasetrackid': 'MusicBrainz Release Track Id', 'releasetype': 'MusicBrainz Album Type',
+    'releasestatus': 'MusicBrainz Album Status', 'releasecountry': 'MusicBrainz Album Release Country',
+    'barcode': 'BARCODE', 'catalognumber': 'CATALOGNUMBER',
+}
+# Nomi alternativi dei campi Vorbis comment
+VORBIS_ALIASES = {
+    'organization': 'label', 'publisher': 'label', 'description': 'comment', 'unsyncedlyrics': 'lyrics',
+    'year': 'date', 'album artist': 'albumartist', 'totaltracks': 'tracktotal', 'totaldiscs': 'disctotal',
+}
+# Campi mai copiati: dati tecnici della sorgente, non validi per l'output
+SKIPPED_KEYS = {'encoder', 'encoder_options', 'encoding', 'itunsmpb', 'itunnorm', 'metadata_block_picture',
+                'coverart', 'coverartmime', 'waveformatextensible_channel_mask'}
+PICTURE_FRONT_COVER = 3
+
+
+class Artwork(NamedTuple):
+    data: bytes
+    mime: str
+    description: str = ''
+
+
+class TagSet(NamedTuple):
+    """Tag in formato neutro: chiave Vorbis in minuscolo -> lista di valori, più la copertina frontale"""
+    fields: dict
+    artwork: Optional[Artwork] = None
+
+    def __bool__(self):
+        return bool(self.fields) or self.artwork is not None
+
+
+def available() -> bool:
+    return importlib.util.find_spec('mutagen') is not None
+
+
+def _join_total(fields: dict, key: str, total_key: str):
+    """tracknumber + tracktotal -> '3/12', la forma di TRCK/TPOS"""
+    totals = fields.pop(total_key, None)
+    values = fields.get(key)
+    if values and totals and '/' not in values[0]:
+        fields[key] = [f"{values[0]}/{totals[0]}"]
+
+
+def _image_mime(data: bytes) -> str:
+    return 'image/png' if data[:8] == b'\x89PNG\r\n\x1a\n' else 'image/jpeg'
+
+
+def _from_vorbis(comments, pictures=()) -> TagSet:
+    from mutagen.flac import Picture
+    fields = {}
+    artwork = None
+    for key, value in comments:
+        key = key.lower()
+        if key == 'metadata_block_picture':
+            try:
+                pictures = list(pictures) + [Picture(base64.b64decode(value))]
+            except (ValueError, TypeError):
+                pass
+            continue
+        key = VORBIS_ALIASES.get(key, key)
+        if key in SKIPPED_KEYS or not value:
+            continue
+        fields.setdefault(key, []).append(value)
+    _join_total(fields, 'tracknumber', 'tracktotal')
+    _join_total(fields, 'discnumber', 'disctotal')
+    if pictures:
+        cover = next((p for p in pictures if p.type == PICTURE_FRONT_COVER), pictures[0])
+        artwork = Artwork(cover.data, cover.mime or _image_mime(cover.data), cover.desc or '')
+    return TagSet(fields, artwork)
+
+
+def _from_mp4(tags) -> TagSet:
+    atoms = {atom: key for key, atom in MP4_ATOMS.items()}
+    fields = {}
+    artwork = None
+    for atom, values in tags.items():
+        if atom == 'covr':
+            if values:
+                artwork = Artwork(bytes(values[0]), _image_mime(bytes(values[0])))
+        elif atom in ('trkn', 'disk'):
+            number, total = values[0]
+            if number:
+                fields['tracknumber' if atom == 'trkn' else 'discnumber'] = [
+                    f"{number}/{total}" if total else str(number)]
+        elif atom == 'tmpo':
+            fields['bpm'] = [str(values[0])]
+        elif atom == 'cpil':
+            fields['compilation'] = ['1' if values else '0']
+        elif atom in atoms:
+            fields[atoms[atom]] = [str(value) for value in values]
+        elif atom.startswith(MP4_FREEFORM):
+            key = VORBIS_ALIASES.get(atom[len(MP4_FREEFORM):].lower(), atom[len(MP4_FREEFORM):].lower())
+            if key not in SKIPPED_KEYS:
+                fields[key] = [bytes(value).decode('utf-8', errors='replace') for value in values]
+    return TagSet(fields, artwork)
+
+
+def _from_id3(tags) -> TagSet:
+    frames = {frame: key for key, frame in ID3_TEXT_FRAMES.items()}
+    txxx_keys = {name: key for key, name in ID3_TXXX_NAMES.items()}
+    fields = {}
+    artwork = None
+    for frame in tags.values():
+        if frame.FrameID in frames:
+            fields[frames[frame.FrameID]] = [str(text) for text in frame.text]
+        elif frame.FrameID == 'TXXX':
+            key = txxx_keys.get(frame.desc, frame.desc.lower())
+            key = VORBIS_ALIASES.get(key, key)
+            if key not in SKIPPED_KEYS:
+                fields[key] = [str(text) for text in frame.text]
+        elif frame.FrameID == 'COMM' and not frame.desc:
+            fields['comment'] = [str(text) for text in frame.text]
+        elif frame.FrameID == 'USLT':
+            fields['lyrics'] = [frame.text]
+        elif frame.FrameID == 'APIC' and (artwork is None or frame.type == PICTURE_FRONT_COVER):
+            artwork = Artwork(frame.data, frame.mime or _image_mime(frame.data), frame.desc or '')
+    return TagSet(fields, artwork)
+
+
+def read_tags(path) -> TagSet:
+    """Tag e copertina di una sorgente qualsiasi; TagSet vuoto se il formato non ha tag leggibili"""
+    import mutagen
+    from mutagen.flac import FLAC
+    from mutagen.mp4 import MP4
+    from mutagen.id3 import ID3
+    audio = mutagen.File(str(path))
+    if isinstance(audio, FLAC):
+        # Le copertine FLAC sono blocchi PICTURE, presenti anche senza Vorbis comment
+        return _from_vorbis(audio.tags or [], audio.pictures)
+    if audio is None or audio.tags is None:
+        return TagSet({})
+    if isinstance(audio, MP4):
+        return _from_mp4(audio.tags)
+    if isinstance(audio.tags, ID3):
+        # MP3, WAV e AIFF con chunk ID3
+        return _from_id3(audio.tags)
+    # Ogg Vorbis/Opus: Vorbis comment con le copertine in METADATA_BLOCK_PICTURE
+    return _from_vorbis(audio.tags)
+
+
+def build_id3(tag_set: TagSet):
+    """Tag ID3v2.4: frame di testo, TXXX per i campi senza frame dedicato, APIC per la copertina"""
+    from mutagen.id3 import ID3, Frames, TXXX, COMM, USLT, APIC
+    tags = ID3()
+    for key, values in tag_set.fields.items():
+        if key in ID3_TEXT_FRAMES:
+            tags.add(Frames[ID3_TEXT_FRAMES[key]](encoding=3, text=values))
+        elif key == 'comment':
+            tags.add(COMM(encoding=3, lang='eng', desc='', text=values))
+        elif key == 'lyrics':
+            tags.add(USLT(encoding=3, lang='eng', desc='', text='\n'.join(values)))
+        else:
+            tags.add(TXXX(encoding=3, desc=ID3_TXXX_NAMES.get(key, key.upper()), text=values))
+    if tag_set.artwork is not None:
+        artwork = tag_set.artwork
+        tags.add(APIC(encoding=3, mime=artwork.mime, type=PICTURE_FRONT_COVER, desc=artwork.description,
+                      data=artwork.data))
+    return tags
+
+
+def id3_bytes(tag_set: TagSet) -> bytes:
+    """Tag ID3v2.4 serializzato, da scrivere davanti all'audio di un MP3 prodotto in streaming"""
+    buffer = io.BytesIO()
+    build_id3(tag_set).save(buffer, v2_version=4, padding=lambda info: ID3_PADDING)
+    return buffer.getvalue()
+
+
+def _write_mp4(path, tag_set: TagSet):
+    from mutagen.mp4 import MP4, MP4Cover, MP4FreeForm
+    audio = MP4(str(path))
+    if audio.tags is None:
+        audio.add_tags()
+    for key, values in tag_set.fields.items():
+        if key in MP4_ATOMS:
+            audio.tags[MP4_ATOMS[key]] = values
+        elif key in ('tracknumber', 'discnumber'):
+            number, _, total = values[0].partition('/')
+            try:
+                audio.tags['trkn' if key == 'tracknumber' else 'disk'] = [(int(number), int(total or 0))]
+            except ValueError:
+                pass
+        elif key == 'bpm':
+            try:
+                audio.tags['tmpo'] = [int(float(values[0]))]
+            except ValueError:
+                pass
+        elif key == 'compilation':
+            audio.tags['cpil'] = values[0] not in ('', '0')
+        else:
+            audio.tags[MP4_FREEFORM + key.upper()] = [MP4FreeForm(value.encode('utf-8')) for value in values]
+    if tag_set.artwork is not None:
+        image_format = MP4Cover.FORMAT_PNG if tag_set.artwork.mime == 'image/png' else MP4Cover.FORMAT_JPEG
+        audio.tags['covr'] = [MP4Cover(tag_set.artwork.data, imageformat=image_format)]
+    audio.save()
+
+
+def _write_vorbis(path, tag_set: TagSet):
+    from mutagen.oggopus import OggOpus
+    from mutagen.flac import Picture
+    audio = OggOpus(str(path))
+    for key, values in tag_set.fields.items():
+        audio.tags[key.upper()] = values
+    if tag_set.artwork is not None:
+        picture = Picture()
+        picture.type = PICTURE_FRONT_COVER
+        picture.mime = tag_set.artwork.mime
+        picture.desc = tag_set.artwork.description
+        picture.data = tag_set.artwork.data
+        audio.tags['METADATA_BLOCK_PICTURE'] = [base64.b64encode(picture.write()).decode('ascii')]
+    audio.save()
+
+
+def write_tags(path, container: str, tag_set: TagSet):
+    """Scrive i tag nel file di output (ancora temporaneo: il formato viene dal profilo, non dall'estensione)"""
+    if container == 'mp3':
+        build_id3(tag_set).save(str(path), v2_version=4, padding=lambda info: ID3_PADDING)
+    elif container in ('ipod', 'mp4'):
+        _write_mp4(path, tag_set)
+    elif container == 'opus':
+        _write_vorbis(path, tag_set)
+    else:
+        raise ValueError(f"Scrittura tag non supportata per il contenitore {container}")
+
+
+class ArtworkProcessor:
+    """Ridimensiona e ricomprime le copertine una volta per immagine distinta (impronta BLAKE2 dei byte)
+
+    Pillow è opzionale: senza, le copertine vengono incorporate invariate.
+    """
+
+    def __init__(self, max_size: int = ARTWORK_MAX_SIZE, quality: int = ARTWORK_JPEG_QUALITY,
+                 cache_bytes: int = ARTWORK_CACHE_BYTES):
+        self.max_size = max_size
+        self.quality = quality
+        self.cache_bytes = cache_bytes
+        self._cache = OrderedDict()
+        self._cached_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def process(self, artwork: Artwork) -> Optional[Artwork]:
+        """Copertina pronta per gli output; None se l'immagine non è leggibile"""
+        key = hashlib.blake2b(artwork.data, digest_size=16).digest()
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return cached._replace(description=artwork.description) if cached.data else None
+            self.misses += 1
+        result = self._resize(artwork)
+        with self._lock:
+            if key not in self._cache:
+                self._cache[key] = result
+                self._cached_bytes += len(result.data)
+                while self._cached_bytes > self.cache_bytes and len(self._cache) > 1:
+                    _, evicted = self._cache.popitem(last=False)
+                    self._cached_bytes -= len(evicted.data)
+        return result if result.data else None
+
+    def _resize(self, artwork: Artwork) -> Artwork:
+        if not self.max_size:
+            return artwork
+        try:
+            # Importato solo qui: il percorso CLI non carica Pillow finché non c'è una copertina
+            from PIL import Image
+        except ImportError:
+            return artwork
+        try:
+            with Image.open(io.BytesIO(artwork.data)) as image:
+                if max(image.size) <= self.max_size and image.format in ('JPEG', 'PNG'):
+                    return artwork
+                image.thumbnail((self.max_size, self.max_size), Image.LANCZOS)
+                buffer = io.BytesIO()
+                image.convert('RGB').save(buffer, 'JPEG', quality=self.quality, optimize=True)
+        except (OSError, ValueError, Image.DecompressionBombError):
+            # Immagine illeggibile (in cache come vuota): meglio nessuna copertina che un APIC corrotto
+            return artwork._replace(data=b'')
+        return Artwork(buffer.getvalue(), 'image/jpeg', artwork.description)
@@ -12,12 +12,28 @@ import sys
 import tempfile
 import shutil
 import unittest
+from unittest import mock
 from pathlib import Path
 import subprocess
+import threading
+import time
 
 # Import del modulo principale
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-from conformer import SimpleConformer, APP_NAME, APP_VERSION, VERSION_NAME
+from conformer import SimpleConformer, MediaInfo, LoudnessInfo, parse_loudness, format_duration, APP_NAME, APP_VERSION, VERSION_NAME, scan_audio_files
+from store import ProbeCache, SyncManifest, ContentIndex, LoudnessCache, partial_hash, content_hash
+from report import RunReport, percentile
+import watch
+from scheduler import Scheduler, PriorityRules, WorkEstimate, estimate_cost
+from progress import ProgressTracker
+from profiles import PROFILES, resolve_profiles
+import logsetup
+import preflight
+import mp3header
+import resources
+import streamio
+import tags
+import workqueue
 
 class TestAntiRegressione(unittest.TestCase):
     """Test suite principale per prevenire regressioni"""
@@ -168,6 +184,29 @@ class TestFileProcessing(TestAntiRegressione):
             self.assertEqual(expected_stem, actual_stem,
                            f"Filename should be preserved: {expected_stem} -> {actual_stem}")
 
+    def test_streaming_scanner_matches_rglob(self):
+        """Verifica che lo scanner in streaming trovi gli stessi file di rglob"""
+        import types
+        
+        scanner = scan_audio_files(self.input_dir, SimpleConformer.SUPPORTED_FORMATS)
+        self.assertIsInstance(scanner, types.GeneratorType)
+        expected = {f for f in self.input_dir.rglob("*")
+                    if f.is_file() and f.suffix.lower() in SimpleConformer.SUPPORTED_FORMATS}
+        self.assertEqual(set(scanner), expected)
+    
+    def test_streaming_scanner_unreadable_dir(self):
+        """Verifica che una cartella non leggibile venga segnalata senza interrompere la scansione"""
+        errors = []
+        missing = self.input_dir / "does_not_exist"
+        self.assertEqual(list(scan_audio_files(missing, {'.mp3'}, on_error=errors.append)), [])
+        self.assertEqual(len(errors), 1)
+    
+    def test_estimated_total(self):
+        """Verifica il conteggio in background usato dalla barra di avanzamento"""
+        conformer = SimpleConformer(str(self.input_dir), str(self.output_dir))
+        conformer._estimate_total()
+        self.assertEqual(conformer.estimated_total, 4)
+
 class TestErrorHandling(TestAntiRegressione):
     """Test per gestione errori robusta"""
     
@@ -259,6 +298,1783 @@ class TestPerformanceAndStability(TestAntiRegressione):
         
         print(f"✅ Memory test passed. Increase: {memory_increase / 1024 / 1024:.1f}MB")
 
+class TestParallelProcessing(TestAntiRegressione):
+    """Test per il pool di conversione parallelo (--jobs)"""
+    
+    def setUp(self):
+        self.out_dir = Path(tempfile.mkdtemp(prefix="conformer_jobs_"))
+    
+    def tearDown(self):
+        shutil.rmtree(str(self.out_dir), ignore_errors=True)
+    
+    def test_jobs_default_and_clamp(self):
+        """Verifica default sequenziale e valori non validi riportati a 1"""
+        self.assertEqual(SimpleConformer(str(self.input_dir), str(self.out_dir)).jobs, 1)
+        self.assertEqual(SimpleConformer(str(self.input_dir), str(self.out_dir), jobs=0).jobs, 1)
+        self.assertEqual(SimpleConformer(str(self.input_dir), str(self.out_dir), jobs=8).jobs, 8)
+    
+    def test_parallel_stats_and_progress(self):
+        """Verifica statistiche coerenti e progress in ordine di completamento con più worker"""
+        calls = []
+        conformer = SimpleConformer(str(self.input_dir), str(self.out_dir), jobs=4,
+                                    progress_callback=lambda c, tot, f: calls.append((c, tot, f)))
+        
+        def fake_convert(src, dst, info=None, loudness=None):
+            time.sleep(0.01)
+            return True
+        
+        with mock.patch.object(conformer, 'is_conforming_mp3', return_value=False), \
+             mock.patch.object(conformer, 'convert_to_mp3', side_effect=fake_convert):
+            conformer.run()
+        
+        self.assertEqual(conformer.stats['converted'], 4)
+        self.assertEqual(conformer.stats['processed'], 4)
+        self.assertEqual(conformer.stats['errors'], 0)
+        self.assertEqual([c for c, _, _ in calls], [1, 2, 3, 4])
+        self.assertTrue(all(tot >= c for c, tot, _ in calls))
+        self.assertEqual(calls[-1][1], 4)
+    
+    def test_stop_halts_submission(self):
+        """Verifica che stop() blocchi la sottomissione di nuovi file"""
+        conformer = SimpleConformer(str(self.input_dir), str(self.out_dir), jobs=2)
+        started = []
+        
+        def fake_convert(src, dst, info=None, loudness=None):
+            started.append(src)
+            conformer.stop()
+            return False
+        
+        with mock.patch.object(conformer, 'is_conforming_mp3', return_value=False), \
+             mock.patch.object(conformer, 'convert_to_mp3', side_effect=fake_convert):
+            conformer.run()
+        
+        self.assertLess(len(started), 4)
+        self.assertEqual(conformer.stats['errors'], 0)
+
+class TestProbeCache(TestAntiRegressione):
+    """Test per la cache persistente dei risultati ffprobe"""
+    
+    def setUp(self):
+        self.work_dir = Path(tempfile.mkdtemp(prefix="conformer_cache_"))
+        self.db_path = self.work_dir / "cache.db"
+    
+    def tearDown(self):
+        shutil.rmtree(str(self.work_dir), ignore_errors=True)
+    
+    def test_hit_miss_and_fingerprint(self):
+        """Verifica hit solo con dimensione e mtime invariati"""
+        info = {'codec': 'mp3', 'bit_rate': 192000, 'sample_rate': 44100, 'channels': 2, 'duration': 180.0}
+        with ProbeCache(self.db_path) as cache:
+            self.assertIsNone(cache.get("a.mp3", 10, 1))
+            cache.put("a.mp3", 10, 1, info)
+            self.assertEqual(cache.get("a.mp3", 10, 1), info)
+            self.assertIsNone(cache.get("a.mp3", 10, 2))
+            self.assertEqual((cache.hits, cache.misses), (1, 2))
+        
+        # Persistenza tra esecuzioni
+        with ProbeCache(self.db_path) as cache:
+            self.assertEqual(cache.get("a.mp3", 10, 1), info)
+    
+    def test_invalidate_and_size_cap(self):
+        """Verifica invalidazione e limite massimo di voci"""
+        info = {'codec': 'mp3', 'bit_rate': 192000, 'sample_rate': 44100, 'channels': 2, 'duration': 180.0}
+        with ProbeCache(self.db_path, max_entries=3) as cache:
+            for i in range(5):
+                cache.put(f"{i}.mp3", 1, 1, info)
+            cache.invalidate("0.mp3")
+            self.assertEqual(len(cache), 4)
+            cache.prune()
+            self.assertEqual(len(cache), 3)
+            cache.invalidate()
+            self.assertEqual(len(cache), 0)
+    
+    def test_conformer_skips_ffprobe_on_hit(self):
+        """Verifica che un file invariato non lanci ffprobe alla seconda esecuzione"""
+        mp3 = self.input_dir / "rock" / "song1.mp3"
+        probe_result = {'streams': [{'codec_type': 'audio', 'codec_name': 'mp3',
+                                     'bit_rate': '192000', 'sample_rate': '44100'}]}
+        with ProbeCache(self.db_path) as cache:
+            conformer = SimpleConformer(str(self.input_dir), str(self.work_dir), probe_cache=cache)
+            with mock.patch.object(conformer.runner, 'probe', return_value=probe_result) as probe:
+                self.assertTrue(conformer.is_conforming_mp3(mp3))
+                self.assertTrue(conformer.is_conforming_mp3(mp3))
+                self.assertEqual(probe.call_count, 1)
+            self.assertEqual(conformer.runner.ffprobe_path, conformer.FFPROBE_PATH)
+            self.assertEqual(conformer.stats['probe_cache_hits'], 1)
+            self.assertEqual(conformer.stats['probe_cache_misses'], 1)
+    
+    def test_ffprobe_path_next_to_ffmpeg(self):
+        """Verifica che ffprobe venga cercato accanto a ffmpeg"""
+        self.assertEqual(SimpleConformer._find_ffprobe('ffmpeg'), 'ffprobe')
+        self.assertEqual(Path(SimpleConformer._find_ffprobe(r'C:/ffmpeg/bin/ffmpeg.exe')).name, 'ffprobe.exe')
+
+class TestIncrementalSync(TestAntiRegressione):
+    """Test per la sincronizzazione incrementale basata su manifest"""
+    
+    def setUp(self):
+        self.work_dir = Path(tempfile.mkdtemp(prefix="conformer_sync_"))
+        self.src_dir = self.work_dir / "input"
+        self.out_dir = self.work_dir / "output"
+        shutil.copytree(str(self.input_dir), str(self.src_dir))
+    
+    def tearDown(self):
+        shutil.rmtree(str(self.work_dir), ignore_errors=True)
+    
+    def _run(self):
+        def fake_convert(src, dst, info=None, loudness=None):
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            dst.write_bytes(b"encoded " + src.read_bytes())
+            return True
+        
+        with SyncManifest(self.out_dir / "manifest.db") as manifest:
+            conformer = SimpleConformer(str(self.src_dir), str(self.out_dir), manifest=manifest)
+            with mock.patch.object(conformer, 'is_conforming_mp3', return_value=False), \
+                 mock.patch.object(conformer, 'convert_to_mp3', side_effect=fake_convert):
+                conformer.run()
+        return conformer.stats
+    
+    def test_unchanged_library_is_skipped(self):
+        """Verifica che una seconda esecuzione senza modifiche non rielabori nulla"""
+        self.assertEqual(self._run()['converted'], 4)
+        stats = self._run()
+        self.assertEqual(stats['converted'], 0)
+        self.assertEqual(stats['skipped'], 4)
+    
+    def test_changed_source_and_truncated_output(self):
+        """Verifica rielaborazione di sorgenti modificate e output troncati"""
+        self._run()
+        (self.src_dir / "rock" / "song2.flac").write_text("new master, longer content")
+        (self.out_dir / "pop" / "2024" / "hit.mp3").write_bytes(b"trunc")
+        stats = self._run()
+        self.assertEqual(stats['converted'], 2)
+        self.assertEqual(stats['skipped'], 2)
+    
+    def test_orphan_outputs_removed(self):
+        """Verifica la rimozione degli output la cui sorgente è stata cancellata"""
+        self._run()
+        shutil.rmtree(str(self.src_dir / "pop"))
+        stats = self._run()
+        self.assertEqual(stats['removed'], 2)
+        self.assertFalse((self.out_dir / "pop").exists())
+        self.assertTrue((self.out_dir / "rock" / "song1.mp3").exists())
+    
+    def test_scan_error_keeps_outputs(self):
+        """Verifica che una cartella illeggibile non faccia rimuovere come orfani i suoi output"""
+        self._run()
+        outputs = sorted(p.relative_to(self.out_dir).as_posix() for p in self.out_dir.rglob("*.mp3"))
+        real_scandir = os.scandir
+        
+        def failing_scandir(path):
+            if Path(path) == self.src_dir / "pop":
+                raise PermissionError(13, "Permission denied", str(path))
+            return real_scandir(path)
+        
+        with mock.patch('conformer.os.scandir', side_effect=failing_scandir):
+            stats = self._run()
+        self.assertEqual(stats['removed'], 0)
+        self.assertEqual(sorted(p.relative_to(self.out_dir).as_posix() for p in self.out_dir.rglob("*.mp3")),
+                         outputs)
+        self.assertTrue((self.out_dir / "pop" / "2024" / "hit.mp3").exists())
+
+class TestDeduplication(TestAntiRegressione):
+    """Test per la deduplicazione dei contenuti identici tramite indice persistente"""
+    
+    def setUp(self):
+        # I file di test hanno tutti lo stesso contenuto: quattro copie della stessa sorgente
+        self.work_dir = Path(tempfile.mkdtemp(prefix="conformer_dedup_"))
+        self.src_dir = self.work_dir / "input"
+        self.out_dir = self.work_dir / "output"
+        shutil.copytree(str(self.input_dir), str(self.src_dir))
+        self.encoded = []
+    
+    def tearDown(self):
+        shutil.rmtree(str(self.work_dir), ignore_errors=True)
+    
+    def _run(self, jobs=1, delay=0.0):
+        def fake_convert(src, dst, info=None, loudness=None):
+            time.sleep(delay)
+            self.encoded.append(src.name)
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            dst.write_bytes(b"encoded " + src.read_bytes())
+            return True
+        
+        with ContentIndex(self.out_dir / "state.db") as index:
+            conformer = SimpleConformer(str(self.src_dir), str(self.out_dir), jobs=jobs, content_index=index)
+            with mock.patch.object(conformer, 'is_conforming_mp3', return_value=False), \
+                 mock.patch.object(conformer, 'convert_to_mp3', side_effect=fake_convert):
+                conformer.run()
+        return conformer.stats
+    
+    def test_hashes(self):
+        """Verifica che l'impronta parziale sia solo un filtro e quella completa distingua i contenuti"""
+        head, tail = os.urandom(200 * 1024), os.urandom(200 * 1024)
+        a, b = self.work_dir / "a.wav", self.work_dir / "b.wav"
+        a.write_bytes(head + b"A" * 1000 + tail)
+        b.write_bytes(head + b"B" * 1000 + tail)
+        size = a.stat().st_size
+        self.assertEqual(partial_hash(a, size), partial_hash(b, size))
+        self.assertNotEqual(content_hash(a), content_hash(b))
+    
+    def test_duplicates_reuse_output(self):
+        """Verifica che le copie di una stessa sorgente vengano codificate una sola volta"""
+        stats = self._run()
+        self.assertEqual(stats['converted'], 1)
+        self.assertEqual(stats['deduplicated'], 3)
+        self.assertEqual(stats['processed'], 4)
+        outputs = [self.out_dir / "rock" / "song1.mp3", self.out_dir / "rock" / "song2.mp3",
+                   self.out_dir / "pop" / "2024" / "hit.mp3", self.out_dir / "pop" / "2024" / "single.mp3"]
+        self.assertEqual({p.read_bytes() for p in outputs}, {b"encoded test content"})
+    
+    def test_parallel_duplicates_wait_for_encode(self):
+        """Verifica che i worker paralleli attendano l'encode in corso dello stesso contenuto"""
+        stats = self._run(jobs=4, delay=0.2)
+        self.assertEqual(len(self.encoded), 1)
+        self.assertEqual(stats['deduplicated'], 3)
+    
+    def test_index_persists_and_rejects_modified_outputs(self):
+        """Verifica il riuso tra esecuzioni e lo scarto di output modificati dopo l'indicizzazione"""
+        self._run()
+        original = next(self.out_dir.rglob(Path(self.encoded[0]).stem + ".mp3"))
+        for output in self.out_dir.rglob("*.mp3"):
+            if output != original:
+                output.unlink()
+        self.encoded.clear()
+        stats = self._run()
+        self.assertEqual((stats['converted'], stats['deduplicated']), (0, 3))
+        
+        for output in self.out_dir.rglob("*.mp3"):
+            output.unlink()
+        self.encoded.clear()
+        stats = self._run()
+        self.assertEqual((stats['converted'], stats['deduplicated']), (1, 3))
+
+class TestWatchMode(TestAntiRegressione):
+    """Test per la modalità watch: watcher, attesa di stabilità e servizio con pool persistente"""
+    
+    def setUp(self):
+        self.work_dir = Path(tempfile.mkdtemp(prefix="conformer_watch_"))
+        self.src_dir = self.work_dir / "input"
+        self.out_dir = self.work_dir / "output"
+        (self.src_dir / "rock").mkdir(parents=True)
+    
+    def tearDown(self):
+        shutil.rmtree(str(self.work_dir), ignore_errors=True)
+    
+    def _accept(self, path):
+        name = os.path.basename(path)
+        return not name.startswith('.') and name.endswith('.flac')
+    
+    def test_debouncer_waits_for_stable_file(self):
+        """Verifica che un file venga rilasciato solo dopo settle secondi senza modifiche"""
+        track = self.src_dir / "rock" / "new.flac"
+        track.write_bytes(b"partial")
+        debouncer = watch.Debouncer(settle=2.0)
+        debouncer.touch(str(track), now=100.0)
+        self.assertEqual(debouncer.ready(now=100.0), [])
+        self.assertEqual(debouncer.ready(now=101.0), [])
+        track.write_bytes(b"partial plus more data")
+        self.assertEqual(debouncer.ready(now=102.5), [])
+        self.assertEqual(debouncer.ready(now=104.5), [str(track)])
+        self.assertEqual(len(debouncer), 0)
+    
+    def test_polling_watcher_reads_only_changed_dirs(self):
+        """Verifica che il polling rilevi file e cartelle nuove ignorando nascosti e altri formati"""
+        (self.src_dir / "rock" / "old.flac").write_bytes(b"x")
+        watcher = watch.PollingWatcher(self.src_dir, self._accept, interval=0)
+        self.assertEqual(watcher.poll(0), [])
+        time.sleep(0.01)
+        (self.src_dir / "rock" / "new.flac").write_bytes(b"x")
+        (self.src_dir / "rock" / ".new.flac.conformer-tmp").write_bytes(b"x")
+        (self.src_dir / "jazz").mkdir()
+        (self.src_dir / "jazz" / "take.flac").write_bytes(b"x")
+        (self.src_dir / "jazz" / "notes.txt").write_text("x")
+        changed = {Path(p).relative_to(self.src_dir).as_posix() for p in watcher.poll(0)}
+        self.assertEqual(changed, {"rock/old.flac", "rock/new.flac", "jazz/take.flac"})
+    
+    @unittest.skipUnless(watch.InotifyWatcher.available(), "inotify disponibile solo su Linux")
+    def test_inotify_watcher_follows_new_directories(self):
+        """Verifica gli eventi inotify su file nuovi e su cartelle create dopo l'avvio"""
+        watcher = watch.InotifyWatcher(self.src_dir, self._accept)
+        try:
+            (self.src_dir / "rock" / "new.flac").write_bytes(b"x")
+            (self.src_dir / "jazz").mkdir()
+            changed = set()
+            deadline = time.time() + 5
+            while time.time() < deadline and len(changed) < 1:
+                changed.update(watcher.poll(0.2))
+            (self.src_dir / "jazz" / "take.flac").write_bytes(b"x")
+            while time.time() < deadline and len(changed) < 2:
+                changed.update(watcher.poll(0.2))
+            self.assertEqual({Path(p).relative_to(self.src_dir).as_posix() for p in changed},
+                             {"rock/new.flac", "jazz/take.flac"})
+        finally:
+            watcher.close()
+    
+    def test_service_conforms_new_drops(self):
+        """Verifica che il servizio converta i file nuovi senza una nuova scansione completa"""
+        def fake_convert(src, dst, info=None, loudness=None):
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            dst.write_bytes(b"encoded")
+            return True
+        
+        conformer = SimpleConformer(str(self.src_dir), str(self.out_dir), jobs=2)
+        service = watch.WatchService(conformer, settle=0.1, poll_interval=0.1)
+        with mock.patch.object(conformer, 'is_conforming_mp3', return_value=False), \
+             mock.patch.object(conformer, 'convert_to_mp3', side_effect=fake_convert), \
+             mock.patch.object(conformer, 'iter_audio_files', side_effect=AssertionError("rescan")):
+            thread = threading.Thread(target=service.run, kwargs={'initial_sync': False})
+            thread.start()
+            try:
+                time.sleep(0.3)
+                (self.src_dir / "rock" / "drop.flac").write_bytes(b"new track")
+                deadline = time.time() + 10
+                while time.time() < deadline and conformer.stats['converted'] < 1:
+                    time.sleep(0.05)
+            finally:
+                service.stop()
+                thread.join(timeout=10)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(conformer.stats['converted'], 1)
+        self.assertTrue((self.out_dir / "rock" / "drop.mp3").exists())
+    
+    def _run_service(self, conformer, service, until, action=None):
+        def fake_convert(src, dst, info=None, loudness=None):
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            dst.write_bytes(b"encoded")
+            return True
+        
+        with mock.patch.object(conformer, 'is_conforming_mp3', return_value=False), \
+             mock.patch.object(conformer, 'convert_to_mp3', side_effect=fake_convert):
+            thread = threading.Thread(target=service.run, kwargs={'initial_sync': action is None})
+            thread.start()
+            try:
+                if action is not None:
+                    time.sleep(0.3)
+                    action()
+                deadline = time.time() + 10
+                while time.time() < deadline and not until():
+                    time.sleep(0.05)
+            finally:
+                service.stop()
+                thread.join(timeout=10)
+        self.assertFalse(thread.is_alive())
+    
+    def test_drop_during_initial_sync_is_picked_up(self):
+        """Verifica che un file aggiunto durante la sincronizzazione iniziale venga convertito al termine"""
+        conformer = SimpleConformer(str(self.src_dir), str(self.out_dir))
+        service = watch.WatchService(conformer, settle=0.1, poll_interval=0.1)
+        
+        def slow_initial_sync():
+            time.sleep(0.2)
+            (self.src_dir / "rock" / "during_sync.flac").write_bytes(b"new track")
+            time.sleep(0.5)
+        
+        with mock.patch.object(conformer, 'run', side_effect=slow_initial_sync):
+            self._run_service(conformer, service, lambda: conformer.stats['converted'] >= 1)
+        self.assertEqual(conformer.stats['converted'], 1)
+        self.assertTrue((self.out_dir / "rock" / "during_sync.mp3").exists())
+    
+    def test_changed_source_with_existing_output_is_reprocessed(self):
+        """Verifica che senza manifest un evento su una sorgente già convertita la rielabori comunque"""
+        source = self.src_dir / "rock" / "retagged.flac"
+        source.write_bytes(b"old tags")
+        (self.out_dir / "rock").mkdir(parents=True)
+        (self.out_dir / "rock" / "retagged.mp3").write_bytes(b"old output")
+        conformer = SimpleConformer(str(self.src_dir), str(self.out_dir))
+        service = watch.WatchService(conformer, settle=0.1, poll_interval=0.1)
+        self._run_service(conformer, service, lambda: conformer.stats['converted'] >= 1,
+                          action=lambda: source.write_bytes(b"new tags, same audio"))
+        self.assertEqual(conformer.stats['converted'], 1)
+        self.assertEqual((self.out_dir / "rock" / "retagged.mp3").read_bytes(), b"encoded")
+
+class TestScheduler(TestAntiRegressione):
+    """Test per la pianificazione LPT con priorità per cartella e avanzamento sul lavoro stimato"""
+    
+    def setUp(self):
+        self.work_dir = Path(tempfile.mkdtemp(prefix="conformer_sched_"))
+        self.src_dir = self.work_dir / "input"
+        self.out_dir = self.work_dir / "output"
+        for rel, size in [("archive/a_short.flac", 1000), ("archive/b_dj_set.wav", 500000),
+                          ("archive/c_medium.flac", 50000), ("new_releases/single.mp3", 2000)]:
+            path = self.src_dir / rel
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(b"\0" * size)
+    
+    def tearDown(self):
+        shutil.rmtree(str(self.work_dir), ignore_errors=True)
+    
+    def test_cost_model(self):
+        """Verifica la stima del costo da dimensione, durata e codec"""
+        self.assertAlmostEqual(estimate_cost(176400 * 60, '.wav'), 60.0)
+        self.assertGreater(estimate_cost(0, '.flac', duration=60, codec='aac'),
+                           estimate_cost(0, '.flac', duration=60, codec='pcm_s16le'))
+        self.assertLess(estimate_cost(0, '.mp3', duration=60, copy=True), 1.0)
+    
+    def test_priority_rules(self):
+        """Verifica le regole di priorità per cartella e per glob"""
+        rules = PriorityRules(["new_releases/", "*/live/*=5"])
+        self.assertEqual(rules.priority("new_releases/a.mp3"), 10)
+        self.assertEqual(rules.priority("label/new_releases/a.mp3"), 10)
+        self.assertEqual(rules.priority("band/live/a.flac"), 5)
+        self.assertEqual(rules.priority("archive/a.flac"), 0)
+        self.assertFalse(PriorityRules())
+    
+    def test_lpt_order_and_work_accounting(self):
+        """Verifica l'ordine (priorità, poi costo decrescente) e il conteggio del lavoro completato"""
+        costs = {'a': 1.0, 'b': 50.0, 'c': 5.0, 'd': 2.0}
+        estimate = lambda f: WorkEstimate(costs[f], 100)
+        scheduler = Scheduler(iter(costs), estimate, priority=lambda f: 10 if f == 'd' else 0, window=2).start()
+        order = list(scheduler)
+        self.assertEqual(sorted(order), ['a', 'b', 'c', 'd'])
+        self.assertEqual(scheduler.work_total, 58.0)
+        full = Scheduler(iter(costs), estimate, priority=lambda f: 10 if f == 'd' else 0).start()
+        full._thread.join()
+        self.assertEqual(list(full), ['d', 'b', 'c', 'a'])
+        full.complete('b')
+        self.assertEqual(full.work_done, 50.0)
+        self.assertEqual((full.bytes_done, full.bytes_total), (100, 400))
+    
+    def test_window_bounds_memory_and_dispatches_early(self):
+        """Verifica che il heap non superi la finestra e che il primo file parta prima della fine della scansione"""
+        from scheduler import DEFAULT_WINDOW, window_for
+        self.assertLessEqual(DEFAULT_WINDOW, 5000)
+        self.assertEqual(window_for(1), DEFAULT_WINDOW)
+        self.assertGreater(window_for(64), DEFAULT_WINDOW)
+        scan_finished = threading.Event()
+        
+        def files():
+            for index in range(50):
+                yield f"f{index:02d}"
+            scan_finished.set()
+        
+        scheduler = Scheduler(files(), lambda f: WorkEstimate(1.0, 1), window=5).start()
+        first = next(scheduler)
+        time.sleep(0.1)
+        self.assertFalse(scan_finished.is_set())
+        self.assertLessEqual(len(scheduler._heap), 5)
+        self.assertEqual(sorted([first] + list(scheduler)), [f"f{index:02d}" for index in range(50)])
+    
+    def test_progress_is_exactly_one_when_finished(self):
+        """Verifica che a lavoro finito l'avanzamento valga 1.0 anche se le somme dei costi differiscono"""
+        costs = {"a": 0.1, "b": 0.2, "c": 0.3}
+        conformer = SimpleConformer(str(self.src_dir), str(self.out_dir))
+        conformer.scheduler = Scheduler(list(costs), lambda f: WorkEstimate(costs[f], 1)).start()
+        conformer.scheduler._thread.join()
+        conformer._run_started = time.perf_counter()
+        # Completati in ordine LPT (0.3, 0.2, 0.1): la somma differisce da quella in ordine di scansione
+        for file_path in conformer.scheduler:
+            self.assertLess(conformer.progress_estimate()[0], 1.0)
+            conformer.scheduler.complete(file_path)
+        self.assertNotEqual(conformer.scheduler.work_done, conformer.scheduler.work_total)
+        self.assertEqual(conformer.progress_estimate(), (1.0, 0.0))
+    
+    def test_run_processes_longest_jobs_first(self):
+        """Verifica che run() elabori prima le cartelle prioritarie e poi i file più lunghi"""
+        order = []
+        
+        def fake_convert(src, dst, info=None, loudness=None):
+            order.append(src.relative_to(self.src_dir).as_posix())
+            return True
+        
+        conformer = SimpleConformer(str(self.src_dir), str(self.out_dir), priorities=["new_releases/"])
+        # La scansione termina prima che parta il primo encode: l'ordine dipende solo dallo scheduler
+        original_start = Scheduler.start
+        
+        def start_and_wait(scheduler):
+            original_start(scheduler)
+            scheduler._thread.join()
+            return scheduler
+        
+        with mock.patch.object(conformer, '_probe_or_none', return_value=None), \
+             mock.patch.object(conformer, 'convert_to_mp3', side_effect=fake_convert), \
+             mock.patch.object(Scheduler, 'start', start_and_wait):
+            conformer.run()
+        self.assertEqual(order, ["new_releases/single.mp3", "archive/b_dj_set.wav",
+                                 "archive/c_medium.flac", "archive/a_short.flac"])
+        self.assertEqual(conformer.scheduler.completed, conformer.scheduler.discovered)
+        fraction, eta = conformer.progress_estimate()
+        self.assertAlmostEqual(fraction, 1.0)
+        self.assertAlmostEqual(eta, 0.0)
+        self.assertEqual(format_duration(3900), "1h 05m")
+        self.assertEqual(format_duration(250), "4m 10s")
+
+class TestProgressAggregation(TestAntiRegressione):
+    """Test per l'avanzamento aggregato letto a frequenza fissa (velocità mobili, ETA, vista per worker)"""
+    
+    def test_rolling_rates_and_byte_weighted_eta(self):
+        """Verifica file/s e MB/s sulla finestra mobile e l'ETA sui byte rimanenti"""
+        tracker = ProgressTracker(window=10.0)
+        for second in range(5):
+            tracker.completed_file(f"track{second}.flac", 1000000, now=100.0 + second)
+        files_per_sec, bytes_per_sec = tracker.rates(now=104.0)
+        self.assertAlmostEqual(files_per_sec, 1.25)
+        self.assertAlmostEqual(bytes_per_sec, 1250000)
+        snapshot = tracker.snapshot(total=10, bytes_total=10000000, now=104.0)
+        self.assertEqual((snapshot.completed, snapshot.total, snapshot.filename), (5, 10, "track4.flac"))
+        self.assertAlmostEqual(snapshot.eta, 4.0)
+        self.assertAlmostEqual(snapshot.fraction, 0.5)
+        # Campioni fuori finestra: nessuna velocità recente, nessuna ETA inventata
+        self.assertEqual(tracker.rates(now=200.0), (0.0, 0.0))
+        self.assertIsNone(tracker.snapshot(total=10, bytes_total=10000000, now=200.0).eta)
+    
+    def test_worker_view(self):
+        """Verifica la vista dei file in lavorazione per worker"""
+        tracker = ProgressTracker()
+        tracker.started("a.flac", worker="w1")
+        tracker.started("b.wav", worker="w2")
+        self.assertEqual(tracker.snapshot(total=2).workers, (("w1", "a.flac"), ("w2", "b.wav")))
+        tracker.ended(worker="w1")
+        self.assertEqual(tracker.snapshot(total=2).workers, (("w2", "b.wav"),))
+    
+    def test_conformer_snapshot_after_run(self):
+        """Verifica che un'esecuzione completa lasci un'istantanea coerente senza callback per file"""
+        out_dir = Path(tempfile.mkdtemp(prefix="conformer_progress_"))
+        try:
+            conformer = SimpleConformer(str(self.input_dir), str(out_dir), jobs=2)
+            with mock.patch.object(conformer, 'is_conforming_mp3', return_value=False), \
+                 mock.patch.object(conformer, 'convert_to_mp3', return_value=True):
+                conformer.run()
+            snapshot = conformer.progress_snapshot()
+            self.assertEqual((snapshot.completed, snapshot.total), (4, 4))
+            self.assertEqual(snapshot.fraction, 1.0)
+            self.assertEqual(snapshot.workers, ())
+            self.assertEqual(snapshot.eta, 0.0)
+        finally:
+            shutil.rmtree(str(out_dir), ignore_errors=True)
+
+class TestBatchMode(TestAntiRegressione):
+    """Test per la modalità batch: file di job, pool condiviso, cache probe condivisa e report complessivo"""
+    
+    def setUp(self):
+        self.work_dir = Path(tempfile.mkdtemp(prefix="conformer_batch_"))
+        for name in ("station_a", "station_b"):
+            shutil.copytree(str(self.input_dir), str(self.work_dir / "libraries" / name))
+    
+    def tearDown(self):
+        shutil.rmtree(str(self.work_dir), ignore_errors=True)
+    
+    def _job_data(self):
+        return {
+            'workers': 3,
+            'defaults': {'formats': ['flac', '.WAV', 'm4a', 'mp3']},
+            'jobs': [
+                {'name': 'A', 'input': 'libraries/station_a', 'output': 'out/a'},
+                {'name': 'B', 'input': 'libraries/station_b', 'output': 'out/b', 'bitrate': 128,
+                 'sample_rate': 48000, 'formats': ['flac']},
+            ],
+        }
+    
+    def test_parse_job_file(self):
+        """Verifica percorsi relativi, valori predefiniti, sostituzioni per job e errori di validazione"""
+        import batch
+        config = batch.parse_batch(self._job_data(), self.work_dir)
+        self.assertEqual(config.workers, 3)
+        job_a, job_b = config.jobs
+        self.assertEqual(job_a.input_dir, self.work_dir / "libraries" / "station_a")
+        self.assertEqual(job_a.formats, frozenset({'.flac', '.wav', '.m4a', '.mp3'}))
+        self.assertEqual((job_b.bitrate, job_b.sample_rate, job_b.formats), (128, 48000, frozenset({'.flac'})))
+        self.assertEqual(batch.parse_batch(self._job_data(), self.work_dir, workers=7).workers, 7)
+        
+        for broken in ({'jobs': []},
+                       {'jobs': [{'input': 'libraries/station_a'}]},
+                       {'jobs': [{'input': 'missing', 'output': 'out'}]},
+                       {'jobs': [{'input': 'libraries/station_a', 'output': 'out', 'bitrat': 1}]},
+                       {'jobs': [{'input': 'libraries/station_a', 'output': 'out'},
+                                 {'input': 'libraries/station_b', 'output': 'out'}]}):
+            with self.assertRaises(ValueError):
+                batch.parse_batch(broken, self.work_dir)
+    
+    def test_toml_job_file(self):
+        """Verifica la lettura di un file di job TOML"""
+        import batch
+        job_file = self.work_dir / "night.toml"
+        job_file.write_text('workers = 2\n\n[[jobs]]\ninput = "libraries/station_a"\noutput = "out/a"\n'
+                            'bitrate = 128\n', encoding='utf-8')
+        try:
+            data = batch.load_job_file(job_file)
+        except ValueError:
+            self.skipTest("tomllib/tomli non disponibili")
+        config = batch.parse_batch(data, self.work_dir)
+        self.assertEqual((config.workers, config.jobs[0].bitrate), (2, 128))
+    
+    def test_jobs_share_pool_and_probe_cache(self):
+        """Verifica pool unico, cache probe condivisa senza collisioni e report complessivo"""
+        import json
+        import batch
+        threads = set()
+        
+        def fake_convert(conformer, src, dst, info=None, loudness=None):
+            threads.add(threading.current_thread().name.rsplit('_', 1)[0])
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            dst.write_bytes(f"{conformer.TARGET_BITRATE}k".encode())
+            return True
+        
+        probe_result = {'streams': [{'codec_type': 'audio', 'codec_name': 'flac', 'sample_rate': '44100',
+                                     'channels': 2, 'duration': '10'}]}
+        config = batch.parse_batch(self._job_data(), self.work_dir)
+        with mock.patch.object(SimpleConformer, 'convert_to_mp3', autospec=True, side_effect=fake_convert), \
+             mock.patch('ffexec.FFmpegRunner.probe', return_value=probe_result):
+            summary = batch.BatchRunner(config, SimpleConformer).run()
+        
+        self.assertEqual([job['status'] for job in summary['jobs']], ['completed', 'completed'])
+        self.assertEqual(summary['jobs'][0]['stats']['converted'], 4)
+        self.assertEqual(summary['jobs'][1]['stats']['converted'], 1)
+        self.assertEqual(summary['totals']['converted'], 5)
+        self.assertIn('128k:48000', summary['jobs'][1]['settings'])
+        self.assertEqual((self.work_dir / "out" / "b" / "rock" / "song2.mp3").read_bytes(), b"128k")
+        self.assertEqual(len(threads), 1)
+        with ProbeCache(self.work_dir / ".conformer-batch.db") as cache:
+            self.assertEqual(len(cache), 5)
+        reports = list((self.work_dir / ".conformer-reports").glob("conformer-batch-*.json"))
+        self.assertEqual(len(reports), 1)
+        self.assertEqual(json.loads(reports[0].read_text(encoding='utf-8'))['totals']['converted'], 5)
+
+class TestAtomicOutput(TestAntiRegressione):
+    """Test per scritture atomiche e ripresa dopo interruzione"""
+    
+    def setUp(self):
+        self.out_dir = Path(tempfile.mkdtemp(prefix="conformer_atomic_"))
+        self.conformer = SimpleConformer(str(self.input_dir), str(self.out_dir))
+    
+    def tearDown(self):
+        shutil.rmtree(str(self.out_dir), ignore_errors=True)
+    
+    def _temp_files(self):
+        return [f for f in self.out_dir.rglob("*") if f.name.endswith(SimpleConformer.TEMP_SUFFIX)]
+    
+    def test_safe_copy_leaves_no_temp(self):
+        """Verifica che la copia arrivi completa a destinazione senza file temporanei"""
+        src = self.input_dir / "rock" / "song1.mp3"
+        dst = self.out_dir / "rock" / "song1.mp3"
+        self.assertTrue(self.conformer.safe_copy(src, dst))
+        self.assertEqual(dst.read_bytes(), src.read_bytes())
+        self.assertEqual(self._temp_files(), [])
+    
+    def test_failed_conversion_leaves_nothing(self):
+        """Verifica che una conversione fallita non lasci né output né temporanei"""
+        dst = self.out_dir / "rock" / "song2.mp3"
+        with mock.patch.object(self.conformer.runner, 'encode', side_effect=OSError("ffmpeg missing")):
+            self.assertFalse(self.conformer.convert_to_mp3(self.input_dir / "rock" / "song2.flac", dst))
+        self.assertFalse(dst.exists())
+        self.assertEqual(self._temp_files(), [])
+    
+    def test_stale_temp_cleanup(self):
+        """Verifica la pulizia dei temporanei di esecuzioni precedenti, non di quella corrente"""
+        (self.out_dir / "rock").mkdir()
+        stale = self.out_dir / "rock" / f".song.mp3.deadbeef-0000{SimpleConformer.TEMP_SUFFIX}"
+        stale.write_bytes(b"partial")
+        current = self.conformer._temp_path(self.out_dir / "rock" / "other.mp3")
+        current.write_bytes(b"in progress")
+        self.assertEqual(self.conformer.cleanup_stale_temp_files(), 1)
+        self.assertFalse(stale.exists())
+        self.assertTrue(current.exists())
+
+class TestProbeAndDecide(TestAntiRegressione):
+    """Test per l'analisi unica per file e la scelta degli argomenti ffmpeg"""
+    
+    def setUp(self):
+        self.out_dir = Path(tempfile.mkdtemp(prefix="conformer_probe_"))
+        self.conformer = SimpleConformer(str(self.input_dir), str(self.out_dir))
+    
+    def tearDown(self):
+        shutil.rmtree(str(self.out_dir), ignore_errors=True)
+    
+    def _probe_result(self, sample_rate, channels):
+        return {'streams': [{'codec_type': 'audio', 'codec_name': 'flac', 'sample_rate': str(sample_rate),
+                             'channels': channels, 'duration': '12.5'}],
+                'format': {'duration': '12.5'}}
+    
+    def test_media_info_record(self):
+        """Verifica il record MediaInfo prodotto da ffprobe"""
+        with mock.patch.object(self.conformer.runner, 'probe', return_value=self._probe_result(48000, 1)):
+            info = self.conformer.probe_media(self.input_dir / "rock" / "song2.flac")
+        self.assertEqual(info, MediaInfo('flac', 0, 48000, 1, 12.5))
+    
+    def test_encode_args_drop_unneeded_filters(self):
+        """Verifica che resample e downmix vengano omessi se la sorgente è già conforme"""
+        full = self.conformer.encode_args(None)
+        self.assertEqual(full, ['-c:a', 'libmp3lame', '-b:a', '192k', '-ar', '44100', '-ac', '2'])
+        args = self.conformer.encode_args(MediaInfo('flac', 0, 44100, 2, 10.0))
+        self.assertEqual(args, ['-c:a', 'libmp3lame', '-b:a', '192k'])
+        args = self.conformer.encode_args(MediaInfo('pcm_s16le', 0, 48000, 2, 10.0))
+        self.assertIn('-ar', args)
+        self.assertNotIn('-ac', args)
+    
+    def test_single_probe_per_file(self):
+        """Verifica che ogni file venga analizzato una sola volta e il risultato passato alla conversione"""
+        received = []
+        
+        def fake_convert(src, dst, info=None, loudness=None):
+            received.append(info)
+            return True
+        
+        with mock.patch.object(self.conformer.runner, 'probe', return_value=self._probe_result(44100, 2)) as probe, \
+             mock.patch.object(self.conformer, 'convert_to_mp3', side_effect=fake_convert):
+            self.conformer.run()
+        self.assertEqual(probe.call_count, 4)
+        self.assertEqual(len(received), 4)
+        self.assertTrue(all(info.sample_rate == 44100 for info in received))
+
+class TestLoudness(TestAntiRegressione):
+    """Test per la normalizzazione EBU R128 a due passaggi con misure in cache"""
+    
+    MEASURED = {'input_i': '-23.10', 'input_tp': '-4.20', 'input_lra': '6.30', 'input_thresh': '-33.40',
+                'target_offset': '0.10'}
+    
+    def setUp(self):
+        self.out_dir = Path(tempfile.mkdtemp(prefix="conformer_loudness_"))
+        self.cache = LoudnessCache(self.out_dir / "state.db")
+        self.conformer = SimpleConformer(str(self.input_dir), str(self.out_dir),
+                                         loudness_target=-16.0, loudness_cache=self.cache)
+    
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(str(self.out_dir), ignore_errors=True)
+    
+    def test_parse_loudness(self):
+        """Verifica i formati accettati da --loudness"""
+        self.assertEqual(parse_loudness("-16LUFS"), -16.0)
+        self.assertEqual(parse_loudness("-14.5 lufs"), -14.5)
+        self.assertEqual(parse_loudness("-23"), -23.0)
+        import argparse
+        for value in ("loud", "16", "-100"):
+            with self.assertRaises(argparse.ArgumentTypeError):
+                parse_loudness(value)
+    
+    def test_runner_parses_first_pass(self):
+        """Verifica la lettura del JSON di loudnorm dalla coda di stderr"""
+        import json
+        stderr = (b"[Parsed_loudnorm_0 @ 0x55d] \n" + json.dumps(self.MEASURED, indent=1).encode() + b"\n")
+        with mock.patch.object(self.conformer.runner, '_run', return_value=stderr) as run:
+            measured = self.conformer.runner.measure_loudness("in.flac", -16, -1.5, 11)
+        self.assertEqual(measured['input_i'], '-23.10')
+        argv = run.call_args[0][0]
+        self.assertIn('loudnorm=I=-16:TP=-1.5:LRA=11:print_format=json', argv)
+        self.assertEqual(argv[-3:], ['-f', 'null', '-'])
+    
+    def test_second_pass_in_encode_args(self):
+        """Verifica che il secondo passaggio usi le misure del primo e fissi la frequenza di uscita"""
+        loudness = LoudnessInfo(-23.1, -4.2, 6.3, -33.4)
+        args = self.conformer.encode_args(MediaInfo('flac', 0, 44100, 2, 10.0), loudness)
+        audio_filter = args[args.index('-af') + 1]
+        self.assertTrue(audio_filter.startswith('loudnorm=I=-16:TP=-1.5:LRA=11:'))
+        self.assertIn('measured_I=-23.1', audio_filter)
+        self.assertIn('linear=true', audio_filter)
+        self.assertIn('-ar', args)
+        self.assertNotIn('measured_I', self.conformer.loudnorm_filter(None))
+    
+    def test_measurement_cached_per_source(self):
+        """Verifica che il primo passaggio venga eseguito una sola volta per sorgente invariata"""
+        source = self.input_dir / "rock" / "song2.flac"
+        with mock.patch.object(self.conformer.runner, 'measure_loudness', return_value=self.MEASURED) as measure:
+            first = self.conformer.measure_loudness(source)
+            second = self.conformer.measure_loudness(source)
+        self.assertEqual(measure.call_count, 1)
+        self.assertEqual(first, second)
+        self.assertAlmostEqual(first.integrated, -23.1)
+        self.assertEqual(self.conformer.stats['loudness_cache_hits'], 1)
+    
+    def test_conforming_mp3_rechecked_against_target(self):
+        """Verifica che un MP3 conforme nel formato ma fuori target venga ricodificato"""
+        info = MediaInfo('mp3', 192000, 44100, 2, 10.0)
+        received = []
+        
+        def fake_convert(src, dst, info=None, loudness=None):
+            received.append(loudness)
+            return True
+        
+        source = self.input_dir / "rock" / "song1.mp3"
+        with mock.patch.object(self.conformer, '_probe_or_none', return_value=info), \
+             mock.patch.object(self.conformer.runner, 'measure_loudness', return_value=self.MEASURED), \
+             mock.patch.object(self.conformer, 'convert_to_mp3', side_effect=fake_convert), \
+             mock.patch.object(self.conformer, 'safe_copy', return_value=True):
+            self.assertEqual(self.conformer._process_file(source, {}), 'converted')
+            self.assertEqual(self.conformer.stats['loudness_reencoded'], 1)
+            self.assertAlmostEqual(received[0].integrated, -23.1)
+            
+            with mock.patch.object(self.conformer, 'measure_loudness',
+                                   return_value=LoudnessInfo(-16.4, -2.0, 6.3, -26.5)):
+                self.assertEqual(self.conformer._process_file(source, {}), 'copied')
+        self.assertEqual(len(received), 1)
+
+class TestProfiles(TestAntiRegressione):
+    """Test per i profili di output e la codifica di più profili con una sola decodifica"""
+    
+    def setUp(self):
+        self.out_dir = Path(tempfile.mkdtemp(prefix="conformer_profiles_"))
+    
+    def tearDown(self):
+        shutil.rmtree(str(self.out_dir), ignore_errors=True)
+    
+    def test_default_profile_keeps_settings(self):
+        """Verifica che il profilo predefinito mantenga firma e valori storici"""
+        conformer = SimpleConformer(str(self.input_dir), str(self.out_dir))
+        self.assertEqual(conformer.settings_signature(), "mp3:libmp3lame:192k:44100:ac2")
+        self.assertEqual(conformer.profile, PROFILES['mp3-192'])
+        with self.assertRaises(ValueError):
+            resolve_profiles(['mp3-192', 'mp3-192'])
+        with self.assertRaises(ValueError):
+            resolve_profiles(['flac-lossless'])
+    
+    def test_conformity_per_profile(self):
+        """Verifica codec, frequenza, canali e bitrate (ignorato in VBR) per profilo"""
+        mp3 = self.input_dir / "rock" / "song1.mp3"
+        conformer = SimpleConformer(str(self.input_dir), str(self.out_dir), profiles=['speech-mono'])
+        self.assertTrue(conformer.is_conforming_mp3(mp3, MediaInfo('mp3', 64000, 44100, 1, 10.0)))
+        self.assertFalse(conformer.is_conforming_mp3(mp3, MediaInfo('mp3', 64000, 44100, 2, 10.0)))
+        vbr = PROFILES['mp3-vbr']
+        self.assertTrue(conformer.is_conforming(mp3, MediaInfo('mp3', 171234, 44100, 2, 10.0), vbr))
+        self.assertFalse(conformer.is_conforming(mp3, MediaInfo('mp3', 171234, 48000, 2, 10.0), vbr))
+        self.assertFalse(conformer.is_conforming(mp3, MediaInfo('mp3', 96000, 48000, 2, 10.0), PROFILES['opus-96']))
+    
+    def test_encode_args_follow_profile(self):
+        """Verifica encoder, bitrate o qualità VBR, frequenza e canali del profilo"""
+        conformer = SimpleConformer(str(self.input_dir), str(self.out_dir))
+        info = MediaInfo('flac', 0, 44100, 2, 10.0)
+        self.assertEqual(conformer.encode_args(info, profile=PROFILES['opus-96']),
+                         ['-c:a', 'libopus', '-b:a', '96k', '-ar', '48000'])
+        self.assertEqual(conformer.encode_args(info, profile=PROFILES['mp3-vbr']), ['-c:a', 'libmp3lame', '-q:a', '2'])
+        self.assertEqual(conformer.encode_args(info, profile=PROFILES['speech-mono'])[-2:], ['-ac', '1'])
+    
+    def test_single_decode_for_all_profiles(self):
+        """Verifica un solo processo ffmpeg con un -i per tutti i profili e output in sottocartelle"""
+        conformer = SimpleConformer(str(self.input_dir), str(self.out_dir),
+                                    profiles=['mp3-192', 'aac-128', 'opus-96'])
+        source = self.input_dir / "rock" / "song2.flac"
+        calls = []
+        
+        def fake_encode_multi(src, outputs, timeout=None, input_args=None):
+            calls.append(conformer.runner.multi_encode_argv(src, outputs, input_args))
+            for _, tmp in outputs:
+                Path(tmp).write_bytes(b"audio")
+        
+        with mock.patch.object(conformer, '_probe_or_none', return_value=MediaInfo('flac', 0, 44100, 2, 10.0)), \
+             mock.patch.object(conformer.runner, 'encode_multi', side_effect=fake_encode_multi):
+            self.assertEqual(conformer._process_file(source, {}), 'converted')
+            self.assertEqual(conformer._process_file(source, {}), 'skipped')
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(calls[0].count('-i'), 1)
+        for codec in ('libmp3lame', 'aac', 'libopus'):
+            self.assertIn(codec, calls[0])
+        for name, extension in (('mp3-192', '.mp3'), ('aac-128', '.m4a'), ('opus-96', '.opus')):
+            self.assertTrue((self.out_dir / name / "rock" / f"song2{extension}").exists())
+        self.assertEqual(list(self.out_dir.rglob("*" + SimpleConformer.TEMP_SUFFIX)), [])
+    
+    def test_conforming_profile_copied_others_encoded(self):
+        """Verifica che un MP3 conforme venga copiato per il proprio profilo e codificato per gli altri"""
+        conformer = SimpleConformer(str(self.input_dir), str(self.out_dir), profiles=['mp3-192', 'opus-96'])
+        source = self.input_dir / "rock" / "song1.mp3"
+        with mock.patch.object(conformer, '_probe_or_none', return_value=MediaInfo('mp3', 192000, 44100, 2, 10.0)), \
+             mock.patch.object(conformer, 'convert_multi', return_value=True) as convert:
+            self.assertEqual(conformer._process_file(source, {}), 'converted')
+        targets = convert.call_args[0][1]
+        self.assertEqual([profile.name for profile, _ in targets], ['opus-96'])
+        self.assertTrue((self.out_dir / "mp3-192" / "rock" / "song1.mp3").exists())
+    
+    def test_dedup_requires_single_profile(self):
+        """Verifica che la deduplicazione venga rifiutata con più profili"""
+        with ContentIndex(self.out_dir / "state.db") as index:
+            with self.assertRaises(ValueError):
+                SimpleConformer(str(self.input_dir), str(self.out_dir), content_index=index,
+                                profiles=['mp3-192', 'aac-128'])
+
+class TestLogging(TestAntiRegressione):
+    """Test per il logging asincrono JSON-lines configurato una volta per processo"""
+    
+    def setUp(self):
+        import logging
+        self.out_dir = Path(tempfile.mkdtemp(prefix="conformer_logging_"))
+        self.root_level = logging.getLogger().level
+    
+    def tearDown(self):
+        import logging
+        logsetup.shutdown_logging()
+        logging.getLogger().setLevel(self.root_level)
+        shutil.rmtree(str(self.out_dir), ignore_errors=True)
+    
+    def _records(self, path):
+        import json
+        return [json.loads(line) for line in path.read_text(encoding='utf-8').splitlines()]
+    
+    def test_conformer_does_not_configure_logging(self):
+        """Verifica che creare un SimpleConformer non scriva conformer.log nella cartella corrente"""
+        cwd = os.getcwd()
+        os.chdir(str(self.out_dir))
+        try:
+            SimpleConformer(str(self.input_dir), str(self.out_dir / "out"))
+            self.assertFalse((self.out_dir / "conformer.log").exists())
+        finally:
+            os.chdir(cwd)
+    
+    def test_structured_file_records(self):
+        """Verifica il record JSON per file con esito e tempi, escluso dalla console"""
+        log_path = logsetup.configure_logging(logsetup.default_log_path(self.out_dir), console=False)
+        self.assertEqual(log_path, self.out_dir / ".conformer-logs" / "conformer.jsonl")
+        conformer = SimpleConformer(str(self.input_dir), str(self.out_dir / "out"))
+        
+        def fake_process(file_path, timings, force=False):
+            timings['probe'] = 0.25
+            return 'converted'
+        
+        with mock.patch.object(conformer, '_process_file', side_effect=fake_process):
+            conformer.process_single_file(self.input_dir / "rock" / "song2.flac")
+        conformer.logger.warning("avviso di prova")
+        logsetup.shutdown_logging()
+        records = self._records(log_path)
+        files = [r for r in records if r.get('event') == 'file']
+        self.assertEqual(len(files), 1)
+        self.assertEqual(files[0]['outcome'], 'converted')
+        self.assertEqual(files[0]['timings'], {'probe': 0.25})
+        self.assertTrue(files[0]['path'].endswith("song2.flac"))
+        self.assertIn('avviso di prova', [r['message'] for r in records])
+        import logging
+        console = logsetup._ConsoleFilter()
+        self.assertFalse(console.filter(logging.LogRecord(logsetup.FILE_LOGGER_NAME, logging.INFO, '', 0, 'x', None, None)))
+        self.assertTrue(console.filter(logging.LogRecord('conformer', logging.INFO, '', 0, 'x', None, None)))
+    
+    def test_rotation_by_size(self):
+        """Verifica che il log ruoti per dimensione con un numero limitato di file"""
+        import logging
+        log_path = logsetup.configure_logging(self.out_dir / "app.jsonl", console=False, max_bytes=500, backups=2)
+        logger = logging.getLogger("conformer.test")
+        for i in range(100):
+            logger.info(f"riga {i}")
+        logsetup.shutdown_logging()
+        logs = sorted(p.name for p in self.out_dir.glob("app.jsonl*"))
+        self.assertEqual(logs, ["app.jsonl", "app.jsonl.1", "app.jsonl.2"])
+        self.assertEqual(self._records(log_path)[-1]['message'], "riga 99")
+
+class TestPreflight(TestAntiRegressione):
+    """Test per il piano preliminare: azioni previste, byte in uscita, spazio libero, disco pieno"""
+    
+    def setUp(self):
+        self.out_dir = Path(tempfile.mkdtemp(prefix="conformer_preflight_"))
+        self.conformer = SimpleConformer(str(self.input_dir), str(self.out_dir), jobs=2)
+    
+    def tearDown(self):
+        shutil.rmtree(str(self.out_dir), ignore_errors=True)
+    
+    @staticmethod
+    def _fake_probe(file_path):
+        if file_path.suffix == '.mp3':
+            return MediaInfo('mp3', 192000, 44100, 2, 60.0)
+        return MediaInfo('flac', 0, 48000, 2, 60.0)
+    
+    def test_output_estimate(self):
+        """Verifica la stima dei byte da durata e bitrate, anche per i profili VBR"""
+        self.assertEqual(preflight.estimate_output_bytes(60, PROFILES['mp3-192']), 1468800)
+        self.assertGreater(preflight.estimate_output_bytes(60, PROFILES['mp3-vbr']), 1400000)
+        self.assertGreater(preflight.free_space(self.out_dir / "non" / "ancora"), 0)
+    
+    def test_plan_counts_actions_without_writing(self):
+        """Verifica il conteggio di file saltati, copiati e convertiti senza scrivere output"""
+        existing = self.out_dir / "pop" / "2024" / "hit.mp3"
+        existing.parent.mkdir(parents=True)
+        existing.write_bytes(b"x" * 10)
+        with mock.patch.object(self.conformer, '_probe_or_none', side_effect=self._fake_probe):
+            plan = self.conformer.build_plan()
+        self.assertEqual(plan.files, {'skip': 1, 'copy': 1, 'convert': 2})
+        self.assertEqual(plan.output_bytes, (self.input_dir / "rock" / "song1.mp3").stat().st_size + 2 * 1468800)
+        self.assertAlmostEqual(plan.audio_seconds, 180.0)
+        self.assertGreater(plan.estimated_seconds, 0)
+        self.assertEqual(self.conformer.stats['processed'], 0)
+        self.assertEqual([p.name for p in self.out_dir.rglob("*") if p.is_file()], ["hit.mp3"])
+        self.assertTrue(any("da convertire" in line for line in plan.summary_lines()))
+    
+    def test_plan_detects_missing_space(self):
+        """Verifica che il piano segnali uno spazio libero insufficiente"""
+        with mock.patch.object(self.conformer, '_probe_or_none', side_effect=self._fake_probe), \
+             mock.patch('conformer.free_space', return_value=1024):
+            plan = self.conformer.build_plan()
+        self.assertFalse(plan.fits)
+        self.assertFalse(plan.to_dict()['fits'])
+    
+    def _snapshot(self, root):
+        return {p.relative_to(root).as_posix(): (p.stat().st_size, p.stat().st_mtime_ns, p.read_bytes())
+                for p in root.rglob("*") if p.is_file()}
+    
+    def _dry_run(self, output_dir, *options):
+        script = str(Path(__file__).resolve().parent / "conformer.py")
+        return subprocess.run([sys.executable, script, str(self.input_dir), str(output_dir), "--dry-run"]
+                              + list(options), capture_output=True, text=True, timeout=120)
+    
+    def test_dry_run_writes_nothing(self):
+        """Verifica che --dry-run non crei la cartella di output né tocchi un database di stato esistente"""
+        missing = self.out_dir / "nuova"
+        result = self._dry_run(missing, "--incremental", "--loudness", "-16")
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertIn("Piano:", result.stdout)
+        self.assertFalse(missing.exists())
+        
+        with ProbeCache(self.out_dir / ".conformer.db") as cache:
+            cache.put("rock/song2.flac", 1, 1, {'codec': 'flac', 'duration': 60.0})
+        SyncManifest(self.out_dir / ".conformer.db").close()
+        before = self._snapshot(self.out_dir)
+        result = self._dry_run(self.out_dir, "--incremental")
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(self._snapshot(self.out_dir), before)
+    
+    def test_dry_run_rejected_with_batch(self):
+        """Verifica che --batch con --dry-run o --preflight venga rifiutato invece di convertire davvero"""
+        import json
+        missing = self.out_dir / "batch"
+        job_file = self.out_dir / "jobs.json"
+        job_file.write_text(json.dumps({'jobs': [{'input': str(self.input_dir), 'output': str(missing)}]}))
+        script = str(Path(__file__).resolve().parent / "conformer.py")
+        for option in ("--dry-run", "--preflight"):
+            result = subprocess.run([sys.executable, script, "--batch", str(job_file), option],
+                                    capture_output=True, text=True, timeout=120)
+            self.assertEqual(result.returncode, 1, result.stderr)
+            self.assertIn("cannot be combined with --batch", result.stdout)
+        self.assertFalse(missing.exists())
+    
+    def test_disk_full_stops_run(self):
+        """Verifica che un disco pieno interrompa l'esecuzione con un messaggio esplicito"""
+        from ffexec import FFmpegError
+        error = FFmpegError('ffmpeg', 1, b"av_interleaved_write_frame(): No space left on device\n")
+        with mock.patch.object(self.conformer.runner, 'encode', side_effect=error), \
+             self.assertLogs('conformer', level='ERROR') as logs:
+            converted = self.conformer.convert_to_mp3(self.input_dir / "rock" / "song2.flac",
+                                                      self.out_dir / "song2.mp3")
+        self.assertFalse(converted)
+        self.assertTrue(self.conformer.stop_requested)
+        self.assertIn("Spazio esaurito", logs.output[0])
+
+class TestMp3Header(TestAntiRegressione):
+    """Test per la lettura degli header MP3 al posto di ffprobe"""
+    
+    BITRATE_INDEX = {64: 5, 128: 9, 192: 11, 256: 13, 320: 14}
+    
+    def setUp(self):
+        self.work_dir = Path(tempfile.mkdtemp(prefix="conformer_mp3header_"))
+        self.conformer = SimpleConformer(str(self.work_dir), str(self.work_dir / "out"))
+    
+    def tearDown(self):
+        shutil.rmtree(str(self.work_dir), ignore_errors=True)
+    
+    def _frame(self, kbps, mono=False, tag=None, frames=0):
+        """Frame MPEG-1 Layer III a 44.1 kHz con payload nullo, opzionalmente con tag Xing/Info"""
+        import struct
+        mode = 3 if mono else 1
+        value = 0xFFE00000 | (3 << 19) | (1 << 17) | (1 << 16) | (self.BITRATE_INDEX[kbps] << 12) | (mode << 6)
+        frame = bytearray(144 * kbps * 1000 // 44100)
+        struct.pack_into('>I', frame, 0, value)
+        if tag:
+            position = 4 + (17 if mono else 32)
+            frame[position:position + 4] = tag
+            struct.pack_into('>II', frame, position + 4, 0x1, frames)
+        return bytes(frame)
+    
+    def _write(self, name, data):
+        path = self.work_dir / name
+        path.write_bytes(data)
+        return path
+    
+    def test_cbr_with_info_tag(self):
+        """Verifica CBR 192k/44.1k stereo dal tag Info, senza lanciare ffprobe"""
+        path = self._write("cbr.mp3", self._frame(192, tag=b'Info', frames=40) + self._frame(192) * 40)
+        info = mp3header.read_mp3_info(path)
+        self.assertEqual((info.bitrate, info.sample_rate, info.channels, info.vbr), (192, 44100, 2, False))
+        self.assertAlmostEqual(info.duration, 40 * 1152 / 44100)
+        with mock.patch.object(self.conformer.runner, 'probe') as probe:
+            self.assertTrue(self.conformer.is_conforming_mp3(path))
+            probe.assert_not_called()
+        self.assertEqual(self.conformer.stats['header_scans'], 1)
+    
+    def test_vbr_not_conforming_to_cbr_profile(self):
+        """Verifica che un VBR con bitrate medio vicino a 192k non passi per CBR 192k"""
+        frames = (self._frame(128) + self._frame(256)) * 20
+        path = self._write("vbr.mp3", self._frame(192, tag=b'Xing', frames=40) + frames)
+        info = mp3header.read_mp3_info(path)
+        self.assertTrue(info.vbr)
+        self.assertTrue(170 <= info.bitrate <= 200)
+        media = self.conformer.probe_media(path)
+        self.assertEqual(media.bit_rate, 0)
+        self.assertFalse(self.conformer.is_conforming_mp3(path, media))
+        self.assertTrue(self.conformer.is_conforming(path, media, PROFILES['mp3-vbr']))
+    
+    def test_mono_without_tag_and_id3(self):
+        """Verifica il salto del tag ID3v2, il modo mono e la durata dal bitrate costante"""
+        tag_body = b"\x00" * 3000
+        id3 = b"ID3\x04\x00\x00" + bytes([0, 0, (len(tag_body) >> 7) & 0x7F, len(tag_body) & 0x7F]) + tag_body
+        # Un byte 0xFF isolato prima dei frame non deve essere scambiato per una sincronizzazione
+        audio = b"\xff\xfb\x00" + self._frame(64, mono=True) * 30
+        path = self._write("speech.mp3", id3 + audio)
+        info = mp3header.read_mp3_info(path)
+        self.assertEqual((info.bitrate, info.channels, info.mode, info.vbr), (64, 1, 'mono', False))
+        self.assertAlmostEqual(info.duration, (len(audio) - 3) * 8 / 64000, places=2)
+    
+    def test_ambiguous_files_fall_back_to_ffprobe(self):
+        """Verifica il ricorso a ffprobe per file non MP3, troppo corti o VBR senza numero di frame"""
+        self.assertIsNone(mp3header.read_mp3_info(self._write("bad.mp3", b"test content")))
+        self.assertIsNone(mp3header.read_mp3_info(self._write("short.mp3", self._frame(192))))
+        vbr = (self._frame(128) + self._frame(256)) * 10
+        self.assertIsNone(mp3header.read_mp3_info(self._write("vbr_notag.mp3", vbr)))
+        probe_result = {'streams': [{'codec_type': 'audio', 'codec_name': 'mp3', 'bit_rate': '190000',
+                                     'sample_rate': '44100', 'channels': 2, 'duration': '1'}]}
+        with mock.patch.object(self.conformer.runner, 'probe', return_value=probe_result) as probe:
+            self.conformer.probe_media(self.work_dir / "vbr_notag.mp3")
+            self.assertEqual(probe.call_count, 1)
+
+class TestResources(TestAntiRegressione):
+    """Test per priorità, affinità dei worker e governatore del parallelismo"""
+    
+    def setUp(self):
+        self.out_dir = Path(tempfile.mkdtemp(prefix="conformer_resources_"))
+    
+    def tearDown(self):
+        shutil.rmtree(str(self.out_dir), ignore_errors=True)
+    
+    def test_parsers(self):
+        """Verifica il parsing di liste di CPU, classi ionice e fasce orarie"""
+        self.assertEqual(resources.parse_cpu_list("0-2,5"), frozenset({0, 1, 2, 5}))
+        self.assertEqual(resources.parse_io_priority("idle"), ('idle', 7))
+        self.assertEqual(resources.parse_io_priority("best-effort:3"), ('best-effort', 3))
+        self.assertEqual(resources.parse_hours("06:00-22:30"), (360, 1350))
+        for parser, value in ((resources.parse_cpu_list, "3-1"), (resources.parse_io_priority, "realtime"),
+                              (resources.parse_io_priority, "idle:9"), (resources.parse_hours, "06:00")):
+            with self.assertRaises(ValueError):
+                parser(value)
+        night = (22 * 60, 6 * 60)
+        self.assertTrue(resources.in_hours(night, time.struct_time((2024, 1, 1, 23, 0, 0, 0, 1, -1))))
+        self.assertFalse(resources.in_hours(night, time.struct_time((2024, 1, 1, 12, 0, 0, 0, 1, -1))))
+    
+    def test_governor_lowers_and_recovers(self):
+        """Verifica che il limite scenda oltre soglia, non sotto il minimo, e risalga solo a carico basso"""
+        load = [2.0]
+        governor = resources.Governor(4, max_load=1.0, interval=1.0, load_sampler=lambda: load[0])
+        for step in range(5):
+            governor.update(now=float(step))
+        self.assertEqual(governor.limit, 1)
+        # Sotto soglia ma sopra l'isteresi: il limite non cambia
+        load[0] = 0.9
+        self.assertEqual(governor.update(now=10.0), 1)
+        # Dentro l'intervallo di campionamento nessun ricalcolo
+        load[0] = 0.1
+        self.assertEqual(governor.update(now=10.5), 1)
+        self.assertEqual(governor.update(now=11.0), 2)
+        for step in range(12, 20):
+            governor.update(now=float(step))
+        self.assertEqual(governor.limit, 4)
+    
+    def test_governor_live_hours_and_slots(self):
+        """Verifica il tetto nelle ore di diretta e gli slot condivisi"""
+        governor = resources.Governor(4, live_hours=(6 * 60, 22 * 60), live_jobs=1, interval=0)
+        noon = time.struct_time((2024, 1, 1, 12, 0, 0, 0, 1, -1))
+        night = time.struct_time((2024, 1, 1, 2, 0, 0, 0, 1, -1))
+        self.assertEqual(governor.update(now=1.0, now_local=noon), 1)
+        self.assertTrue(governor.try_acquire())
+        self.assertFalse(governor.try_acquire())
+        governor.release()
+        self.assertEqual(governor.update(now=2.0, now_local=night), 2)
+        self.assertIsNone(resources.governor_from(4))
+        self.assertEqual(resources.governor_from(4, live_hours="06:00-22:00").live_jobs, 2)
+    
+    @unittest.skipUnless(hasattr(os, 'sched_getaffinity'), "affinità non disponibile")
+    def test_limits_apply_to_worker_thread_only(self):
+        """Verifica nice e affinità sul thread worker, ereditati dai processi figli, senza toccare il principale"""
+        cpu = min(os.sched_getaffinity(0))
+        limits = resources.limits_from(nice=os.getpriority(os.PRIO_PROCESS, 0) + 1, cpus=str(cpu))
+        with self.assertRaises(ValueError):
+            resources.limits_from(cpus="100000")
+        with self.assertRaises(ValueError):
+            resources.limits_from(nice=40)
+        main_affinity = os.sched_getaffinity(0)
+        
+        def child_state():
+            output = subprocess.run([sys.executable, "-c",
+                                     "import os; print(os.getpriority(os.PRIO_PROCESS, 0), sorted(os.sched_getaffinity(0)))"],
+                                    capture_output=True, text=True, check=True)
+            return output.stdout.strip()
+        
+        conformer = SimpleConformer(str(self.input_dir), str(self.out_dir), jobs=1, limits=limits)
+        with conformer.new_executor() as executor:
+            state = executor.submit(child_state).result()
+        self.assertEqual(state, f"{limits.nice} [{cpu}]")
+        self.assertEqual(os.sched_getaffinity(0), main_affinity)
+    
+    def test_run_respects_governor_limit(self):
+        """Verifica che il pool non superi il limite del governatore anche con più worker"""
+        governor = resources.Governor(4, live_hours=(0, 24 * 60), live_jobs=1, interval=0.05)
+        conformer = SimpleConformer(str(self.input_dir), str(self.out_dir), jobs=4, governor=governor)
+        lock = threading.Lock()
+        running, peak = [0], [0]
+        
+        def fake_convert(src, dst, info=None, loudness=None):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.02)
+            with lock:
+                running[0] -= 1
+            return True
+        
+        with mock.patch.object(conformer, 'is_conforming_mp3', return_value=False), \
+             mock.patch.object(conformer, 'convert_to_mp3', side_effect=fake_convert):
+            conformer.run()
+        self.assertEqual(conformer.stats['converted'], 4)
+        self.assertEqual(peak[0], 1)
+        self.assertTrue(governor.try_acquire())
+
+
+class TestStreaming(TestAntiRegressione):
+    """Test per l'I/O in streaming via pipe e la lettura anticipata"""
+    
+    def setUp(self):
+        self.out_dir = Path(tempfile.mkdtemp(prefix="conformer_stream_"))
+    
+    def tearDown(self):
+        shutil.rmtree(str(self.out_dir), ignore_errors=True)
+    
+    def test_network_share_detection(self):
+        """Verifica il tipo di filesystem dal punto di montaggio più lungo, con spazi codificati"""
+        mounts = self.out_dir / "mounts"
+        mounts.write_text("/dev/sda1 / ext4 rw 0 0\n"
+                          "server:/radio /mnt/radio\\040share nfs4 rw 0 0\n"
+                          "/dev/sdb1 /mnt/radio\\040share/local xfs rw 0 0\n")
+        self.assertEqual(streamio.filesystem_type("/mnt/radio share/music/a.flac", str(mounts)), 'nfs4')
+        self.assertTrue(streamio.is_network_path("/mnt/radio share", str(mounts)))
+        self.assertFalse(streamio.is_network_path("/mnt/radio share/local/a.flac", str(mounts)))
+        self.assertFalse(streamio.is_network_path("/home/user", str(mounts)))
+        self.assertFalse(streamio.pipe_output_ok(PROFILES['mp3-vbr']))
+        self.assertFalse(streamio.pipe_output_ok(PROFILES['aac-128']))
+        self.assertTrue(streamio.pipe_output_ok(PROFILES['mp3-192']))
+    
+    def test_runner_pipes_stdin_and_stdout(self):
+        """Verifica che ffexec alimenti stdin a blocchi e scriva stdout nel file, con errori di lettura propagati"""
+        from ffexec import FFmpegRunner
+        runner = FFmpegRunner(sys.executable, sys.executable)
+        script = "import sys; sys.stdout.buffer.write(sys.stdin.buffer.read().upper())"
+        target = self.out_dir / "out.bin"
+        with open(target, 'wb') as sink:
+            runner._run([sys.executable, '-c', script], timeout=30,
+                        stdin_source=iter([b"abc" * 100000, b"def"]), stdout_sink=sink)
+        self.assertEqual(target.read_bytes(), b"ABC" * 100000 + b"DEF")
+        
+        def failing_source():
+            yield b"abc"
+            raise OSError(5, "Input/output error")
+        
+        with self.assertRaises(OSError):
+            runner._run([sys.executable, '-c', script], timeout=30, stdin_source=failing_source())
+    
+    def test_prefetcher_budget_and_release(self):
+        """Verifica contenuto integro, memoria entro il budget e rilascio dei file non codificati"""
+        files = []
+        for index in range(3):
+            path = self.out_dir / f"track{index}.flac"
+            path.write_bytes(bytes([index]) * 10000)
+            files.append(path)
+        prefetcher = streamio.Prefetcher(depth=3, memory=4096, chunk_size=1024)
+        try:
+            for path in files:
+                prefetcher.request(path)
+            time.sleep(0.2)
+            self.assertLessEqual(prefetcher.buffered_bytes, 4096)
+            prefetcher.discard(files[2])
+            source = prefetcher.take(files[0])
+            self.assertIsNotNone(source)
+            self.assertEqual(b"".join(source), files[0].read_bytes())
+            source.close()
+            source = prefetcher.take(files[1])
+            self.assertEqual(b"".join(source), files[1].read_bytes())
+            source.close()
+            self.assertIsNone(prefetcher.take(files[2]))
+            self.assertEqual(prefetcher.buffered_bytes, 0)
+        finally:
+            prefetcher.close()
+    
+    def test_stream_mode_encode(self):
+        """Verifica sorgente su stdin e output su stdout per un profilo CBR, lettura diretta per gli M4A"""
+        source = self.input_dir / "rock" / "song2.flac"
+        conformer = SimpleConformer(str(self.input_dir), str(self.out_dir), io_mode='stream')
+        self.assertTrue(conformer.streaming)
+        self.assertFalse(SimpleConformer(str(self.input_dir), str(self.out_dir), io_mode='path').streaming)
+        calls = []
+        
+        def fake_encode(src, dst, output_args, timeout=None, input_args=None, stdin=None, stdout=None):
+            calls.append((src, dst))
+            data = b"".join(stdin) if stdin is not None else b""
+            if stdout is not None:
+                stdout.write(b"encoded:" + data)
+            else:
+                Path(dst).write_bytes(b"encoded")
+        
+        with mock.patch.object(conformer, '_probe_or_none', return_value=MediaInfo('flac', 0, 44100, 2, 10.0)), \
+             mock.patch.object(conformer.runner, 'encode', side_effect=fake_encode):
+            self.assertEqual(conformer._process_file(source, {}), 'converted')
+            m4a = self.input_dir / "rock" / "live.m4a"
+            m4a.write_bytes(b"m4a content")
+            self.assertTrue(conformer.convert_multi(m4a, [(conformer.profile, self.out_dir / "live.mp3")]))
+        self.assertEqual(calls[0], ('pipe:0', 'pipe:1'))
+        self.assertEqual((self.out_dir / "rock" / "song2.mp3").read_bytes(), b"encoded:" + source.read_bytes())
+        self.assertEqual(calls[1], (str(m4a), 'pipe:1'))
+        self.assertEqual(conformer.stats['streamed'], 2)
+        self.assertFalse(conformer._prefetch_wanted(self.input_dir / "rock" / "live.m4a"))
+        self.assertFalse(conformer._prefetch_wanted(source))
+
+
+@unittest.skipUnless(tags.available(), "mutagen non installato")
+class TestTags(TestAntiRegressione):
+    """Test per il riporto di tag e copertina della sorgente negli output convertiti"""
+    
+    def setUp(self):
+        self.work_dir = Path(tempfile.mkdtemp(prefix="conformer_tags_"))
+        self.src_dir = self.work_dir / "in"
+        self.src_dir.mkdir()
+    
+    def tearDown(self):
+        shutil.rmtree(str(self.work_dir), ignore_errors=True)
+    
+    def _flac(self, name, cover_size=1200):
+        """FLAC senza frame audio ma con STREAMINFO valido, Vorbis comment e copertina PNG"""
+        import io
+        import struct
+        from mutagen.flac import FLAC, Picture
+        path = self.src_dir / name
+        streaminfo = (struct.pack('>HH', 4096, 4096) + b"\x00" * 6
+                      + ((44100 << 44) | (1 << 41) | (15 << 36) | 441000).to_bytes(8, 'big') + b"\x00" * 16)
+        path.write_bytes(b"fLaC" + bytes([0x80, 0, 0, len(streaminfo)]) + streaminfo)
+        audio = FLAC(str(path))
+        audio['TITLE'] = name
+        audio['ARTIST'] = ['Uno', 'Due']
+        audio['TRACKNUMBER'] = '3'
+        audio['TRACKTOTAL'] = '12'
+        audio['ORGANIZATION'] = 'Etichetta'
+        audio['MUSICBRAINZ_ALBUMID'] = 'b3c2'
+        audio['REPLAYGAIN_TRACK_GAIN'] = '-6.5 dB'
+        if cover_size:
+            from PIL import Image
+            buffer = io.BytesIO()
+            Image.new('RGB', (cover_size, cover_size), 'red').save(buffer, 'PNG')
+            picture = Picture()
+            picture.type = 3
+            picture.mime = 'image/png'
+            picture.data = buffer.getvalue()
+            audio.add_picture(picture)
+        audio.save()
+        return path
+    
+    def _fake_encode(self, src, dst, output_args, timeout=None, input_args=None, stdin=None, stdout=None):
+        frame = b"\xff\xfb\x90\x00" + b"\x00" * 413
+        if stdin is not None:
+            b"".join(stdin)
+        if stdout is not None:
+            stdout.write(frame * 3)
+        else:
+            Path(dst).write_bytes(frame * 3)
+    
+    def test_flac_to_id3v24_with_cached_artwork(self):
+        """Verifica la mappatura Vorbis -> ID3v2.4, la copertina ridimensionata una volta e i soli stream audio"""
+        from mutagen.id3 import ID3
+        first, second = self._flac("uno.flac"), self._flac("due.flac")
+        conformer = SimpleConformer(str(self.src_dir), str(self.work_dir / "out"))
+        calls = []
+        
+        def encode(src, dst, output_args, **kwargs):
+            calls.append(output_args)
+            self._fake_encode(src, dst, output_args, **kwargs)
+        
+        with mock.patch.object(conformer, '_probe_or_none', return_value=MediaInfo('flac', 0, 44100, 2, 10.0)), \
+             mock.patch.object(conformer.runner, 'encode', side_effect=encode):
+            for source in (first, second):
+                self.assertEqual(conformer._process_file(source, {}), 'converted')
+        self.assertEqual(calls[0][:4], ['-map', '0:a:0', '-map_metadata', '-1'])
+        self.assertIn('-write_id3v2', calls[0])
+        tags_out = ID3(str(self.work_dir / "out" / "uno.mp3"))
+        self.assertEqual(tags_out.version, (2, 4, 0))
+        self.assertEqual(tags_out['TIT2'].text, ["uno.flac"])
+        self.assertEqual(tags_out['TPE1'].text, ["Uno", "Due"])
+        self.assertEqual(tags_out['TRCK'].text, ["3/12"])
+        self.assertEqual(tags_out['TPUB'].text, ["Etichetta"])
+        self.assertEqual(tags_out['TXXX:MusicBrainz Album Id'].text, ["b3c2"])
+        self.assertEqual(tags_out['TXXX:REPLAYGAIN_TRACK_GAIN'].text, ["-6.5 dB"])
+        cover = tags_out.getall('APIC')[0]
+        self.assertEqual((cover.mime, cover.type), ('image/jpeg', 3))
+        from PIL import Image
+        import io
+        self.assertEqual(Image.open(io.BytesIO(cover.data)).size, (600, 600))
+        self.assertEqual((conformer.artwork.misses, conformer.artwork.hits), (1, 1))
+        self.assertEqual(conformer.stats['tagged'], 2)
+    
+    def test_stream_mode_prepends_tag_and_loudness_drops_replaygain(self):
+        """Verifica il tag ID3 scritto davanti all'audio in streaming e ReplayGain scartato con la normalizzazione"""
+        from mutagen.id3 import ID3
+        source = self._flac("uno.flac", cover_size=0)
+        conformer = SimpleConformer(str(self.src_dir), str(self.work_dir / "out"), io_mode='stream',
+                                    loudness_target=-16.0)
+        with mock.patch.object(conformer.runner, 'encode', side_effect=self._fake_encode), \
+             mock.patch.object(tags, 'write_tags', side_effect=AssertionError("riscrittura")):
+            self.assertTrue(conformer.convert_multi(source, [(conformer.profile, self.work_dir / "out.mp3")],
+                                                    MediaInfo('flac', 0, 44100, 2, 10.0)))
+        tags_out = ID3(str(self.work_dir / "out.mp3"))
+        self.assertEqual(tags_out['TIT2'].text, ["uno.flac"])
+        self.assertNotIn('TXXX:REPLAYGAIN_TRACK_GAIN', tags_out)
+        self.assertEqual(conformer.stats['tagged'], 1)
+    
+    def test_disabled_and_untagged_sources(self):
+        """Verifica la mappatura di ffmpeg con --no-tags e nessun tag per sorgenti senza metadati"""
+        conformer = SimpleConformer(str(self.src_dir), str(self.work_dir / "out"), carry_tags=False)
+        self.assertEqual(conformer._map_args(conformer.profile), [])
+        self.assertIsNone(conformer.source_tags(self._flac("uno.flac")))
+        plain = self.src_dir / "plain.wav"
+        plain.write_bytes(b"test content")
+        conformer = SimpleConformer(str(self.src_dir), str(self.work_dir / "out"))
+        self.assertFalse(conformer.source_tags(plain))
+
+
+class TestWorkQueue(TestAntiRegressione):
+    """Test per la coda di lavoro distribuita: lease, scadenze, riaccodamento e worker concorrenti"""
+    
+    def setUp(self):
+        self.work_dir = Path(tempfile.mkdtemp(prefix="conformer_queue_"))
+        self.src_dir = self.work_dir / "input"
+        self.out_dir = self.work_dir / "output"
+        self.queue_path = self.work_dir / "share" / "queue.db"
+        self.src_dir.mkdir(parents=True)
+    
+    def tearDown(self):
+        shutil.rmtree(str(self.work_dir), ignore_errors=True)
+    
+    def _queue(self, rows):
+        queue = workqueue.WorkQueue(self.queue_path)
+        generation = queue.begin_scan("mp3", self.src_dir, self.out_dir)
+        queue.enqueue(rows, generation)
+        queue.finish_scan(generation)
+        return queue
+    
+    def test_claim_order_and_lease_expiry(self):
+        """Verifica ordine priorità/costo, rinnovo, scadenza dei lease e limite di tentativi"""
+        queue = self._queue([("a.flac", 1, 1, 5.0, 0), ("b.flac", 1, 1, 50.0, 0), ("new/c.flac", 1, 1, 1.0, 10)])
+        try:
+            self.assertEqual(queue.claim("node1", 2, lease=60, now=1000), ["new/c.flac", "b.flac"])
+            self.assertEqual(queue.renew("node1", ["new/c.flac"], lease=60, now=1050), [])
+            # Il lease di b.flac scade, quello rinnovato di new/c.flac no
+            self.assertEqual(queue.claim("node2", 5, lease=60, now=1070), ["b.flac", "a.flac"])
+            self.assertEqual(queue.renew("node1", ["b.flac"], lease=60, now=1071), ["b.flac"])
+            self.assertTrue(queue.complete("node1", "new/c.flac", True))
+            self.assertFalse(queue.complete("node1", "b.flac", True))
+            self.assertTrue(queue.complete("node2", "b.flac", True))
+            # a.flac fallisce a ogni tentativo: dopo MAX_ATTEMPTS non torna più in coda
+            self.assertTrue(queue.complete("node2", "a.flac", False))
+            now = 1100
+            for _ in range(workqueue.MAX_ATTEMPTS - 1):
+                self.assertEqual(queue.claim("node2", 5, lease=60, now=now), ["a.flac"])
+                queue.complete("node2", "a.flac", False)
+            self.assertEqual(queue.claim("node2", 5, lease=60, now=now), [])
+            self.assertEqual(queue.counts(), {'pending': 0, 'leased': 0, 'done': 2, 'failed': 1})
+            self.assertTrue(queue.finished())
+        finally:
+            queue.close()
+    
+    def test_rescan_requeues_only_changes(self):
+        """Verifica che una nuova scansione rimetta in coda sorgenti cambiate e falliti, e tolga le rimosse"""
+        queue = self._queue([("a.flac", 10, 1, 1.0, 0), ("b.flac", 10, 1, 1.0, 0), ("c.flac", 10, 1, 1.0, 0)])
+        try:
+            for rel_path in queue.claim("node1", 3, lease=60):
+                queue.complete("node1", rel_path, True)
+            generation = queue.begin_scan("mp3", self.src_dir, self.out_dir)
+            self.assertFalse(queue.finished())
+            queue.enqueue([("a.flac", 10, 1, 1.0, 0), ("b.flac", 20, 2, 1.0, 0)], generation)
+            self.assertEqual(queue.finish_scan(generation), 1)
+            self.assertEqual(queue.claim("node1", 5, lease=60), ["b.flac"])
+            self.assertEqual(queue.stale_paths(["a.flac", "b.flac"]), {"b.flac"})
+            # Interrotto dall'arresto: torna in coda senza consumare un tentativo
+            queue.release("node1", ["b.flac"])
+            self.assertEqual(queue.counts(), {'pending': 1, 'leased': 0, 'done': 1, 'failed': 0})
+            # Impostazioni diverse: tutto da rifare
+            generation = queue.begin_scan("opus", self.src_dir, self.out_dir)
+            self.assertEqual(queue.counts()['pending'], 2)
+        finally:
+            queue.close()
+    
+    def test_workers_drain_queue_and_aggregate_stats(self):
+        """Verifica che due worker concorrenti convertano ogni file una volta e sommino le statistiche"""
+        for index in range(8):
+            (self.src_dir / f"track{index}.flac").write_bytes(b"x" * (index + 1))
+        
+        def fake_convert(src, dst, info=None, loudness=None):
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            dst.write_bytes(b"encoded")
+            time.sleep(0.02)
+            return True
+        
+        coordinator = SimpleConformer(str(self.src_dir), str(self.out_dir))
+        queue = workqueue.WorkQueue(self.queue_path)
+        self.assertEqual(workqueue.enqueue_library(coordinator, queue), 8)
+        queue.close()
+        
+        threads, conformers, patches = [], [], []
+        for name in ("node1", "node2"):
+            conformer = SimpleConformer(str(self.src_dir), str(self.out_dir), jobs=2)
+            patches += [mock.patch.object(conformer, 'is_conforming_mp3', return_value=False),
+                        mock.patch.object(conformer, 'convert_to_mp3', side_effect=fake_convert)]
+            worker = workqueue.QueueWorker(conformer, workqueue.WorkQueue(self.queue_path, create=False),
+                                           lease=60, poll_interval=0.05, worker_id=name)
+            conformers.append(conformer)
+            threads.append(threading.Thread(target=worker.run))
+        for patch in patches:
+            patch.start()
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(timeout=30)
+        finally:
+            for patch in patches:
+                patch.stop()
+        self.assertFalse(any(thread.is_alive() for thread in threads))
+        
+        queue = workqueue.WorkQueue(self.queue_path, create=False)
+        try:
+            self.assertTrue(queue.finished())
+            self.assertEqual(queue.counts()['done'], 8)
+            self.assertEqual(queue.aggregated_stats()['converted'], 8)
+            self.assertEqual(sum(conformer.stats['converted'] for conformer in conformers), 8)
+            self.assertEqual(len(list(self.out_dir.glob("*.mp3"))), 8)
+            self.assertIn("8 completati", queue.summary_lines()[0])
+        finally:
+            queue.close()
+    
+    def test_changed_source_is_reconverted(self):
+        """Verifica che una sorgente cambiata e riaccodata venga riconvertita e non saltata per l'output vecchio"""
+        source = self.src_dir / "track.flac"
+        source.write_bytes(b"v1")
+        
+        def fake_convert(src, dst, info=None, loudness=None):
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            dst.write_bytes(b"encoded-" + src.read_bytes())
+            return True
+        
+        def run_worker():
+            conformer = SimpleConformer(str(self.src_dir), str(self.out_dir))
+            queue = workqueue.WorkQueue(self.queue_path)
+            try:
+                workqueue.enqueue_library(conformer, queue)
+                with mock.patch.object(conformer, 'is_conforming_mp3', return_value=False), \
+                     mock.patch.object(conformer, 'convert_to_mp3', side_effect=fake_convert):
+                    workqueue.QueueWorker(conformer, queue, lease=60, poll_interval=0.05, worker_id="node1").run()
+            finally:
+                queue.close()
+            return conformer.stats
+        
+        self.assertEqual(run_worker()['converted'], 1)
+        self.assertEqual(run_worker()['converted'], 0)
+        source.write_bytes(b"v2-changed")
+        stats = run_worker()
+        self.assertEqual(stats['converted'], 1)
+        self.assertEqual(stats['skipped'], 0)
+        self.assertEqual((self.out_dir / "track.mp3").read_bytes(), b"encoded-v2-changed")
+    
+    def test_stale_temp_cleanup_spares_other_workers(self):
+        """Verifica che con min_age la pulizia lasci i temporanei recenti degli altri worker"""
+        self.out_dir.mkdir()
+        fresh = self.out_dir / ".a.mp3.othernode-1234.conformer-tmp"
+        stale = self.out_dir / ".b.mp3.deadnode-5678.conformer-tmp"
+        fresh.write_bytes(b"x")
+        stale.write_bytes(b"x")
+        old = time.time() - 3600
+        os.utime(stale, (old, old))
+        conformer = SimpleConformer(str(self.src_dir), str(self.out_dir))
+        self.assertEqual(conformer.cleanup_stale_temp_files(min_age=600), 1)
+        self.assertTrue(fresh.exists())
+        self.assertFalse(stale.exists())
+
+class TestFFmpegRunner(unittest.TestCase):
+    """Test per il livello di esecuzione ffmpeg/ffprobe (ffexec.py)"""
+    
+    def setUp(self):
+        from ffexec import FFmpegRunner
+        self.runner = FFmpegRunner(sys.executable, sys.executable)
+    
+    def test_argv_built_directly(self):
+        """Verifica la costruzione diretta della riga di comando"""
+        argv = self.runner.encode_argv("in.flac", "out.tmp", ['-c:a', 'libmp3lame', '-f', 'mp3'])
+        self.assertEqual(argv[0], sys.executable)
+        self.assertEqual(argv[-1], "out.tmp")
+        self.assertEqual(argv[argv.index('-i') + 1], "in.flac")
+        self.assertIn('-nostdin', argv)
+    
+    def test_error_keeps_only_stderr_tail(self):
+        """Verifica che di uno stderr enorme resti in memoria solo la coda"""
+        from ffexec import FFmpegError, STDERR_TAIL_BYTES
+        script = "import sys; sys.stderr.write('x' * 1000000 + '\\nlast line'); sys.exit(3)"
+        with self.assertRaises(FFmpegError) as ctx:
+            self.runner._run([sys.executable, '-c', script], timeout=30)
+        self.assertEqual(ctx.exception.returncode, 3)
+        self.assertLessEqual(len(ctx.exception.stderr), STDERR_TAIL_BYTES + 4096)
+        self.assertIn('last line', str(ctx.exception))
+    
+    def test_timeout_kills_process(self):
+        """Verifica che un processo bloccato venga terminato allo scadere del timeout"""
+        from ffexec import FFmpegTimeout
+        start = time.time()
+        with self.assertRaises(FFmpegTimeout):
+            self.runner._run([sys.executable, '-c', 'import time; time.sleep(30)'], timeout=0.5)
+        self.assertLess(time.time() - start, 10)
+    
+    def test_terminate_all(self):
+        """Verifica che terminate_all interrompa i processi attivi"""
+        from ffexec import FFmpegError
+        threading.Timer(0.3, self.runner.terminate_all).start()
+        with self.assertRaises(FFmpegError):
+            self.runner._run([sys.executable, '-c', 'import time; time.sleep(30)'], timeout=20)
+
+class TestCopyStrategies(TestAntiRegressione):
+    """Test per le strategie di copia dei file già conformi (fastcopy.py)"""
+    
+    def setUp(self):
+        self.work_dir = Path(tempfile.mkdtemp(prefix="conformer_copy_"))
+        self.src = self.work_dir / "src.mp3"
+        self.src.write_bytes(os.urandom(256 * 1024))
+    
+    def tearDown(self):
+        shutil.rmtree(str(self.work_dir), ignore_errors=True)
+    
+    def test_auto_copy_content(self):
+        """Verifica che 'auto' produca una copia identica con una strategia a semantica di copia"""
+        import fastcopy
+        dst = self.work_dir / "dst.mp3"
+        method = fastcopy.copy_file(self.src, dst)
+        self.assertIn(method, fastcopy.AUTO_ORDER)
+        self.assertEqual(dst.read_bytes(), self.src.read_bytes())
+        self.assertNotEqual(dst.stat().st_ino, self.src.stat().st_ino)
+    
+    def test_hardlink_and_cross_device_fallback(self):
+        """Verifica hardlink sullo stesso filesystem e ripiego su copia se i filesystem differiscono"""
+        import errno
+        import fastcopy
+        linked = self.work_dir / "linked.mp3"
+        self.assertEqual(fastcopy.copy_file(self.src, linked, 'hardlink'), 'hardlink')
+        self.assertEqual(linked.stat().st_ino, self.src.stat().st_ino)
+        
+        copied = self.work_dir / "copied.mp3"
+        with mock.patch('fastcopy.os.link', side_effect=OSError(errno.EXDEV, "cross-device link")):
+            self.assertEqual(fastcopy.copy_file(self.src, copied, 'hardlink'), 'copy')
+        self.assertEqual(copied.read_bytes(), self.src.read_bytes())
+    
+    def test_conformer_copy_strategy(self):
+        """Verifica la strategia configurata in SimpleConformer e il conteggio per metodo"""
+        with self.assertRaises(ValueError):
+            SimpleConformer(str(self.input_dir), str(self.work_dir), copy_strategy="teleport")
+        conformer = SimpleConformer(str(self.input_dir), str(self.work_dir / "out"), copy_strategy='hardlink')
+        dst = self.work_dir / "out" / "song.mp3"
+        self.assertTrue(conformer.safe_copy(self.src, dst))
+        self.assertEqual(dst.stat().st_ino, self.src.stat().st_ino)
+        self.assertEqual(conformer.copy_methods, {'hardlink': 1})
+
+class TestRunReport(TestAntiRegressione):
+    """Test per la strumentazione dei tempi e il report di esecuzione"""
+    
+    def setUp(self):
+        self.work_dir = Path(tempfile.mkdtemp(prefix="conformer_report_"))
+    
+    def tearDown(self):
+        shutil.rmtree(str(self.work_dir), ignore_errors=True)
+    
+    def test_percentiles(self):
+        """Verifica il calcolo nearest-rank dei percentili"""
+        values = [float(i) for i in range(1, 101)]
+        self.assertEqual(percentile(values, 0.50), 50.0)
+        self.assertEqual(percentile(values, 0.95), 95.0)
+        self.assertEqual(percentile(values, 0.99), 99.0)
+        self.assertEqual(percentile([], 0.5), 0.0)
+    
+    def test_summary_and_prometheus(self):
+        """Verifica aggregati per fase, byte e textfile Prometheus"""
+        report = RunReport("in", "out")
+        report.record_file("a.flac", "converted", {'probe': 0.1, 'encode': 2.0}, 2.1, 1000, 400)
+        report.record_file("b.mp3", "copied", {'probe': 0.05, 'copy': 0.2}, 0.25, 500, 500)
+        report.add_stage_time('scan', 0.5)
+        report.finish()
+        summary = report.summary()
+        self.assertEqual(summary['outcomes'], {'converted': 1, 'copied': 1})
+        self.assertEqual((summary['bytes_in'], summary['bytes_out']), (1500, 900))
+        self.assertEqual(summary['stages']['probe']['count'], 2)
+        self.assertEqual(summary['stages']['scan']['total_seconds'], 0.5)
+        self.assertEqual(summary['slowest_files'][0]['file'], "a.flac")
+        
+        prom = self.work_dir / "conformer.prom"
+        report.write_prometheus(prom)
+        text = prom.read_text()
+        self.assertIn('conformer_last_run_files{library="in",outcome="converted"} 1', text)
+        self.assertIn('stage="encode",quantile="0.95"', text)
+    
+    def test_run_writes_json_and_csv(self):
+        """Verifica che run() scriva report JSON e CSV per file"""
+        import csv
+        import json
+        report_dir = self.work_dir / "reports"
+        conformer = SimpleConformer(str(self.input_dir), str(self.work_dir / "out"), report_dir=report_dir,
+                                    prometheus_path=self.work_dir / "run.prom")
+        with mock.patch.object(conformer, 'is_conforming_mp3', return_value=False), \
+             mock.patch.object(conformer, 'convert_to_mp3', return_value=True):
+            conformer.run()
+        summary = json.loads(conformer.report.json_path.read_text(encoding='utf-8'))
+        self.assertEqual(summary['stats']['converted'], 4)
+        self.assertIn('encode', summary['stages'])
+        with open(conformer.report.csv_path, newline='', encoding='utf-8') as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual(len(rows), 4)
+        self.assertTrue(all(row['outcome'] == 'converted' for row in rows))
+        self.assertTrue((self.work_dir / "run.prom").exists())
+
+class TestBenchmark(unittest.TestCase):
+    """Test per l'harness di benchmark (benchmark.py)"""
+    
+    def test_mix_and_fixture_plan(self):
+        """Verifica parsing del mix di formati e distribuzione delle fixture"""
+        import benchmark
+        mix = benchmark.parse_mix("mp3:3,flac:1")
+        self.assertAlmostEqual(mix['mp3'], 0.75)
+        plan = benchmark.plan_fixtures(10, mix)
+        self.assertEqual(len(plan), 10)
+        self.assertEqual(plan.count('flac'), 2)
+        self.assertEqual(plan[:2], ['mp3', 'flac'])
+        with self.assertRaises(ValueError):
+            benchmark.parse_mix("mkv:1")
+    
+    def test_regression_detection(self):
+        """Verifica il confronto con la baseline oltre la tolleranza"""
+        import benchmark
+        phase = lambda fps: {'files': 10, 'files_per_sec': fps}
+        baseline = {'phases': {'encode': phase(10.0), 'copy': phase(100.0)}}
+        current = {'phases': {'encode': phase(8.0), 'copy': phase(95.0)}}
+        regressions = benchmark.compare_results(baseline, current, tolerance=0.10)
+        self.assertEqual([r['phase'] for r in regressions], ['encode'])
+        self.assertEqual(regressions[0]['change_pct'], -20.0)
+    
+    def test_startup_regression_detection(self):
+        """Verifica il confronto dei tempi di avvio: peggiora se il tempo cresce"""
+        import benchmark
+        baseline = {'startup': {'import': 0.10, 'cli_help': 0.12}}
+        current = {'startup': {'import': 0.20, 'cli_help': 0.11}}
+        regressions = benchmark.compare_results(baseline, current, tolerance=0.10)
+        self.assertEqual([r['phase'] for r in regressions], ['startup_import'])
+        self.assertEqual(regressions[0]['change_pct'], 100.0)
+    
+    def test_cli_path_skips_gui_modules(self):
+        """Verifica che l'import del motore e --help non carichino customtkinter, PIL o le traduzioni"""
+        import benchmark
+        startup = benchmark.measure_startup(runs=1)
+        self.assertEqual(startup['gui_modules_loaded'], [])
+        self.assertGreater(startup['cli_help'], 0)
+    
+    @unittest.skipUnless(shutil.which('ffmpeg'), "FFmpeg non disponibile")
+    def test_benchmark_smoke(self):
+        """Esegue il benchmark su una libreria minima generata con lavfi"""
+        import benchmark
+        work_dir = Path(tempfile.mkdtemp(prefix="conformer_bench_test_"))
+        try:
+            library = work_dir / "library"
+            benchmark.generate_library(library, 4, benchmark.parse_mix("mp3:1,wav:1"), 1.0, 'ffmpeg', 2)
+            results = benchmark.run_benchmark(library, work_dir, jobs=2)
+            self.assertEqual(set(results), set(benchmark.PHASES))
+            self.assertEqual(results['scan']['files'], 4)
+            self.assertEqual(results['run']['errors'], 0)
+        finally:
+            shutil.rmtree(str(work_dir), ignore_errors=True)
+
 def run_anti_regression_suite():
     """Esegue la suite completa di test anti-regressione"""
     print("🧪 ANTI-REGRESSION TEST SUITE")
@@ -281,6 +2097,29 @@ def run_anti_regression_suite():
         TestGUIComponents,
         TestConfigurationConsistency,
         TestPerformanceAndStability,
+        TestParallelProcessing,
+        TestProbeCache,
+        TestIncrementalSync,
+        TestDeduplication,
+        TestWatchMode,
+        TestScheduler,
+        TestProgressAggregation,
+        TestBatchMode,
+        TestAtomicOutput,
+        TestProbeAndDecide,
+        TestLoudness,
+        TestProfiles,
+        TestLogging,
+        TestPreflight,
+        TestMp3Header,
+        TestResources,
+        TestStreaming,
+        TestTags,
+        TestWorkQueue,
+        TestFFmpegRunner,
+        TestCopyStrategies,
+        TestRunReport,
+        TestBenchmark,
     ]
     
     for test_class in test_classes:
@@ -0,0 +1,368 @@
+"""
+Modalità watch per Audio & Metadata Converter
+Conforma i nuovi file appena finiscono di essere scritti, senza riscansionare l'intera libreria:
+inotify (Linux, via ctypes) con ripiego su polling delle cartelle
+"""
+
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import logging
+import threading
+from pathlib import Path
+from typing import Optional
+
+# Costanti inotify (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_MODIFY | IN_DELETE_SELF | IN_MOVE_SELF
+_EVENT_HEADER = struct.Struct('iIII')
+
+# Secondi senza variazioni di dimensione/mtime prima di considerare un file completo
+DEFAULT_SETTLE_SECONDS = 2.0
+DEFAULT_POLL_INTERVAL = 5.0
+
+logger = logging.getLogger(__name__)
+
+
+class InotifyWatcher:
+    """Watch ricorsivo con inotify: una watch per cartella, aggiunta anche alle cartelle create dopo l'avvio"""
+
+    def __init__(self, root: Path, accept):
+        import ctypes
+        import ctypes.util
+        self.root = Path(root)
+        self.accept = accept
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self._dirs = {}
+        self.needs_rescan = False
+        self._add_tree(self.root)
+
+    @staticmethod
+    def available() -> bool:
+        return sys.platform.startswith('linux')
+
+    def _add_watch(self, directory: str) -> bool:
+        import ctypes
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), WATCH_MASK | IN_ONLYDIR)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err == errno.ENOSPC:
+                # Limite fs.inotify.max_user_watches raggiunto: meglio il polling che file persi
+                raise OSError(err, "limite di watch inotify raggiunto (fs.inotify.max_user_watches)")
+            return False
+        self._dirs[wd] = directory
+        return True
+
+    def _add_tree(self, directory: Path) -> list:
+        """Aggiunge le watch a una cartella e alle sottocartelle; restituisce i file già presenti"""
+        found = []
+        stack = [str(directory)]
+        while stack:
+            current = stack.pop()
+            if not self._add_watch(current):
+                continue
+            try:
+                with os.scandir(current) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif self.accept(entry.path):
+                            found.append(entry.path)
+            except OSError as e:
+                logger.warning(f"Impossibile leggere {current}: {e.strerror}")
+        return found
+
+    def poll(self, timeout: float) -> list:
+        """Percorsi dei file creati o modificati dall'ultima chiamata"""
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return []
+        changed = []
+        while True:
+            try:
+                data = os.read(self._fd, 65536)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset + _EVENT_HEADER.size <= len(data):
+                wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    # Eventi persi dal kernel: serve una scansione completa per recuperarli
+                    self.needs_rescan = True
+                    continue
+                if mask & IN_IGNORED:
+                    self._dirs.pop(wd, None)
+                    continue
+                directory = self._dirs.get(wd)
+                if directory is None or not name:
+                    continue
+                path = os.path.join(directory, name)
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        # I file copiati prima che la watch esista non generano eventi: si raccolgono ora
+                        changed.extend(self._add_tree(Path(path)))
+                elif self.accept(path):
+                    changed.append(path)
+        return changed
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class PollingWatcher:
+    """Ripiego senza inotify: controlla l'mtime delle cartelle e rilegge solo quelle cambiate
+
+    Rileva i file nuovi, rinominati o spostati (cambiano l'mtime della cartella);
+    le riscritture sul posto di un file esistente richiedono il backend inotify.
+    """
+
+    def __init__(self, root: Path, accept, interval: float = DEFAULT_POLL_INTERVAL):
+        self.root = Path(root)
+        self.accept = accept
+        self.interval = interval
+        self.needs_rescan = False
+        self._dirs = {}
+        self._last_poll = time.monotonic()
+        self._scan_tree(str(self.root))
+
+    def _scan_tree(self, directory: str) -> list:
+        found = []
+        stack = [directory]
+        while stack:
+            current = stack.pop()
+            found.extend(self._scan_dir(current, stack))
+        return found
+
+    def _scan_dir(self, directory: str, new_dirs: list) -> list:
+        found = []
+        try:
+            self._dirs[directory] = os.stat(directory).st_mtime_ns
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.path not in self._dirs:
+                            new_dirs.append(entry.path)
+                    elif self.accept(entry.path):
+                        found.append(entry.path)
+        except OSError:
+            self._dirs.pop(directory, None)
+        return found
+
+    def poll(self, timeout: float) -> list:
+        wait = self.interval - (time.monotonic() - self._last_poll)
+        if wait > 0:
+            time.sleep(min(wait, timeout))
+            if wait > timeout:
+                return []
+        self._last_poll = time.monotonic()
+        changed = []
+        new_dirs = []
+        for directory, mtime_ns in list(self._dirs.items()):
+            try:
+                current = os.stat(directory).st_mtime_ns
+            except OSError:
+                self._dirs.pop(directory, None)
+                continue
+            if current != mtime_ns:
+                changed.extend(self._scan_dir(directory, new_dirs))
+        for directory in new_dirs:
+            changed.extend(self._scan_tree(directory))
+        return changed
+
+    def close(self):
+        pass
+
+
+class Debouncer:
+    """Tiene in attesa i file finché dimensione e mtime restano invariati per settle secondi"""
+
+    def __init__(self, settle: float = DEFAULT_SETTLE_SECONDS):
+        self.settle = settle
+        self._pending = {}
+
+    def __len__(self):
+        return len(self._pending)
+
+    def __contains__(self, path: str) -> bool:
+        return path in self._pending
+
+    def touch(self, path: str, now: Optional[float] = None):
+        """Segnala un evento sul file: il conteggio riparte"""
+        self._pending[path] = (None, now if now is not None else time.monotonic())
+
+    def ready(self, now: Optional[float] = None) -> list:
+        """File stabili da almeno settle secondi, rimossi dall'attesa"""
+        now = now if now is not None else time.monotonic()
+        stable = []
+        for path, (signature, since) in list(self._pending.items()):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                # Rimosso o rinominato prima di essere completato
+                del self._pending[path]
+                continue
+            current = (stat.st_size, stat.st_mtime_ns)
+            if current != signature:
+                self._pending[path] = (current, now)
+            elif now - since >= self.settle:
+                del self._pending[path]
+                stable.append(path)
+        return stable
+
+
+class WatchService:
+    """Servizio a lunga esecuzione: un pool di worker sempre attivo alimentato dagli eventi del filesystem"""
+
+    def __init__(self, conformer, settle: float = DEFAULT_SETTLE_SECONDS,
+                 poll_interval: float = DEFAULT_POLL_INTERVAL, use_inotify: bool = True):
+        self.conformer = conformer
+        self.settle = settle
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify
+        self.debouncer = Debouncer(settle)
+        self._stop = threading.Event()
+        self._in_flight = {}
+        # File cambiati di nuovo mentre erano in elaborazione: si rielaborano al termine
+        self._dirty = set()
+        # File stabili in attesa di uno slot del governatore (dict: ordine di arrivo senza duplicati)
+        self._waiting = {}
+        # File toccati solo dalla scansione di recupero: senza un evento reale l'output esistente resta valido
+        self._rescanned = set()
+        self.handled = 0
+
+    def accept(self, path: str) -> bool:
+        name = os.path.basename(path)
+        if name.startswith('.') or os.path.splitext(name)[1].lower() not in self.conformer.SUPPORTED_FORMATS:
+            return False
+        # Cartella di output dentro quella di input: i propri output non sono nuove sorgenti
+        output_dir = str(self.conformer.output_dir)
+        return not (path == output_dir or path.startswith(output_dir + os.sep))
+
+    def _make_watcher(self):
+        if self.use_inotify and InotifyWatcher.available():
+            try:
+                return InotifyWatcher(self.conformer.input_dir, self.accept)
+            except OSError as e:
+                logger.warning(f"inotify non disponibile ({e}), uso il polling ogni {self.poll_interval:.0f}s")
+        return PollingWatcher(self.conformer.input_dir, self.accept, self.poll_interval)
+
+    def stop(self):
+        self._stop.set()
+        self.conformer.stop()
+
+    def _touch(self, path: str):
+        """Evento del filesystem: la sorgente è cambiata e va rielaborata anche se l'output esiste già"""
+        self._rescanned.discard(path)
+        self.debouncer.touch(path)
+
+    def _submit(self, executor, path: str):
+        if path in self._in_flight:
+            self._dirty.add(path)
+            return
+        governor = self.conformer.governor
+        if governor is not None and not governor.try_acquire():
+            self._waiting[path] = None
+            return
+        # Senza manifest un output esistente farebbe saltare una sorgente ritaggata o sostituita
+        force = path not in self._rescanned
+        self._rescanned.discard(path)
+        self._in_flight[path] = executor.submit(self.conformer.process_single_file, Path(path), force)
+
+    def _collect(self) -> int:
+        collected = 0
+        for path, future in list(self._in_flight.items()):
+            if not future.done():
+                continue
+            del self._in_flight[path]
+            if self.conformer.governor is not None:
+                self.conformer.governor.release()
+            collected += 1
+            self.handled += 1
+            self.conformer.progress.completed_file(os.path.basename(path))
+            if self.conformer.progress_callback:
+                self.conformer.progress_callback(self.handled, self.handled + len(self._in_flight),
+                                                 os.path.basename(path))
+            if path in self._dirty:
+                self._dirty.discard(path)
+                self._touch(path)
+        return collected
+
+    def _buffer_events(self, watcher, buffered: list, done: threading.Event):
+        """Raccoglie gli eventi durante la sincronizzazione iniziale, che non vede i file cambiati nel frattempo"""
+        while not done.is_set():
+            buffered.extend(watcher.poll(0.5))
+
+    def run(self, initial_sync: bool = True):
+        """Esegue una sincronizzazione iniziale, poi elabora i file nuovi finché stop() non viene chiamato"""
+        conformer = self.conformer
+        # Il watcher parte prima della sincronizzazione: su una libreria grande dura ore
+        watcher = self._make_watcher()
+        try:
+            if initial_sync:
+                buffered = []
+                done = threading.Event()
+                buffering = threading.Thread(target=self._buffer_events, args=(watcher, buffered, done), daemon=True)
+                buffering.start()
+                try:
+                    conformer.run()
+                finally:
+                    done.set()
+                    buffering.join()
+                # Il report dell'esecuzione iniziale è già scritto: gli eventi successivi non lo alimentano
+                conformer.report = None
+                for path in buffered:
+                    self._touch(path)
+                if buffered:
+                    logger.info(f"{len(set(buffered))} file cambiati durante la sincronizzazione iniziale")
+            logger.info(f"Watch attivo su {conformer.input_dir} ({type(watcher).__name__}, "
+                        f"attesa stabilità {self.settle:.1f}s)")
+            tick = min(self.settle, 1.0) if self.settle > 0 else 0.2
+            with conformer.new_executor() as executor:
+                while not self._stop.is_set() and not conformer.stop_requested:
+                    if conformer.governor is not None:
+                        conformer.governor.update()
+                    for path in watcher.poll(tick):
+                        self._touch(path)
+                    if watcher.needs_rescan:
+                        watcher.needs_rescan = False
+                        logger.warning("Coda eventi piena: scansione completa per recuperare gli eventi persi")
+                        for file_path in conformer.iter_audio_files():
+                            path = str(file_path)
+                            if self.accept(path) and path not in self.debouncer:
+                                self._rescanned.add(path)
+                                self.debouncer.touch(path)
+                    waiting, self._waiting = self._waiting, {}
+                    for path in list(waiting) + [p for p in self.debouncer.ready() if p not in waiting]:
+                        self._submit(executor, path)
+                    if self._collect() and conformer.manifest is not None:
+                        # Un demone può essere interrotto in ogni momento: il manifest non resta indietro
+                        conformer.manifest.flush()
+                executor.shutdown(wait=True)
+                self._collect()
+        finally:
+            watcher.close()
+            for store in (conformer.manifest, conformer.probe_cache, conformer.content_index):
+                if store is not None:
+                    store.flush()
+        conformer.log_summary()
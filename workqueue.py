@@ -0,0 +1,399 @@
+"""
+Coda di lavoro distribuita per Audio & Metadata Converter
+Un coordinatore scandisce la libreria e accoda le sorgenti in un database SQLite sulla condivisione;
+più worker, anche su host diversi che montano la stessa condivisione, prendono i file in lease a piccoli
+lotti. Un lease non rinnovato scade e il file torna in coda (worker caduto); gli output restano
+idempotenti perché ogni worker scrive in un temporaneo proprio e lo rinomina solo a fine scrittura.
+"""
+
+import os
+import json
+import time
+import socket
+import sqlite3
+import logging
+import threading
+import contextlib
+import concurrent.futures
+from pathlib import Path
+from typing import Optional
+
+STATES = ('pending', 'leased', 'done', 'failed')
+# Durata di un lease: il worker lo rinnova ogni terzo di lease, un worker fermo lo perde alla scadenza
+DEFAULT_LEASE_SECONDS = 900.0
+# Attesa di un worker senza file da prendere (scansione ancora in corso o lease altrui non scaduti)
+DEFAULT_POLL_INTERVAL = 10.0
+# Tentativi per file: un file che fa cadere il worker o fallisce sempre non gira all'infinito
+MAX_ATTEMPTS = 3
+# Righe per transazione durante l'accodamento: la scansione non tiene il lock di scrittura a lungo
+ENQUEUE_BATCH = 500
+
+logger = logging.getLogger(__name__)
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class WorkQueue:
+    """Coda su file SQLite condiviso: una riga per sorgente, con stato, lease e tentativi
+
+    Niente WAL: richiede memoria condivisa tra i processi di un solo host e non funziona su NFS/SMB;
+    con il journal classico il lock del file (fcntl) serializza le transazioni anche tra host.
+    Le scadenze dei lease usano l'orologio di ciascun host, che va tenuto sincronizzato (NTP).
+    """
+
+    def __init__(self, db_path, create: bool = True):
+        db_path = Path(db_path)
+        if not create and not db_path.exists():
+            raise ValueError(f"Coda di lavoro non trovata: {db_path}")
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.db_path = db_path
+        # isolation_level=None: le transazioni sono esplicite (BEGIN IMMEDIATE prende subito il lock).
+        # Un solo thread alla volta usa la coda, non necessariamente quello che l'ha aperta
+        self.conn = sqlite3.connect(str(db_path), timeout=60, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=DELETE")
+        with self._transaction():
+            self.conn.execute("CREATE TABLE IF NOT EXISTS queue_meta (key TEXT PRIMARY KEY, value TEXT)")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS queue_tasks (rel_path TEXT PRIMARY KEY, size INTEGER, "
+                "mtime_ns INTEGER, cost REAL, priority INTEGER, seq INTEGER, scan INTEGER, state TEXT, "
+                "worker TEXT, lease_until REAL, attempts INTEGER NOT NULL DEFAULT 0, updated REAL, "
+                "stale INTEGER NOT NULL DEFAULT 0)")
+            columns = {row[1] for row in self.conn.execute("PRAGMA table_info(queue_tasks)")}
+            if 'stale' not in columns:
+                # Code create prima della colonna stale
+                self.conn.execute("ALTER TABLE queue_tasks ADD COLUMN stale INTEGER NOT NULL DEFAULT 0")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS queue_tasks_claim "
+                              "ON queue_tasks (state, priority DESC, cost DESC, seq)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS queue_workers (worker TEXT PRIMARY KEY, "
+                              "started REAL, heartbeat REAL, stats TEXT)")
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+
+    def close(self):
+        self.conn.close()
+
+    def meta(self, key: str) -> Optional[str]:
+        row = self.conn.execute("SELECT value FROM queue_meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value: str):
+        self.conn.execute("INSERT OR REPLACE INTO queue_meta (key, value) VALUES (?, ?)", (key, value))
+
+    # --- Coordinatore ---
+
+    def begin_scan(self, settings: str, input_dir, output_dir) -> int:
+        """Apre una nuova scansione e ne restituisce il numero; impostazioni diverse rimettono tutto in coda"""
+        with self._transaction():
+            previous = self.meta('settings')
+            if previous is not None and previous != settings:
+                logger.warning(f"Impostazioni cambiate ({previous} -> {settings}): tutti i file tornano in coda")
+                self.conn.execute("UPDATE queue_tasks SET state = 'pending', attempts = 0, stale = 1 "
+                                  "WHERE state != 'leased'")
+            generation = int(self.meta('scan') or 0) + 1
+            self._set_meta('scan', str(generation))
+            self._set_meta('scan_complete', '0')
+            self._set_meta('settings', settings)
+            self._set_meta('input_dir', str(input_dir))
+            self._set_meta('output_dir', str(output_dir))
+        return generation
+
+    def enqueue(self, rows, generation: int):
+        """Accoda o aggiorna (rel_path, size, mtime_ns, cost, priority): un file già fatto torna in coda
+        solo se la sorgente è cambiata, uno fallito a ogni nuova scansione.
+        Un file già fatto e poi cambiato è marcato stale: il suo vecchio output va rifatto, non saltato"""
+        now = time.time()
+        with self._transaction():
+            seq = self.conn.execute("SELECT COALESCE(MAX(seq), 0) FROM queue_tasks").fetchone()[0]
+            for rel_path, size, mtime_ns, cost, priority in rows:
+                seq += 1
+                self.conn.execute(
+                    "INSERT INTO queue_tasks (rel_path, size, mtime_ns, cost, priority, seq, scan, state, "
+                    "attempts, updated) VALUES (?, ?, ?, ?, ?, ?, ?, 'pending', 0, ?) "
+                    "ON CONFLICT(rel_path) DO UPDATE SET "
+                    "attempts = CASE WHEN state = 'failed' OR (state = 'done' AND (size != excluded.size "
+                    "OR mtime_ns != excluded.mtime_ns)) THEN 0 ELSE attempts END, "
+                    "stale = CASE WHEN state = 'done' AND (size != excluded.size "
+                    "OR mtime_ns != excluded.mtime_ns) THEN 1 ELSE stale END, "
+                    "state = CASE WHEN state = 'failed' OR (state = 'done' AND (size != excluded.size "
+                    "OR mtime_ns != excluded.mtime_ns)) THEN 'pending' ELSE state END, "
+                    "size = excluded.size, mtime_ns = excluded.mtime_ns, cost = excluded.cost, "
+                    "priority = excluded.priority, scan = excluded.scan",
+                    (rel_path, size, mtime_ns, cost, priority, seq, generation, now))
+
+    def finish_scan(self, generation: int) -> int:
+        """Chiude la scansione: le sorgenti non più viste escono dalla coda; restituisce quante"""
+        with self._transaction():
+            removed = self.conn.execute("DELETE FROM queue_tasks WHERE scan != ? AND state != 'leased'",
+                                        (generation,)).rowcount
+            self._set_meta('scan_complete', '1')
+        return removed
+
+    # --- Worker ---
+
+    def claim(self, worker: str, count: int, lease: float = DEFAULT_LEASE_SECONDS,
+              now: Optional[float] = None) -> list:
+        """Prende in lease fino a count file, prima i prioritari e i più costosi (LPT)"""
+        if count <= 0:
+            return []
+        now = now if now is not None else time.time()
+        with self._transaction():
+            # Lease scaduti: il worker è caduto o bloccato, il file torna disponibile (o fallisce)
+            self.conn.execute(
+                "UPDATE queue_tasks SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "worker = NULL, lease_until = NULL, updated = ? WHERE state = 'leased' AND lease_until < ?",
+                (MAX_ATTEMPTS, now, now))
+            claimed = [row[0] for row in self.conn.execute(
+                "SELECT rel_path FROM queue_tasks WHERE state = 'pending' "
+                "ORDER BY priority DESC, cost DESC, seq LIMIT ?", (count,))]
+            self.conn.executemany(
+                "UPDATE queue_tasks SET state = 'leased', worker = ?, lease_until = ?, "
+                "attempts = attempts + 1, updated = ? WHERE rel_path = ?",
+                [(worker, now + lease, now, rel_path) for rel_path in claimed])
+        return claimed
+
+    def stale_paths(self, rel_paths) -> set:
+        """Tra rel_paths, quelli la cui sorgente è cambiata dopo l'ultimo output (da rielaborare con force)"""
+        rel_paths = list(rel_paths)
+        if not rel_paths:
+            return set()
+        placeholders = ', '.join('?' * len(rel_paths))
+        return {row[0] for row in self.conn.execute(
+            f"SELECT rel_path FROM queue_tasks WHERE stale = 1 AND rel_path IN ({placeholders})", rel_paths)}
+
+    def renew(self, worker: str, rel_paths, lease: float = DEFAULT_LEASE_SECONDS,
+              now: Optional[float] = None) -> list:
+        """Estende i lease dei file in lavorazione; restituisce quelli persi (scaduti e presi da altri)"""
+        now = now if now is not None else time.time()
+        lost = []
+        with self._transaction():
+            for rel_path in rel_paths:
+                if not self.conn.execute(
+                        "UPDATE queue_tasks SET lease_until = ? WHERE rel_path = ? AND worker = ? "
+                        "AND state = 'leased'", (now + lease, rel_path, worker)).rowcount:
+                    lost.append(rel_path)
+        return lost
+
+    def complete(self, worker: str, rel_path: str, ok: bool) -> bool:
+        """Registra l'esito; False se il lease era già passato a un altro worker (l'output resta valido)"""
+        if ok:
+            # Anche a lease scaduto, finché nessun altro worker ha ripreso il file
+            state, owned = "'done', stale = 0", "((state = 'leased' AND worker = ?) OR state = 'pending')"
+        else:
+            state = f"CASE WHEN attempts >= {MAX_ATTEMPTS} THEN 'failed' ELSE 'pending' END"
+            owned = "state = 'leased' AND worker = ?"
+        with self._transaction():
+            return bool(self.conn.execute(
+                f"UPDATE queue_tasks SET state = {state}, worker = NULL, lease_until = NULL, updated = ? "
+                f"WHERE rel_path = ? AND {owned}", (time.time(), rel_path, worker)).rowcount)
+
+    def release(self, worker: str, rel_paths):
+        """Restituisce file interrotti (arresto del worker) senza consumare un tentativo"""
+        with self._transaction():
+            self.conn.executemany(
+                "UPDATE queue_tasks SET state = 'pending', worker = NULL, lease_until = NULL, "
+                "attempts = MAX(0, attempts - 1), updated = ? WHERE rel_path = ? AND worker = ? AND state = 'leased'",
+                [(time.time(), rel_path, worker) for rel_path in rel_paths])
+
+    def heartbeat(self, worker: str, stats: dict):
+        """Statistiche correnti del worker, sommate da aggregated_stats()"""
+        now = time.time()
+        with self._transaction():
+            self.conn.execute(
+                "INSERT INTO queue_workers (worker, started, heartbeat, stats) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(worker) DO UPDATE SET heartbeat = excluded.heartbeat, stats = excluded.stats",
+                (worker, now, now, json.dumps(stats)))
+
+    # --- Stato ---
+
+    def counts(self) -> dict:
+        counts = dict.fromkeys(STATES, 0)
+        for state, count in self.conn.execute("SELECT state, COUNT(*) FROM queue_tasks GROUP BY state"):
+            counts[state] = count
+        return counts
+
+    def finished(self) -> bool:
+        """Scansione chiusa e nessun file in coda o in lease"""
+        if self.meta('scan_complete') != '1':
+            return False
+        return not self.conn.execute(
+            "SELECT 1 FROM queue_tasks WHERE state IN ('pending', 'leased') LIMIT 1").fetchone()
+
+    def failed(self, limit: int = 20) -> list:
+        return [row[0] for row in self.conn.execute(
+            "SELECT rel_path FROM queue_tasks WHERE state = 'failed' ORDER BY rel_path LIMIT ?", (limit,))]
+
+    def workers(self) -> list:
+        """(worker, ultimo heartbeat) di ogni worker che si è registrato"""
+        return self.conn.execute("SELECT worker, heartbeat FROM queue_workers ORDER BY worker").fetchall()
+
+    def aggregated_stats(self) -> dict:
+        """Somma delle statistiche di tutti i worker"""
+        totals = {}
+        for (stats,) in self.conn.execute("SELECT stats FROM queue_workers"):
+            for key, value in json.loads(stats or '{}').items():
+                if isinstance(value, (int, float)):
+                    totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def summary_lines(self, lease: float = DEFAULT_LEASE_SECONDS) -> list:
+        counts = self.counts()
+        now = time.time()
+        workers = self.workers()
+        active = sum(1 for _, heartbeat in workers if heartbeat is not None and now - heartbeat < lease)
+        stats = self.aggregated_stats()
+        scan = 'completa' if self.meta('scan_complete') == '1' else 'in corso'
+        lines = [
+            f"Coda: {sum(counts.values())} file — {counts['pending']} in attesa, {counts['leased']} in lavorazione, "
+            f"{counts['done']} completati, {counts['failed']} falliti (scansione {scan})",
+            f"Worker: {len(workers)} registrati, {active} attivi",
+            f"Totali: processati {stats.get('processed', 0)}, copiati {stats.get('copied', 0)}, "
+            f"convertiti {stats.get('converted', 0)}, saltati {stats.get('skipped', 0)}, "
+            f"errori {stats.get('errors', 0)}",
+        ]
+        failed = self.failed()
+        if failed:
+            lines.append("Falliti: " + ', '.join(failed) + (' ...' if counts['failed'] > len(failed) else ''))
+        return lines
+
+
+def enqueue_library(conformer, queue: WorkQueue) -> int:
+    """Scansione del coordinatore: accoda ogni sorgente con costo stimato e priorità; restituisce i file visti.
+    Cosa saltare, copiare o convertire lo decide il worker, con le stesse regole dell'esecuzione locale"""
+    generation = queue.begin_scan(conformer.settings_signature(), conformer.input_dir, conformer.output_dir)
+    rows = []
+    seen = 0
+    for file_path in conformer.iter_audio_files():
+        if conformer.stop_requested:
+            break
+        try:
+            stat = file_path.stat()
+        except OSError as e:
+            logger.warning(f"Impossibile accodare {file_path.name}: {e}")
+            continue
+        rows.append((file_path.relative_to(conformer.input_dir).as_posix(), stat.st_size, stat.st_mtime_ns,
+                     conformer.estimate_work(file_path).cost, conformer.priority_of(file_path)))
+        seen += 1
+        if len(rows) >= ENQUEUE_BATCH:
+            queue.enqueue(rows, generation)
+            rows = []
+    if rows:
+        queue.enqueue(rows, generation)
+    if conformer.stop_requested:
+        # Scansione parziale: i file non visti restano in coda e la scansione resta aperta
+        logger.warning(f"Accodamento interrotto dopo {seen} file")
+        return seen
+    removed = queue.finish_scan(generation)
+    if removed:
+        logger.info(f"Rimossi dalla coda {removed} file la cui sorgente non esiste più")
+    logger.info(f"Accodati {seen} file in {queue.db_path}")
+    return seen
+
+
+class QueueWorker:
+    """Worker della coda: prende lotti di file in lease, li elabora con process_single_file sul proprio
+    pool e rinnova i lease finché la coda non è vuota o stop() non viene chiamato"""
+
+    def __init__(self, conformer, queue: WorkQueue, lease: float = DEFAULT_LEASE_SECONDS,
+                 poll_interval: float = DEFAULT_POLL_INTERVAL, worker_id: Optional[str] = None):
+        self.conformer = conformer
+        self.queue = queue
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.worker_id = worker_id or default_worker_id()
+        self._stop = threading.Event()
+        self.handled = 0
+
+    def stop(self):
+        self._stop.set()
+        self.conformer.stop()
+
+    def _finish(self, rel_path: str, future: concurrent.futures.Future):
+        try:
+            ok = future.result()
+        except Exception as e:
+            logger.error(f"Errore imprevisto su {rel_path}: {e}")
+            ok = False
+        if not ok and self.conformer.stop_requested:
+            # Interrotto dall'arresto: torna in coda per un altro worker
+            self.queue.release(self.worker_id, [rel_path])
+            return
+        if not self.queue.complete(self.worker_id, rel_path, ok):
+            logger.warning(f"Lease di {rel_path} già passato a un altro worker")
+        self.handled += 1
+        self.conformer.progress.completed_file(os.path.basename(rel_path))
+        if self.conformer.progress_callback:
+            self.conformer.progress_callback(self.handled, self.handled, os.path.basename(rel_path))
+
+    def run(self):
+        conformer = self.conformer
+        queue = self.queue
+        governor = conformer.governor
+        logger.info(f"Worker {self.worker_id} sulla coda {queue.db_path} (lease {self.lease:.0f}s)")
+        queue.heartbeat(self.worker_id, conformer.stats)
+        if conformer.output_dir.exists():
+            # Gli altri worker scrivono temporanei nella stessa cartella: si rimuovono solo quelli fermi
+            # da più di due lease, che nessun worker vivo sta più scrivendo
+            threading.Thread(target=conformer.cleanup_stale_temp_files, kwargs={'min_age': 2 * self.lease},
+                             daemon=True).start()
+        max_pending = conformer.jobs * 2
+        pending = {}
+        renew_every = self.lease / 3
+        last_renew = time.monotonic()
+        try:
+            with conformer.new_executor() as executor:
+                while not self._stop.is_set() and not conformer.stop_requested:
+                    if governor is not None:
+                        governor.update()
+                    slots = 0
+                    while len(pending) + slots < max_pending and (governor is None or governor.try_acquire()):
+                        slots += 1
+                    claimed = queue.claim(self.worker_id, slots, self.lease)
+                    # Sorgenti cambiate dopo l'ultimo output: senza force l'output esistente farebbe saltare il file
+                    stale = queue.stale_paths(claimed)
+                    if governor is not None:
+                        for _ in range(slots - len(claimed)):
+                            governor.release()
+                    for rel_path in claimed:
+                        future = executor.submit(conformer.process_single_file, conformer.input_dir / rel_path,
+                                                 rel_path in stale)
+                        pending[future] = rel_path
+
+                    if not pending:
+                        if queue.finished():
+                            break
+                        # Coda vuota ma scansione in corso o file in lease ad altri worker
+                        self._stop.wait(self.poll_interval)
+                        continue
+
+                    done, _ = concurrent.futures.wait(pending, timeout=min(renew_every, self.poll_interval),
+                                                      return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in done:
+                        rel_path = pending.pop(future)
+                        if governor is not None:
+                            governor.release()
+                        self._finish(rel_path, future)
+
+                    if time.monotonic() - last_renew >= renew_every:
+                        last_renew = time.monotonic()
+                        for rel_path in queue.renew(self.worker_id, list(pending.values()), self.lease):
+                            # Un altro worker lo sta rifacendo: entrambi scrivono lo stesso output
+                            logger.warning(f"Lease di {rel_path} scaduto e ripreso da un altro worker")
+                        queue.heartbeat(self.worker_id, conformer.stats)
+                executor.shutdown(wait=True)
+            for future, rel_path in pending.items():
+                self._finish(rel_path, future)
+        finally:
+            queue.heartbeat(self.worker_id, conformer.stats)
+            if conformer.probe_cache is not None:
+                conformer.probe_cache.flush()
+        conformer.log_summary()